@@ -1,8 +1,15 @@
+from django import forms
 from django.contrib import admin
+from django.db import transaction
 from .models import (
     Categoria, Producto, Cliente, Venta, DetalleVenta,
-    MetodoPago, Promocion, Pago, CierreCaja, CierreCajaDetallePago
+    MetodoPago, Promocion, Pago, CierreCaja, CierreCajaDetallePago, Secuencia,
+    ResumenDiario, ResumenPago, ResumenProducto, Evento, MovimientoStock,
+    ExtractoBancario, MovimientoBancario
 )
+from .precios import mapa_descuentos
+from . import eventos, inventario
+from .ventas import cancelar_venta
 
 @admin.register(Categoria)
 class CategoriaAdmin(admin.ModelAdmin):
@@ -12,15 +19,54 @@ class CategoriaAdmin(admin.ModelAdmin):
 
 @admin.register(Producto)
 class ProductoAdmin(admin.ModelAdmin):
-    list_display = ('nombre', 'categoria', 'costo', 'precio_venta', 'descuento', 'precio_final', 'stock', 'activo')
+    list_display = ('nombre', 'categoria', 'costo', 'precio_venta', 'descuento', 'precio_final', 'precio_promocion', 'stock_disponible', 'activo')
     list_filter = ('categoria', 'activo')
     search_fields = ('nombre', 'descripcion')
     readonly_fields = ('fecha_creacion',)
+
+    def get_queryset(self, request):
+        return inventario.con_stock(super().get_queryset(request))
+
+    def get_readonly_fields(self, request, obj=None):
+        # El stock de un producto existente cambia con movimientos (Movimientos de stock)
+        return self.readonly_fields + (('stock',) if obj else ())
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            with transaction.atomic():
+                super().save_model(request, obj, form, change)
+                inventario.stock_inicial([obj], usuario=request.user)
+            return
+        # Nunca save() completo: pisaría el stock descontado por las ventas en paralelo
+        if form.changed_data:
+            obj.save(update_fields=form.changed_data)
+        if 'fracciones_stock' in form.changed_data:
+            inventario.compactar([obj.pk])
+
+    def stock_disponible(self, obj):
+        return obj.stock_disponible
+    stock_disponible.short_description = 'Stock'
+    stock_disponible.admin_order_field = 'stock_disponible'
     
+    def get_changelist_instance(self, request):
+        # Un solo mapa de promociones para toda la página del listado
+        cl = super().get_changelist_instance(request)
+        descuentos = mapa_descuentos()
+        for obj in cl.result_list:
+            obj.precio_con_promocion = descuentos.precio(obj)
+        return cl
+
     def precio_final(self, obj):
         return f"Bs. {obj.precio_final():.2f}"
     precio_final.short_description = 'Precio Final'
 
+    def precio_promocion(self, obj):
+        precio = getattr(obj, 'precio_con_promocion', None)
+        if precio is None:
+            precio = mapa_descuentos().precio(obj)
+        return f"Bs. {precio:.2f}"
+    precio_promocion.short_description = 'Precio con Promoción'
+
 @admin.register(Cliente)
 class ClienteAdmin(admin.ModelAdmin):
     list_display = ('nombre_completo', 'ci_nit', 'telefono', 'email', 'activo', 'fecha_registro')
@@ -62,17 +108,29 @@ class PagoInline(admin.TabularInline):
 
 @admin.register(Venta)
 class VentaAdmin(admin.ModelAdmin):
-    list_display = ('id', 'cliente', 'usuario', 'modo_consumo', 'fecha', 'subtotal', 'descuento_total', 'total', 'estado', 'tiene_pago_completo')
+    list_display = ('id', 'numero_ticket', 'numero_factura', 'cliente', 'usuario', 'modo_consumo', 'fecha', 'subtotal', 'descuento_total', 'total', 'estado', 'tiene_pago_completo')
     list_filter = ('estado', 'modo_consumo', 'fecha')
     search_fields = ('cliente__nombre_completo', 'usuario__username')
-    readonly_fields = ('fecha', 'subtotal', 'descuento_total', 'total')
+    readonly_fields = ('fecha', 'subtotal', 'descuento_total', 'total', 'monto_pagado', 'monto_validado', 'clave_idempotencia', 'actualizado')
     inlines = [DetalleVentaInline, PagoInline]
+    actions = ['cancelar_ventas']
     
     def tiene_pago_completo(self, obj):
         return obj.tiene_pago_completo()
     tiene_pago_completo.boolean = True
     tiene_pago_completo.short_description = 'Pago Completo'
 
+    def save_model(self, request, obj, form, change):
+        estado_anterior = form.initial.get('estado') if change else None
+        super().save_model(request, obj, form, change)
+        if estado_anterior and estado_anterior != obj.estado:
+            eventos.cambio_estado(obj, estado_anterior)  # Mantener los resúmenes al día
+
+    @admin.action(description='Cancelar ventas seleccionadas (devuelve stock)')
+    def cancelar_ventas(self, request, queryset):
+        canceladas = sum(1 for venta in queryset if cancelar_venta(venta, usuario=request.user))
+        self.message_user(request, f'{canceladas} venta(s) cancelada(s).')
+
 class CierreCajaDetallePagoInline(admin.TabularInline):
     model = CierreCajaDetallePago
     extra = 0
@@ -101,3 +159,139 @@ class PagoAdmin(admin.ModelAdmin):
             obj.validar_pago(request.user)
         else:
             super().save_model(request, obj, form, change)
+
+    def delete_queryset(self, request, queryset):
+        # Uno por uno: Pago.delete() descuenta el monto de los saldos de la venta
+        for pago in queryset.select_related('venta'):
+            pago.delete()
+
+
+@admin.register(Secuencia)
+class SecuenciaAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'valor')
+    search_fields = ('nombre',)
+
+
+@admin.register(ResumenDiario)
+class ResumenDiarioAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'usuario', 'num_ventas', 'num_completadas', 'num_pendientes', 'num_canceladas', 'total_completado', 'total_pendiente', 'productos_vendidos')
+    list_filter = ('fecha', 'usuario')
+    date_hierarchy = 'fecha'
+
+    def has_add_permission(self, request):
+        return False  # Se calcula automáticamente (ver comando reconstruir_resumenes)
+
+
+@admin.register(ResumenPago)
+class ResumenPagoAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'usuario', 'metodo_pago', 'num_pagos', 'monto')
+    list_filter = ('fecha', 'usuario', 'metodo_pago')
+    list_select_related = ('usuario', 'metodo_pago')
+    date_hierarchy = 'fecha'
+
+    def has_add_permission(self, request):
+        return False  # Se calcula automáticamente (ver comando reconstruir_resumenes)
+
+
+@admin.register(ResumenProducto)
+class ResumenProductoAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'hora', 'producto', 'categoria', 'usuario', 'metodo_pago', 'modo_consumo', 'cantidad', 'total')
+    list_filter = ('fecha', 'categoria', 'usuario', 'metodo_pago', 'modo_consumo')
+    list_select_related = ('producto', 'categoria', 'usuario', 'metodo_pago')
+    date_hierarchy = 'fecha'
+
+    def has_add_permission(self, request):
+        return False  # Se calcula automáticamente (ver comando reconstruir_resumenes)
+
+
+@admin.register(Evento)
+class EventoAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'estado', 'intentos', 'creado', 'procesado', 'error')
+    list_filter = ('estado', 'tipo')
+    readonly_fields = ('tipo', 'datos', 'estado', 'intentos', 'creado', 'disponible', 'procesado', 'error')
+    actions = ['reintentar']
+
+    def has_add_permission(self, request):
+        return False  # Los publica el POS (ver gestion/eventos.py)
+
+    @admin.action(description='Reintentar eventos seleccionados')
+    def reintentar(self, request, queryset):
+        from django.utils import timezone
+        n = queryset.exclude(estado='hecho').update(estado='pendiente', intentos=0, disponible=timezone.now())
+        self.message_user(request, f'{n} evento(s) en cola nuevamente.')
+
+
+@admin.register(MovimientoStock)
+class MovimientoStockAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'producto', 'tipo', 'cantidad', 'venta', 'usuario', 'nota')
+    list_filter = ('tipo', 'fecha')
+    search_fields = ('producto__nombre', 'nota')
+    fields = ('producto', 'tipo', 'cantidad', 'nota', 'venta', 'usuario', 'fecha')
+    readonly_fields = ('venta', 'usuario', 'fecha')
+    raw_id_fields = ('producto',)
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj:
+            return self.fields  # El libro solo admite filas nuevas
+        return self.readonly_fields
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def formfield_for_choice_field(self, db_field, request, **kwargs):
+        if db_field.name == 'tipo':
+            # Ventas y anulaciones las registra el POS
+            kwargs['choices'] = [(inventario.REPOSICION, 'Reposición'), (inventario.AJUSTE, 'Ajuste')]
+        return super().formfield_for_choice_field(db_field, request, **kwargs)
+
+    def get_form(self, request, obj=None, **kwargs):
+        form = super().get_form(request, obj, **kwargs)
+        if obj is None:
+            def clean(self, clean=form.clean):
+                datos = clean(self)
+                producto, cantidad = datos.get('producto'), datos.get('cantidad')
+                if producto and cantidad and inventario.disponible([producto])[producto.pk] + cantidad < 0:
+                    raise forms.ValidationError('El movimiento dejaría el stock en negativo.')
+                return datos
+            form.clean = clean
+        return form
+
+    def save_model(self, request, obj, form, change):
+        # Reposición o ajuste manual: pasa por inventario para actualizar el stock
+        obj.usuario = request.user
+        with transaction.atomic():
+            inventario.registrar([obj])
+
+
+class MovimientoBancarioInline(admin.TabularInline):
+    model = MovimientoBancario
+    fields = ('fecha', 'monto', 'referencia', 'descripcion', 'estado', 'pago')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    show_change_link = True
+
+
+@admin.register(ExtractoBancario)
+class ExtractoBancarioAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'archivo', 'metodo_pago', 'lineas', 'conciliadas', 'por_revisar', 'usuario')
+    list_filter = ('fecha', 'metodo_pago')
+    readonly_fields = ('archivo', 'metodo_pago', 'usuario', 'fecha', 'lineas', 'conciliadas', 'por_revisar')
+    inlines = [MovimientoBancarioInline]
+
+    def has_add_permission(self, request):
+        return False  # Se importan desde Conciliación o con conciliar_extracto
+
+
+@admin.register(MovimientoBancario)
+class MovimientoBancarioAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'monto', 'referencia', 'descripcion', 'estado', 'pago', 'extracto')
+    list_filter = ('estado', 'fecha')
+    search_fields = ('referencia', 'descripcion', 'identificador')
+    readonly_fields = ('extracto', 'identificador', 'fecha', 'monto', 'referencia', 'descripcion', 'estado', 'pago')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False  # Se resuelven en Conciliación (conciliar o ignorar)
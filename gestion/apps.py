@@ -1,5 +1,8 @@
-from django.apps import AppConfig
-
-class GestionConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
-    name = 'gestion'
+from django.apps import AppConfig
+
+class GestionConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'gestion'
+
+    def ready(self):
+        from . import catalogo  # noqa: F401 - registra la invalidación del catálogo del POS
@@ -0,0 +1,192 @@
+"""
+Búsqueda indexada de clientes (POS y listas).
+
+Cada Cliente guarda columnas normalizadas al guardarse (Cliente.save):
+
+- busqueda: nombre y email sin acentos, en minúsculas, más los dígitos del
+  CI/NIT y del teléfono como palabras sueltas.
+- ci_nit_digitos / telefono_digitos: solo los dígitos.
+
+Las tres tienen índice B-tree. `buscar_clientes` combina, en este orden:
+
+1. CI/NIT tal cual, o CI/NIT o teléfono exactos en dígitos,
+2. CI/NIT o teléfono que empiezan con los dígitos buscados,
+3. nombres que empiezan con el texto buscado,
+4. palabras en cualquier parte (FULLTEXT en MySQL, FTS5 en SQLite; si no
+   hay índice de texto, LIKE sobre la columna normalizada).
+
+Los prefijos se consultan como rangos (col >= 'abc' AND col < 'abd'), que usan
+el índice en cualquier motor. Cada paso es una consulta pequeña con LIMIT.
+"""
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+TABLA_FTS = 'gestion_cliente_fts'  # SQLite FTS5 (contenido externo sobre gestion_cliente)
+INDICE_FULLTEXT = 'cliente_busqueda_ft'  # MySQL
+LARGO_BUSQUEDA = 255
+
+
+def normalizar(texto):
+    """Minúsculas, sin acentos ni signos, espacios simples: 'José  Pérez' -> 'jose perez'."""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    return ' '.join(re.sub(r'[^\w@.]+', ' ', texto).split())
+
+
+def digitos(texto):
+    """Solo los dígitos: '+591 7123-4567' -> '59171234567'."""
+    return re.sub(r'\D', '', texto or '')
+
+
+def columnas_busqueda(nombre_completo, email=None, ci_nit=None, telefono=None):
+    """Valores de las columnas de búsqueda de un cliente."""
+    ci = digitos(ci_nit)
+    tel = digitos(telefono)
+    partes = [normalizar(nombre_completo), normalizar(email), ci, tel]
+    if normalizar(ci_nit) != ci:
+        partes.append(normalizar(ci_nit))  # CI con complemento (p. ej. 1234567LP)
+    return {
+        'busqueda': ' '.join(p for p in partes if p)[:LARGO_BUSQUEDA],
+        'ci_nit_digitos': ci[:20],
+        'telefono_digitos': tel[:20],
+    }
+
+
+def _prefijo(campo, valor):
+    """kwargs de rango equivalentes a campo__startswith=valor (usan el índice B-tree)."""
+    return {f'{campo}__gte': valor, f'{campo}__lt': valor[:-1] + chr(ord(valor[-1]) + 1)}
+
+
+def _fulltext_instalado(cursor):
+    cursor.execute(
+        'SELECT 1 FROM information_schema.statistics '
+        'WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s LIMIT 1',
+        ['gestion_cliente', INDICE_FULLTEXT],
+    )
+    return cursor.fetchone() is not None
+
+
+def indice_texto_disponible():
+    """'mysql', 'fts5' o None según el índice de texto instalado."""
+    if connection.vendor == 'mysql':
+        with connection.cursor() as cursor:
+            return 'mysql' if _fulltext_instalado(cursor) else None
+    if connection.vendor == 'sqlite' and TABLA_FTS in connection.introspection.table_names():
+        return 'fts5'
+    return None
+
+
+_indice_texto = {}
+
+
+def _tipo_indice_texto():
+    clave = connection.settings_dict['NAME']
+    if clave not in _indice_texto:
+        _indice_texto[clave] = indice_texto_disponible()
+    return _indice_texto[clave]
+
+
+def _por_palabras(clientes, palabras, limite):
+    """Clientes con todas las `palabras` (como prefijos) en cualquier parte, por relevancia."""
+    tipo = _tipo_indice_texto()
+    if tipo == 'mysql':
+        consulta = ' '.join(f'+{p}*' for p in palabras)
+        return list(clientes.annotate(
+            relevancia=RawSQL('MATCH (busqueda) AGAINST (%s IN BOOLEAN MODE)', [consulta])
+        ).filter(relevancia__gt=0).order_by('-relevancia', 'nombre_completo')[:limite])
+    if tipo == 'fts5':
+        # El MATCH como subconsulta: el filtro de `clientes`, el orden y el LIMIT se aplican
+        # a todas las coincidencias (sin ORDER BY rank: bm25 es lento con apellidos comunes)
+        consulta = ' '.join(f'"{p}"*' for p in palabras)
+        coincidencias = RawSQL(f'SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s', [consulta])
+        return list(clientes.filter(pk__in=coincidencias).order_by('nombre_completo')[:limite])
+    for palabra in palabras:
+        clientes = clientes.filter(busqueda__contains=palabra)
+    return list(clientes.order_by('nombre_completo')[:limite])
+
+
+def buscar_clientes(q, clientes, limite=30):
+    """
+    Clientes de `clientes` (QuerySet) que coinciden con `q`, ordenados por relevancia:
+    CI/NIT o teléfono exactos primero, luego prefijos, luego nombre y palabras.
+    """
+    texto = normalizar(q)
+    numeros = digitos(q)
+    palabras = re.findall(r'\w+', texto)  # Sin signos: son operadores en FULLTEXT/FTS5
+    resultado = {}
+
+    def agregar(filas):
+        for cliente in filas:
+            if len(resultado) >= limite:
+                return
+            resultado.setdefault(cliente.pk, cliente)
+
+    agregar(clientes.filter(ci_nit=q.strip())[:1])  # CI/NIT tal cual (índice único)
+    if numeros and not re.search(r'[^\d\s+\-]', q):
+        # Búsqueda solo numérica: CI/NIT o teléfono
+        agregar(clientes.filter(ci_nit_digitos=numeros)[:limite])
+        agregar(clientes.filter(telefono_digitos=numeros)[:limite])
+        agregar(clientes.filter(**_prefijo('ci_nit_digitos', numeros)).order_by('ci_nit_digitos')[:limite])
+        agregar(clientes.filter(**_prefijo('telefono_digitos', numeros)).order_by('telefono_digitos')[:limite])
+    if texto and len(resultado) < limite:
+        agregar(clientes.filter(**_prefijo('busqueda', texto)).order_by('busqueda')[:limite])
+    if palabras and len(resultado) < limite:
+        agregar(_por_palabras(clientes, palabras, limite))
+    return list(resultado.values())
+
+
+def instalar_indice_texto(schema_editor=None):
+    """
+    Crea el índice de texto del motor actual: FULLTEXT en MySQL, tabla FTS5 con
+    triggers en SQLite (si la compilación de SQLite la incluye). Idempotente.
+    """
+    conexion = schema_editor.connection if schema_editor else connection
+    with conexion.cursor() as cursor:
+        if conexion.vendor == 'mysql':
+            if not _fulltext_instalado(cursor):
+                cursor.execute(f'ALTER TABLE gestion_cliente ADD FULLTEXT INDEX {INDICE_FULLTEXT} (busqueda)')
+        elif conexion.vendor == 'sqlite':
+            try:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5("
+                    f"busqueda, content='gestion_cliente', content_rowid='id')"
+                )
+            except Exception:
+                return  # SQLite sin FTS5: se usa LIKE sobre la columna normalizada
+            # Django recrea la tabla en algunas migraciones de SQLite y los triggers se pierden:
+            # se vuelven a crear siempre (comando reindexar_clientes).
+            cursor.execute(f'DROP TRIGGER IF EXISTS {TABLA_FTS}_ai')
+            cursor.execute(f'DROP TRIGGER IF EXISTS {TABLA_FTS}_ad')
+            cursor.execute(f'DROP TRIGGER IF EXISTS {TABLA_FTS}_au')
+            cursor.execute(
+                f'CREATE TRIGGER {TABLA_FTS}_ai AFTER INSERT ON gestion_cliente BEGIN '
+                f'INSERT INTO {TABLA_FTS}(rowid, busqueda) VALUES (new.id, new.busqueda); END'
+            )
+            cursor.execute(
+                f'CREATE TRIGGER {TABLA_FTS}_ad AFTER DELETE ON gestion_cliente BEGIN '
+                f"INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, busqueda) VALUES ('delete', old.id, old.busqueda); END"
+            )
+            cursor.execute(
+                f'CREATE TRIGGER {TABLA_FTS}_au AFTER UPDATE OF busqueda ON gestion_cliente BEGIN '
+                f"INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, busqueda) VALUES ('delete', old.id, old.busqueda); "
+                f'INSERT INTO {TABLA_FTS}(rowid, busqueda) VALUES (new.id, new.busqueda); END'
+            )
+            cursor.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('rebuild')")
+    _indice_texto.clear()
+
+
+def eliminar_indice_texto(schema_editor=None):
+    """Revierte instalar_indice_texto."""
+    conexion = schema_editor.connection if schema_editor else connection
+    with conexion.cursor() as cursor:
+        if conexion.vendor == 'mysql':
+            if _fulltext_instalado(cursor):
+                cursor.execute(f'ALTER TABLE gestion_cliente DROP INDEX {INDICE_FULLTEXT}')
+        elif conexion.vendor == 'sqlite':
+            for sufijo in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {TABLA_FTS}_{sufijo}')
+            cursor.execute(f'DROP TABLE IF EXISTS {TABLA_FTS}')
+    _indice_texto.clear()
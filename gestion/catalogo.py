@@ -0,0 +1,155 @@
+"""
+Catálogo del POS en caché.
+
+El POS necesita productos activos con su precio de promoción, categorías y
+métodos de pago; eso cambia pocas veces al día. Se arma una vez y se guarda en
+el caché de Django (CATALOGO_CACHE, locmem por defecto) bajo la clave de la
+versión actual del catálogo.
+
+La versión es la serie 'catalogo' de Secuencia: al guardar o eliminar un
+Producto, Categoria, Promocion o MetodoPago se incrementa, y cada lectura del
+catálogo la consulta (una fila por clave única). Como está en la base de datos,
+todos los procesos ven el cambio aunque cada uno tenga su propio caché.
+
+Además cada instantánea vence en el próximo inicio o fin de una promoción,
+para que los precios cambien a la hora exacta sin que nadie edite nada.
+
+La instantánea incluye su versión JSON compacta y un ETag (hash del
+contenido, no de la versión) para /pos/catalogo.json: las cajas revalidan con
+If-None-Match y reciben 304 mientras el contenido no cambie.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.cache import caches
+from django.db.models import Min, Q
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import numeracion
+from .models import Categoria, Cliente, MetodoPago, Producto, Promocion
+from .imagenes import srcset
+from .precios import mapa_descuentos
+
+
+def _cache():
+    return caches[getattr(settings, 'CATALOGO_CACHE', 'default')]
+
+
+def version_actual():
+    """Versión vigente del catálogo (una consulta)."""
+    return numeracion.valor_actual(numeracion.SECUENCIA_CATALOGO)
+
+
+def invalidar():
+    """Incrementa la versión: la próxima lectura arma una instantánea nueva."""
+    numeracion.siguiente(numeracion.SECUENCIA_CATALOGO)
+
+
+def _proximo_cambio_promociones(ahora):
+    """Próximo inicio o fin de una promoción activa a partir de `ahora` (None si no hay)."""
+    limites = Promocion.objects.filter(activo=True).aggregate(
+        inicio=Min('fecha_inicio', filter=Q(fecha_inicio__gt=ahora)),
+        fin=Min('fecha_fin', filter=Q(fecha_fin__gte=ahora)),
+    )
+    return min((v for v in limites.values() if v), default=None)
+
+
+def _cliente_mostrador_id():
+    cliente, _ = Cliente.objects.get_or_create(
+        ci_nit='MOSTRADOR',
+        defaults={'nombre_completo': 'Mostrador', 'telefono': '', 'email': '', 'activo': True},
+    )
+    return cliente.pk
+
+
+CAMPOS_PRODUCTO = ('id', 'nombre', 'categoria_id', 'precio', 'tiene_promo', 'imagen', 'imagen_srcset', 'imagen_webp')
+ANCHO_TARJETA = 320  # px de las tarjetas del POS (ver pos.css)
+
+
+def _json(catalogo):
+    """JSON compacto: productos como listas en el orden de CAMPOS_PRODUCTO."""
+    datos = {
+        'campos': CAMPOS_PRODUCTO,
+        'productos': [[p[campo] for campo in CAMPOS_PRODUCTO] for p in catalogo['productos']],
+        'categorias': [[c['id'], c['nombre']] for c in catalogo['categorias']],
+        'metodos_pago': [[m['id'], m['nombre']] for m in catalogo['metodos_pago']],
+        'cliente_mostrador_id': catalogo['cliente_mostrador_id'],
+    }
+    return json.dumps(datos, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def construir(version, ahora=None):
+    """Arma la instantánea del catálogo (solo tipos simples, serializable)."""
+    ahora = ahora or timezone.now()
+    mapa = mapa_descuentos(ahora)
+    productos = []
+    for p in Producto.objects.filter(activo=True):
+        precio = mapa.precio(p)
+        productos.append({
+            'id': p.pk,
+            'nombre': p.nombre,
+            'categoria_id': p.categoria_id,
+            'precio': precio,
+            'tiene_promo': precio < p.precio_final(),
+            # Miniaturas (ver imagenes.py); sin ellas, la imagen original
+            'imagen': p.imagen.url if p.imagen else '',
+            'imagen_srcset': srcset(p.imagen_variantes, ANCHO_TARJETA, 'jpeg'),
+            'imagen_webp': srcset(p.imagen_variantes, ANCHO_TARJETA, 'webp'),
+        })
+    catalogo = {
+        'version': version,
+        'generado': ahora,
+        'valido_hasta': _proximo_cambio_promociones(ahora),
+        'productos': productos,
+        'categorias': list(Categoria.objects.filter(activo=True).values('id', 'nombre')),
+        'metodos_pago': list(
+            MetodoPago.objects.filter(activo=True).values('id', 'nombre', 'tipo', 'requiere_validacion')
+        ),
+        'cliente_mostrador_id': _cliente_mostrador_id(),
+    }
+    catalogo['json'] = _json(catalogo)
+    catalogo['etag'] = '"%s"' % hashlib.sha1(catalogo['json']).hexdigest()
+    return catalogo
+
+
+def obtener(version=None):
+    """
+    Instantánea del catálogo para `version` (se consulta si no se indica).
+
+    Sin cambios en el catálogo ni promociones que empiecen o terminen, no hace
+    ninguna consulta a la base de datos.
+    """
+    if version is None:
+        version = version_actual()
+    cache = _cache()
+    clave = f'gestion:catalogo:{version}'
+    ahora = timezone.now()
+    catalogo = cache.get(clave)
+    if catalogo is not None and (catalogo['valido_hasta'] is None or ahora <= catalogo['valido_hasta']):
+        return catalogo
+
+    catalogo = construir(version, ahora)
+    timeout = getattr(settings, 'CATALOGO_CACHE_TIMEOUT', 3600)
+    if catalogo['valido_hasta'] is not None:
+        segundos = (catalogo['valido_hasta'] - ahora).total_seconds()
+        timeout = max(1, min(timeout, int(segundos) + 1))
+    cache.set(clave, catalogo, timeout)
+    return catalogo
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_save, sender=Categoria)
+@receiver(post_save, sender=Promocion)
+@receiver(post_save, sender=MetodoPago)
+@receiver(post_delete, sender=Producto)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_delete, sender=Promocion)
+@receiver(post_delete, sender=MetodoPago)
+@receiver(m2m_changed, sender=Promocion.productos.through)
+def _catalogo_modificado(sender, **kwargs):
+    if kwargs.get('action', 'post_').startswith('post_'):
+        invalidar()
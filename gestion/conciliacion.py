@@ -0,0 +1,396 @@
+"""
+Conciliación bancaria: valida en lote los pagos QR/transferencia con el
+extracto del banco.
+
+Se importa el extracto (CSV u OFX) y cada abono se empareja con un Pago
+pendiente de validación (MetodoPago.requiere_validacion) dentro de una ventana
+de días alrededor de la fecha del pago:
+
+1. Mismo monto y misma referencia (sin espacios ni guiones, sin distinguir
+   mayúsculas).
+2. Mismo monto y una referencia contiene a la otra (la del pago aparece en
+   la referencia o la glosa del banco, o la del banco dentro de la del pago).
+3. Mismo monto, pago sin referencia y un solo candidato en cada lado: un único
+   pago posible para el abono y un único abono posible para el pago.
+
+Los pagos pendientes de la ventana se leen en una consulta (índice
+validado, fecha_pago, monto) y se emparejan en memoria por (monto, referencia).
+Las coincidencias se validan por lotes de LOTE pagos, cada lote en una
+transacción con un número fijo de sentencias: UPDATE de los pagos, UPDATE con
+CASE de Venta.monto_validado, UPDATE de las ventas que quedaron pagadas a
+'completado', INSERT de las líneas del extracto y de los eventos para los
+resúmenes (ver eventos.validacion_en_lote). Es el mismo resultado que
+Pago.validar_pago uno por uno.
+
+Lo que no se empareja queda 'revisar' y se resuelve a mano en Conciliación
+(conciliar con un pago o ignorar). Cada línea guarda un identificador (FITID
+del OFX, columna id del CSV o una huella de la línea): importar dos veces el
+mismo extracto no duplica nada.
+"""
+import csv
+import hashlib
+import io
+import re
+import unicodedata
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, When
+from django.utils import timezone
+
+from . import eventos
+from .fechas import inicio_dia
+from .models import ExtractoBancario, MovimientoBancario, Pago, Venta
+
+VENTANA_DIAS = 3
+LOTE = 500
+
+Linea = namedtuple('Linea', 'identificador fecha monto referencia descripcion')
+
+# Nombres de columna aceptados en el CSV (en minúsculas y sin tildes)
+COLUMNAS = {
+    'identificador': ('id', 'identificador', 'transaccion', 'nro_transaccion', 'fitid'),
+    'fecha': ('fecha', 'fecha_transaccion', 'fecha_valor', 'date'),
+    'monto': ('monto', 'importe', 'abono', 'credito', 'amount'),
+    'referencia': ('referencia', 'ref', 'nro_referencia', 'comprobante', 'codigo'),
+    'descripcion': ('descripcion', 'detalle', 'concepto', 'glosa', 'memo'),
+}
+FORMATOS_FECHA = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y', '%Y%m%d')
+
+
+class ConciliacionError(Exception):
+    """Extracto ilegible o conciliación manual imposible (se informa tal cual)."""
+
+
+def _sin_tildes(texto):
+    return unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode()
+
+
+def normalizar_referencia(texto):
+    """Referencia comparable: solo letras y dígitos, en mayúsculas."""
+    return re.sub(r'[^0-9A-Z]', '', _sin_tildes(texto or '').upper())
+
+
+def _monto(valor):
+    """Monto del banco: admite 1.234,56 / 1,234.56 / 1234,56 y signo."""
+    texto = re.sub(r'[^0-9,.\-]', '', str(valor))
+    if ',' in texto and '.' in texto:
+        decimal = ',' if texto.rfind(',') > texto.rfind('.') else '.'
+        texto = texto.replace('.' if decimal == ',' else ',', '').replace(',', '.')
+    else:
+        texto = texto.replace(',', '.')
+    try:
+        return Decimal(texto).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ValueError(f'monto inválido: {valor}')
+
+
+def _fecha(valor):
+    texto = (str(valor).split() or [''])[0]  # Sin la hora, si la trae
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto[:8] if formato == '%Y%m%d' else texto[:10], formato).date()
+        except ValueError:
+            continue
+    raise ValueError(f'fecha inválida: {valor}')
+
+
+def _identificador(propio, fecha, monto, referencia, descripcion, repetidas):
+    """Id del banco, o huella de la línea (con su número de repetición dentro del archivo)."""
+    propio = (propio or '').strip()
+    if propio and len(propio) <= 100:
+        return propio
+    base = f'{propio}|{fecha}|{monto}|{referencia}|{descripcion}'
+    repetidas[base] += 1
+    return 'h:' + hashlib.sha1(f'{base}|{repetidas[base]}'.encode()).hexdigest()
+
+
+def _decodificar(contenido):
+    if isinstance(contenido, str):
+        return contenido
+    try:
+        return contenido.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return contenido.decode('latin-1')
+
+
+def leer_extracto(contenido, nombre=''):
+    """
+    Lee un extracto (bytes o texto) CSV u OFX. Retorna ([Linea], [errores]);
+    solo los abonos (monto positivo).
+    """
+    texto = _decodificar(contenido)
+    if nombre.lower().endswith(('.ofx', '.qfx')) or '<STMTTRN>' in texto.upper():
+        registros = _registros_ofx(texto)
+    else:
+        registros = _registros_csv(texto)
+    lineas, errores, repetidas = [], [], Counter()
+    for numero, datos in registros:
+        try:
+            monto = _monto(datos.get('monto') or '')
+            if monto <= 0:
+                continue  # Cargos: no corresponden a cobros
+            fecha = _fecha(datos.get('fecha') or '')
+        except ValueError as e:
+            errores.append(f'Línea {numero}: {e}')
+            continue
+        referencia = (datos.get('referencia') or '').strip()[:100]
+        descripcion = (datos.get('descripcion') or '').strip()[:200]
+        lineas.append(Linea(
+            _identificador(datos.get('identificador'), fecha, monto, referencia, descripcion, repetidas),
+            fecha, monto, referencia, descripcion,
+        ))
+    return lineas, errores
+
+
+def _registros_csv(texto):
+    muestra = texto[:4096]
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t') if muestra else csv.excel
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.DictReader(io.StringIO(texto), dialect=dialecto)
+    if not lector.fieldnames:
+        raise ConciliacionError('El extracto está vacío.')
+    columnas = {}
+    for original in lector.fieldnames:
+        clave = _sin_tildes((original or '').strip().lower()).replace(' ', '_')
+        for campo, nombres in COLUMNAS.items():
+            if clave in nombres and campo not in columnas:
+                columnas[campo] = original
+    faltan = [campo for campo in ('fecha', 'monto') if campo not in columnas]
+    if faltan:
+        raise ConciliacionError(f'Faltan columnas en el CSV: {", ".join(faltan)}')
+    for numero, fila in enumerate(lector, 2):
+        yield numero, {campo: fila.get(original) for campo, original in columnas.items()}
+
+
+def _registros_ofx(texto):
+    """Transacciones <STMTTRN> de un OFX (SGML o XML)."""
+    bloques = re.findall(r'<STMTTRN>(.*?)(?=</STMTTRN>|<STMTTRN>|</BANKTRANLIST>)', texto, re.S | re.I)
+    if not bloques:
+        raise ConciliacionError('El OFX no tiene transacciones.')
+    for numero, bloque in enumerate(bloques, 1):
+        etiquetas = {k.upper(): v.strip() for k, v in re.findall(r'<(\w+)>([^<\r\n]*)', bloque)}
+        yield numero, {
+            'identificador': etiquetas.get('FITID'),
+            'fecha': etiquetas.get('DTPOSTED', '')[:8],
+            'monto': etiquetas.get('TRNAMT'),
+            'referencia': etiquetas.get('REFNUM') or etiquetas.get('CHECKNUM') or '',
+            'descripcion': ' '.join(v for v in (etiquetas.get('NAME'), etiquetas.get('MEMO')) if v),
+        }
+
+
+def pagos_pendientes(desde, hasta, metodo_pago=None):
+    """Pagos por validar de ventas no canceladas entre las fechas locales `desde` y `hasta`."""
+    pagos = Pago.objects.filter(
+        validado=False,
+        fecha_pago__gte=inicio_dia(desde),
+        fecha_pago__lt=inicio_dia(hasta + timedelta(days=1)),
+        metodo_pago__requiere_validacion=True,
+    ).exclude(venta__estado='cancelado')
+    if metodo_pago is not None:
+        pagos = pagos.filter(metodo_pago=metodo_pago)
+    return pagos
+
+
+def emparejar(lineas, pagos, ventana=VENTANA_DIAS):
+    """
+    Empareja líneas del extracto con pagos (dicts con pk, monto, referencia,
+    fecha_pago). Retorna {índice de la línea: pago}; cada pago se usa una vez.
+    """
+    tz = timezone.get_current_timezone()
+    por_referencia, por_monto = defaultdict(list), defaultdict(list)
+    for pago in pagos:
+        pago['dia'] = timezone.localtime(pago['fecha_pago'], tz).date()
+        pago['ref'] = normalizar_referencia(pago['referencia'])
+        por_monto[pago['monto']].append(pago)
+        if pago['ref']:
+            por_referencia[(pago['monto'], pago['ref'])].append(pago)
+
+    usados, resultado = set(), {}
+
+    def cerca(linea, pago):
+        return pago['pk'] not in usados and abs((linea.fecha - pago['dia']).days) <= ventana
+
+    def tomar(indice, candidatos, linea):
+        if candidatos:
+            pago = min(candidatos, key=lambda p: (abs((linea.fecha - p['dia']).days), p['pk']))
+            usados.add(pago['pk'])
+            resultado[indice] = pago
+
+    # 1. Monto y referencia exactos
+    for indice, linea in enumerate(lineas):
+        ref = normalizar_referencia(linea.referencia)
+        if ref:
+            tomar(indice, [p for p in por_referencia.get((linea.monto, ref), ()) if cerca(linea, p)], linea)
+    # 2. La referencia del pago aparece en el texto del banco
+    for indice, linea in enumerate(lineas):
+        if indice in resultado:
+            continue
+        ref = normalizar_referencia(linea.referencia)
+        texto = normalizar_referencia(f'{linea.referencia} {linea.descripcion}')
+        tomar(indice, [
+            p for p in por_monto.get(linea.monto, ())
+            if len(p['ref']) >= 4 and (p['ref'] in texto or (len(ref) >= 4 and ref in p['ref'])) and cerca(linea, p)
+        ], linea)
+    # 3. Solo el monto, cuando no hay ambigüedad en ninguno de los dos lados
+    restantes = defaultdict(list)
+    for indice, linea in enumerate(lineas):
+        if indice not in resultado:
+            restantes[linea.monto].append(indice)
+    for monto, indices in restantes.items():
+        for indice in indices:
+            linea = lineas[indice]
+            candidatos = [p for p in por_monto.get(monto, ()) if not p['ref'] and cerca(linea, p)]
+            if len(candidatos) != 1:
+                continue
+            pago = candidatos[0]
+            rivales = [i for i in indices if i not in resultado and abs((lineas[i].fecha - pago['dia']).days) <= ventana]
+            if rivales == [indice]:
+                tomar(indice, candidatos, linea)
+    return resultado
+
+
+def conciliar(contenido, nombre, usuario=None, metodo_pago=None, ventana=VENTANA_DIAS):
+    """
+    Importa el extracto y valida los pagos que coinciden. Retorna
+    (ExtractoBancario, resumen) con resumen = {'lineas', 'conciliadas',
+    'por_revisar', 'duplicadas', 'errores'}.
+    """
+    lineas, errores = leer_extracto(contenido, nombre)
+    existentes = set()
+    ids = [linea.identificador for linea in lineas]
+    for i in range(0, len(ids), LOTE):
+        existentes.update(MovimientoBancario.objects.filter(
+            identificador__in=ids[i:i + LOTE]
+        ).values_list('identificador', flat=True))
+    nuevas = [linea for linea in lineas if linea.identificador not in existentes]
+    resumen = {'lineas': len(nuevas), 'conciliadas': 0, 'por_revisar': 0,
+               'duplicadas': len(lineas) - len(nuevas), 'errores': errores}
+    if not nuevas:
+        return None, resumen
+
+    margen = timedelta(days=ventana)
+    pagos = list(pagos_pendientes(
+        min(l.fecha for l in nuevas) - margen, max(l.fecha for l in nuevas) + margen, metodo_pago
+    ).values('pk', 'venta_id', 'metodo_pago_id', 'monto', 'referencia', 'fecha_pago'))
+    pares = emparejar(nuevas, pagos, ventana)
+
+    extracto = ExtractoBancario.objects.create(archivo=nombre[:200], metodo_pago=metodo_pago, usuario=usuario)
+    ahora = timezone.now()
+    coincidencias = sorted(pares.items())
+    for i in range(0, len(coincidencias), LOTE):
+        resumen['conciliadas'] += _validar_lote(extracto, [(nuevas[j], pago) for j, pago in coincidencias[i:i + LOTE]],
+                                                usuario, ahora)
+    sueltas = [
+        MovimientoBancario(extracto=extracto, pago=None, estado='revisar', **linea._asdict())
+        for j, linea in enumerate(nuevas) if j not in pares
+    ]
+    MovimientoBancario.objects.bulk_create(sueltas, batch_size=LOTE)
+    resumen['por_revisar'] = len(nuevas) - resumen['conciliadas']
+    ExtractoBancario.objects.filter(pk=extracto.pk).update(
+        lineas=len(nuevas), conciliadas=resumen['conciliadas'], por_revisar=resumen['por_revisar']
+    )
+    extracto.lineas, extracto.conciliadas, extracto.por_revisar = (
+        len(nuevas), resumen['conciliadas'], resumen['por_revisar']
+    )
+    return extracto, resumen
+
+
+@transaction.atomic
+def _validar_lote(extracto, pares, usuario, ahora):
+    """
+    Valida los pagos de `pares` [(Linea, pago)] en una transacción. Un pago que
+    otro usuario validó entretanto deja su línea 'revisar'. Retorna cuántas concilió.
+    """
+    vigentes = set(Pago.objects.select_for_update().filter(
+        pk__in=[pago['pk'] for _, pago in pares], validado=False
+    ).values_list('pk', flat=True))
+    validados = [pago for _, pago in pares if pago['pk'] in vigentes]
+    if validados:
+        Pago.objects.filter(pk__in=vigentes).update(validado=True, fecha_validacion=ahora, validado_por=usuario)
+        por_venta = defaultdict(Decimal)
+        for pago in validados:
+            por_venta[pago['venta_id']] += pago['monto']
+        Venta.objects.filter(pk__in=por_venta.keys()).update(monto_validado=Case(
+            *[When(pk=pk, then=F('monto_validado') + monto) for pk, monto in por_venta.items()],
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        ))
+        # Las filas de las ventas quedaron bloqueadas por el UPDATE hasta el commit
+        estados = dict(Venta.objects.filter(pk__in=por_venta.keys()).values_list('pk', 'estado'))
+        completadas = list(Venta.objects.filter(
+            pk__in=por_venta.keys(), estado='pendiente', monto_validado__gte=F('total')
+        ).values_list('pk', flat=True))
+        if completadas:
+            Venta.objects.filter(pk__in=completadas).update(estado='completado', actualizado=ahora)
+        eventos.validacion_en_lote(
+            [(pago['pk'], pago['venta_id']) for pago in validados if estados[pago['venta_id']] == 'completado'],
+            completadas,
+        )
+    MovimientoBancario.objects.bulk_create([
+        MovimientoBancario(
+            extracto=extracto,
+            pago_id=pago['pk'] if pago['pk'] in vigentes else None,
+            estado='conciliado' if pago['pk'] in vigentes else 'revisar',
+            **linea._asdict(),
+        )
+        for linea, pago in pares
+    ])
+    return len(validados)
+
+
+def candidatos(movimientos, ventana=VENTANA_DIAS, maximo=10):
+    """
+    Pagos pendientes que podrían corresponder a cada línea por revisar: mismo
+    monto dentro de la ventana, los `maximo` más cercanos en fecha. Una
+    consulta para todas. {movimiento.pk: [Pago]}.
+    """
+    movimientos = list(movimientos)
+    if not movimientos:
+        return {}
+    margen = timedelta(days=ventana)
+    pagos = pagos_pendientes(
+        min(m.fecha for m in movimientos) - margen, max(m.fecha for m in movimientos) + margen
+    ).filter(monto__in={m.monto for m in movimientos}).select_related('metodo_pago', 'venta')
+    por_monto = defaultdict(list)
+    for pago in pagos:
+        por_monto[pago.monto].append(pago)
+    resultado = {}
+    for movimiento in movimientos:
+        distancias = [
+            (abs((movimiento.fecha - timezone.localtime(pago.fecha_pago).date()).days), pago.pk, pago)
+            for pago in por_monto[movimiento.monto]
+        ]
+        resultado[movimiento.pk] = [pago for dias, _, pago in sorted(distancias) if dias <= ventana][:maximo]
+    return resultado
+
+
+def conciliar_manual(movimiento, pago, usuario):
+    """Concilia una línea por revisar con `pago` y valida el pago (como Pago.validar_pago)."""
+    with transaction.atomic():
+        movimiento = MovimientoBancario.objects.select_for_update().get(pk=movimiento.pk)
+        if movimiento.estado != 'revisar':
+            raise ConciliacionError('La línea del extracto ya fue resuelta.')
+        if pago.monto != movimiento.monto:
+            raise ConciliacionError(f'El monto del pago (Bs. {pago.monto}) no coincide con el del banco (Bs. {movimiento.monto}).')
+        if MovimientoBancario.objects.filter(pago=pago).exists():
+            raise ConciliacionError('El pago ya está conciliado con otra línea del extracto.')
+        pago.validar_pago(usuario)
+        movimiento.pago = pago
+        movimiento.estado = 'conciliado'
+        movimiento.save(update_fields=['pago', 'estado'])
+        ExtractoBancario.objects.filter(pk=movimiento.extracto_id).update(
+            conciliadas=F('conciliadas') + 1, por_revisar=F('por_revisar') - 1
+        )
+    return movimiento
+
+
+def ignorar(movimiento):
+    """Marca una línea por revisar como ignorada (no corresponde a un cobro del POS)."""
+    with transaction.atomic():
+        if not MovimientoBancario.objects.filter(pk=movimiento.pk, estado='revisar').update(estado='ignorado'):
+            raise ConciliacionError('La línea del extracto ya fue resuelta.')
+        ExtractoBancario.objects.filter(pk=movimiento.extracto_id).update(por_revisar=F('por_revisar') - 1)
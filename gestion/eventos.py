@@ -0,0 +1,277 @@
+"""
+Eventos posteriores a la venta, en cola en la tabla Evento.
+
+El checkout solo hace el trabajo que tiene que ser transaccional: stock,
+totales, numeración y pago. El resto (resúmenes del dashboard, de Reportes y
+del turno) se publica como evento dentro de la misma transacción de la venta
+(si la venta hace rollback, el evento desaparece con ella) y lo procesa un
+worker después del commit. Según EVENTOS_MODO:
+
+- 'hilo' (por defecto con MySQL): un hilo del mismo proceso, despertado con
+  transaction.on_commit apenas se confirma la venta.
+- 'externo': solo los workers de `manage.py procesar_eventos --continuo`.
+- 'sincrono' (por defecto con SQLite): al confirmarse la transacción, en la
+  misma petición. SQLite admite un solo escritor a la vez y un worker en
+  paralelo haría fallar con "database is locked" las ventas que coincidan.
+
+Cada evento se procesa en una transacción junto con sus efectos, así que se
+aplica exactamente una vez. Si un manejador falla, el evento se reintenta con
+espera creciente hasta EVENTOS_MAX_INTENTOS y luego queda en 'error'.
+
+Los datos del evento son una foto del momento en que se publicó (estado,
+total, pagos validados): los resúmenes se actualizan con sumas y restas, de
+modo que el resultado no depende del orden en que los workers procesen los
+eventos de una misma venta.
+
+Para agregar un efecto (p. ej. imprimir el ticket) se registra una función
+con @manejador(tipo); recibe el Evento.
+"""
+import logging
+import threading
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from . import resumenes
+from .sqlite import escritura
+from .models import DetalleVenta, Evento, Pago, Venta
+
+logger = logging.getLogger(__name__)
+
+VENTA_REGISTRADA = 'venta_registrada'
+VENTA_COMPLETADA = 'venta_completada'
+VENTA_CANCELADA = 'venta_cancelada'
+VENTA_REABIERTA = 'venta_reabierta'
+PAGO_VALIDADO = 'pago_validado'
+
+ESPERA_MAXIMA = 300  # Segundos máximos entre reintentos
+INTERVALO_HILO = 5  # El hilo revisa la cola cada tantos segundos aunque nadie lo despierte
+
+_manejadores = defaultdict(list)
+
+
+def manejador(tipo):
+    """Registra la función decorada como efecto de los eventos `tipo`."""
+    def registrar(funcion):
+        _manejadores[tipo].append(funcion)
+        return funcion
+    return registrar
+
+
+def publicar(tipo, **datos):
+    """Encola un evento en la transacción actual; se procesa después del commit."""
+    evento = Evento.objects.create(tipo=tipo, datos=datos)
+    transaction.on_commit(_despachar)
+    return evento
+
+
+def _despachar():
+    modo = getattr(settings, 'EVENTOS_MODO', None) or ('sincrono' if connection.vendor == 'sqlite' else 'hilo')
+    if modo == 'sincrono':
+        while procesar_pendientes():  # Un lote (conciliación) puede dejar más de un turno de eventos
+            pass
+    elif modo == 'hilo':
+        _hilo.despertar()
+
+
+def _pagos(pagos):
+    return [[metodo_pago_id, str(monto)] for metodo_pago_id, monto in pagos]
+
+
+def venta_registrada(venta, cantidad, metodo_pago_id, pagos):
+    """`pagos`: pagos validados de la venta como (metodo_pago_id, monto)."""
+    publicar(
+        VENTA_REGISTRADA,
+        venta_id=venta.pk,
+        estado=venta.estado,
+        total=str(venta.total),
+        cantidad=cantidad,
+        metodo_pago_id=metodo_pago_id,
+        pagos=_pagos(pagos),
+    )
+
+
+def cambio_estado(venta, estado_anterior, cantidad=None):
+    """Publica el paso de la venta de `estado_anterior` a `venta.estado`."""
+    if estado_anterior == venta.estado:
+        return
+    if cantidad is None:
+        cantidad = venta.detalles.aggregate(c=Sum('cantidad'))['c'] or 0
+    tipo = {'completado': VENTA_COMPLETADA, 'cancelado': VENTA_CANCELADA}.get(venta.estado, VENTA_REABIERTA)
+    publicar(
+        tipo,
+        venta_id=venta.pk,
+        estado_anterior=estado_anterior,
+        estado=venta.estado,
+        total=str(venta.total),
+        cantidad=cantidad,
+        pagos=_pagos(venta.pagos.filter(validado=True).values_list('metodo_pago_id', 'monto')),
+    )
+
+
+def pago_validado(pago):
+    publicar(PAGO_VALIDADO, venta_id=pago.venta_id, pago_id=pago.pk)
+
+
+def validacion_en_lote(pagos, completadas):
+    """
+    Eventos de pagos validados en lote (conciliación bancaria), en un solo INSERT:
+    pago_validado por cada (pago_id, venta_id) de `pagos` (ventas que ya estaban
+    completadas) y venta_completada por cada venta de `completadas` (ids), con
+    su foto leída en tres consultas para todas.
+    """
+    lote = [Evento(tipo=PAGO_VALIDADO, datos={'venta_id': venta_id, 'pago_id': pago_id}) for pago_id, venta_id in pagos]
+    if completadas:
+        cantidades = dict(
+            DetalleVenta.objects.filter(venta_id__in=completadas).values('venta_id')
+            .annotate(c=Sum('cantidad')).values_list('venta_id', 'c')
+        )
+        validados = defaultdict(list)
+        for venta_id, metodo_pago_id, monto in Pago.objects.filter(
+            venta_id__in=completadas, validado=True
+        ).values_list('venta_id', 'metodo_pago_id', 'monto'):
+            validados[venta_id].append((metodo_pago_id, monto))
+        for pk, total in Venta.objects.filter(pk__in=completadas).values_list('pk', 'total'):
+            lote.append(Evento(tipo=VENTA_COMPLETADA, datos={
+                'venta_id': pk,
+                'estado_anterior': 'pendiente',
+                'estado': 'completado',
+                'total': str(total),
+                'cantidad': cantidades.get(pk, 0),
+                'pagos': _pagos(validados[pk]),
+            }))
+    if lote:
+        Evento.objects.bulk_create(lote)
+        transaction.on_commit(_despachar)
+
+
+def procesar_pendientes(limite=100):
+    """Procesa hasta `limite` eventos disponibles. Retorna cuántos tomó (con o sin error)."""
+    procesados = 0
+    while procesados < limite:
+        tomado = _procesar_uno()
+        if tomado is None:
+            break
+        procesados += tomado
+    return procesados
+
+
+def _procesar_uno():
+    """Procesa el evento disponible más antiguo: 1 si lo tomó, 0 si lo tomó otro worker, None si no hay."""
+    ahora = timezone.now()
+    with escritura():
+        disponibles = Evento.objects.filter(estado='pendiente', disponible__lte=ahora).order_by('pk')
+        if connection.features.has_select_for_update_skip_locked:
+            disponibles = disponibles.select_for_update(skip_locked=True)
+        evento = disponibles.first()
+        if evento is None:
+            return None
+        # UPDATE condicional: en bases sin SKIP LOCKED (SQLite) solo un worker lo toma
+        tomado = Evento.objects.filter(pk=evento.pk, estado='pendiente').update(
+            estado='hecho', procesado=ahora, intentos=F('intentos') + 1, error=None
+        )
+        if not tomado:
+            return 0
+        try:
+            with transaction.atomic():
+                for funcion in _manejadores[evento.tipo]:
+                    funcion(evento)
+        except Exception as e:
+            logger.exception('Falló el evento %s #%s', evento.tipo, evento.pk)
+            intentos = evento.intentos + 1
+            agotado = intentos >= getattr(settings, 'EVENTOS_MAX_INTENTOS', 5)
+            Evento.objects.filter(pk=evento.pk).update(
+                estado='error' if agotado else 'pendiente',
+                procesado=None,
+                error=f'{type(e).__name__}: {e}',
+                disponible=ahora + timedelta(seconds=min(2 ** intentos, ESPERA_MAXIMA)),
+            )
+    return 1
+
+
+def reintentar_errores():
+    """Vuelve a encolar los eventos que agotaron sus intentos. Retorna cuántos."""
+    return Evento.objects.filter(estado='error').update(estado='pendiente', intentos=0, disponible=timezone.now())
+
+
+def purgar(dias):
+    """Borra los eventos procesados hace más de `dias` días. Retorna cuántos."""
+    limite = timezone.now() - timedelta(days=dias)
+    return Evento.objects.filter(estado='hecho', procesado__lt=limite).delete()[0]
+
+
+class _Hilo:
+    """Worker en un hilo del proceso; se inicia con el primer evento publicado."""
+
+    def __init__(self):
+        self._senal = threading.Event()
+        self._bloqueo = threading.Lock()
+        self._hilo = None
+
+    def despertar(self):
+        with self._bloqueo:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._ciclo, name='gestion-eventos', daemon=True)
+                self._hilo.start()
+        self._senal.set()
+
+    def _ciclo(self):
+        while True:
+            self._senal.wait(INTERVALO_HILO)
+            self._senal.clear()
+            try:
+                while procesar_pendientes():
+                    pass
+            except Exception:
+                logger.exception('Error en el hilo de eventos')
+            finally:
+                connection.close()  # La conexión de este hilo; se reabre en la próxima vuelta
+
+
+_hilo = _Hilo()
+
+
+# Manejadores: resúmenes del dashboard, de Reportes y del turno (ver resumenes.py)
+
+def _venta(evento):
+    """La venta del evento con el estado y total de la foto del evento."""
+    venta = Venta.objects.get(pk=evento.datos['venta_id'])
+    venta.estado = evento.datos['estado']
+    venta.total = Decimal(evento.datos['total'])
+    return venta
+
+
+def _leer_pagos(datos):
+    return [(metodo_pago_id, Decimal(monto)) for metodo_pago_id, monto in datos['pagos']]
+
+
+@manejador(VENTA_REGISTRADA)
+def _resumir_venta(evento):
+    resumenes.registrar_venta(
+        _venta(evento),
+        evento.datos['cantidad'],
+        metodo_pago_id=evento.datos['metodo_pago_id'],
+        pagos=_leer_pagos(evento.datos),
+    )
+
+
+@manejador(VENTA_COMPLETADA)
+@manejador(VENTA_CANCELADA)
+@manejador(VENTA_REABIERTA)
+def _resumir_cambio_estado(evento):
+    resumenes.registrar_cambio_estado(
+        _venta(evento),
+        evento.datos['estado_anterior'],
+        evento.datos['cantidad'],
+        pagos=_leer_pagos(evento.datos),
+    )
+
+
+@manejador(PAGO_VALIDADO)
+def _resumir_pago(evento):
+    resumenes.registrar_pago_validado(Pago.objects.select_related('venta').get(pk=evento.datos['pago_id']))
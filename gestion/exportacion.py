@@ -0,0 +1,90 @@
+"""
+Exportación de ventas, detalles y pagos a CSV para contabilidad.
+
+Las filas se generan en lotes (paginacion.recorrer_por_lotes) y se escriben a
+medida que se leen, de modo que la memoria no crece con la cantidad de filas.
+Lo usan la vista exportar_ventas (StreamingHttpResponse) y el comando
+exportar_ventas.
+
+Detalles y pagos se leen de la misma base que el queryset de ventas (la
+réplica, si la vista o el comando lee de ella; ver replicas.py).
+
+Se exporta CSV (UTF-8 con BOM para que Excel respete los acentos); XLSX
+requeriría una dependencia adicional y no se puede escribir por partes.
+"""
+import codecs
+import csv
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import DetalleVenta, Pago
+from .paginacion import recorrer_por_lotes
+
+TIPOS = ('ventas', 'detalles', 'pagos')
+
+
+def _tamano_lote():
+    return getattr(settings, 'EXPORTACION_TAMANO_LOTE', 2000)
+
+
+def _fecha(valor):
+    return timezone.localtime(valor).strftime('%Y-%m-%d %H:%M:%S') if valor else ''
+
+
+def _filas_ventas(ventas):
+    yield ['venta_id', 'fecha', 'tipo_documento', 'numero_ticket', 'numero_factura',
+           'cliente', 'ci_nit', 'vendedor', 'modo_consumo', 'subtotal', 'descuento_total',
+           'total', 'estado']
+    campos = ('fecha', 'tipo_documento', 'numero_ticket', 'numero_factura',
+              'cliente__nombre_completo', 'cliente__ci_nit', 'usuario__username',
+              'modo_consumo', 'subtotal', 'descuento_total', 'total', 'estado')
+    for pk, fecha, *resto in recorrer_por_lotes(ventas, ('pk',) + campos, _tamano_lote()):
+        yield [pk, _fecha(fecha), *['' if v is None else v for v in resto]]
+
+
+def _filas_detalles(ventas):
+    yield ['detalle_id', 'venta_id', 'fecha_venta', 'producto_id', 'producto', 'cantidad',
+           'precio_unitario', 'descuento_porcentaje', 'descuento_aplicado', 'subtotal']
+    detalles = DetalleVenta.objects.using(ventas.db).filter(venta__in=ventas.order_by().values('pk'))
+    campos = ('pk', 'venta_id', 'venta__fecha', 'producto_id', 'producto__nombre', 'cantidad',
+              'precio_unitario', 'descuento_porcentaje', 'descuento_aplicado', 'subtotal')
+    for pk, venta_id, fecha, *resto in recorrer_por_lotes(detalles, campos, _tamano_lote()):
+        yield [pk, venta_id, _fecha(fecha), *resto]
+
+
+def _filas_pagos(ventas):
+    yield ['pago_id', 'venta_id', 'fecha_pago', 'metodo_pago', 'monto', 'referencia',
+           'validado', 'fecha_validacion', 'validado_por']
+    pagos = Pago.objects.using(ventas.db).filter(venta__in=ventas.order_by().values('pk'))
+    campos = ('pk', 'venta_id', 'fecha_pago', 'metodo_pago__nombre', 'monto', 'referencia',
+              'validado', 'fecha_validacion', 'validado_por__username')
+    for pk, venta_id, fecha_pago, metodo, monto, referencia, validado, fecha_val, por in recorrer_por_lotes(
+        pagos, campos, _tamano_lote()
+    ):
+        yield [pk, venta_id, _fecha(fecha_pago), metodo, monto, referencia or '',
+               'si' if validado else 'no', _fecha(fecha_val), por or '']
+
+
+def filas(tipo, ventas):
+    """Generador de filas (encabezado primero) del `tipo` pedido para el queryset de ventas."""
+    if tipo == 'detalles':
+        return _filas_detalles(ventas)
+    if tipo == 'pagos':
+        return _filas_pagos(ventas)
+    return _filas_ventas(ventas)
+
+
+class _Eco:
+    """Pseudo-archivo: csv.writer devuelve la línea en lugar de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+def csv_por_partes(tipo, ventas):
+    """Genera el CSV línea por línea (bytes), con BOM UTF-8 al inicio."""
+    writer = csv.writer(_Eco())
+    yield codecs.BOM_UTF8
+    for fila in filas(tipo, ventas):
+        yield writer.writerow(fila).encode('utf-8')
@@ -0,0 +1,32 @@
+"""
+Rangos de fechas locales (America/La_Paz) para filtrar DateTimeField.
+
+Filtrar con `fecha__date=...` obliga a la base de datos a convertir cada fila
+(DATE(CONVERT_TZ(fecha, ...)) en MySQL) y no puede usar índices. Aquí cada día
+local se traduce a un rango semiabierto [inicio, fin) de datetimes con zona
+horaria, que sí usa los índices sobre `fecha`.
+"""
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+
+def inicio_dia(fecha):
+    """Datetime con zona horaria del inicio (00:00 local) del día `fecha`."""
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def rango_dias(desde, hasta=None):
+    """(inicio, fin) que cubre los días locales desde `desde` hasta `hasta` inclusive."""
+    hasta = hasta or desde
+    return inicio_dia(desde), inicio_dia(hasta + timedelta(days=1))
+
+
+def filtro_dias(campo, desde, hasta=None):
+    """
+    kwargs para .filter() equivalentes a `campo__date__gte=desde, campo__date__lte=hasta`.
+
+    Ejemplo: Venta.objects.filter(**filtro_dias('fecha', hoy))
+    """
+    inicio, fin = rango_dias(desde, hasta)
+    return {f'{campo}__gte': inicio, f'{campo}__lt': fin}
@@ -0,0 +1,137 @@
+"""
+Miniaturas de las fotos de productos (WebP y JPEG).
+
+Las fotos originales pueden pesar cientos de KB y el POS las muestra en
+tarjetas pequeñas. Al guardar la imagen de un producto se generan versiones
+reducidas a unos anchos fijos, en WebP y en JPEG (respaldo para navegadores sin
+WebP), junto al original:
+
+    productos/pollo.jpg
+    productos/pollo.3f2a9c1b7d0e.320w.webp
+    productos/pollo.3f2a9c1b7d0e.320w.jpg
+
+El hash es del contenido del original: si la foto cambia, cambian los nombres
+y ningún navegador muestra una miniatura vieja desde su caché. Las rutas quedan
+en Producto.imagen_variantes ({'webp': {'320': ruta}, 'jpeg': {...}}) para no
+tocar el disco al dibujar.
+"""
+import hashlib
+import io
+import posixpath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+ANCHOS = (160, 320, 640)
+FORMATOS = {
+    'webp': {'extension': 'webp', 'pil': 'WEBP', 'opciones': {'quality': 80, 'method': 4}},
+    'jpeg': {'extension': 'jpg', 'pil': 'JPEG', 'opciones': {'quality': 82, 'optimize': True, 'progressive': True}},
+}
+
+
+class ImagenError(Exception):
+    """La imagen original no existe o Pillow no puede leerla."""
+
+
+def _a_rgb(imagen):
+    """RGB sin transparencia (fondo blanco), válido para JPEG y WebP."""
+    if imagen.mode in ('RGBA', 'LA') or (imagen.mode == 'P' and 'transparency' in imagen.info):
+        imagen = imagen.convert('RGBA')
+        fondo = Image.new('RGB', imagen.size, (255, 255, 255))
+        fondo.paste(imagen, mask=imagen.split()[-1])
+        return fondo
+    return imagen.convert('RGB')
+
+
+def generar_derivados(nombre, storage=None, forzar=False):
+    """
+    Genera las miniaturas de la imagen `nombre` del storage y retorna las variantes
+    ({formato: {ancho: ruta}}). No usa la base de datos (se puede llamar desde
+    otros procesos). Las miniaturas que ya existen no se vuelven a generar salvo
+    con `forzar`.
+    """
+    storage = storage or default_storage
+    try:
+        with storage.open(nombre, 'rb') as archivo:
+            contenido = archivo.read()
+        imagen = ImageOps.exif_transpose(Image.open(io.BytesIO(contenido)))
+        imagen = _a_rgb(imagen)
+    except (OSError, UnidentifiedImageError) as e:
+        raise ImagenError(f'No se pudo leer {nombre}: {e}')
+
+    huella = hashlib.sha1(contenido).hexdigest()[:12]
+    carpeta, archivo_original = posixpath.split(nombre)
+    base = posixpath.splitext(archivo_original)[0]
+
+    variantes = {formato: {} for formato in FORMATOS}
+    for ancho in ANCHOS:
+        ancho_real = min(ancho, imagen.width)
+        alto = max(1, round(imagen.height * ancho_real / imagen.width))
+        reducida = None
+        for formato, config in FORMATOS.items():
+            ruta = posixpath.join(carpeta, f"{base}.{huella}.{ancho}w.{config['extension']}")
+            if forzar or not storage.exists(ruta):
+                if reducida is None:
+                    reducida = imagen.resize((ancho_real, alto), Image.LANCZOS)
+                salida = io.BytesIO()
+                reducida.save(salida, config['pil'], **config['opciones'])
+                if storage.exists(ruta):
+                    storage.delete(ruta)
+                ruta = storage.save(ruta, ContentFile(salida.getvalue()))
+            variantes[formato][str(ancho)] = ruta
+    return variantes
+
+
+def eliminar_derivados(variantes, storage=None, conservar=None):
+    """Borra del storage las miniaturas de `variantes` (excepto las rutas en `conservar`)."""
+    storage = storage or default_storage
+    conservar = set(conservar or ())
+    for rutas in (variantes or {}).values():
+        for ruta in rutas.values():
+            if ruta not in conservar and storage.exists(ruta):
+                storage.delete(ruta)
+
+
+def guardar_variantes(producto, variantes):
+    """Guarda `variantes` en el producto y borra las miniaturas anteriores que ya no se usan."""
+    anteriores = producto.imagen_variantes or {}
+    nuevas = {ruta for rutas in variantes.values() for ruta in rutas.values()}
+    eliminar_derivados(anteriores, conservar=nuevas)
+    if variantes != anteriores:
+        producto.imagen_variantes = variantes
+        producto.save(update_fields=['imagen_variantes'])
+
+
+def actualizar_producto(producto, forzar=False):
+    """
+    Regenera las miniaturas de `producto.imagen` y las guarda en imagen_variantes.
+    Lanza ImagenError si la imagen no se puede leer.
+    """
+    variantes = generar_derivados(producto.imagen.name, forzar=forzar) if producto.imagen else {}
+    guardar_variantes(producto, variantes)
+    return variantes
+
+
+def ruta_variante(variantes, ancho, formato='jpeg'):
+    """
+    Ruta de la miniatura más chica con al menos `ancho` px (o la más grande
+    disponible); None si no hay miniaturas en ese formato.
+    """
+    rutas = (variantes or {}).get(formato)
+    if not rutas:
+        return None
+    anchos = sorted(int(a) for a in rutas)
+    elegido = next((a for a in anchos if a >= ancho), anchos[-1])
+    return rutas[str(elegido)]
+
+
+def srcset(variantes, ancho, formato='jpeg'):
+    """srcset con la miniatura para `ancho` px (1x) y para pantallas 2x; '' si no hay."""
+    x1 = ruta_variante(variantes, ancho, formato)
+    if not x1:
+        return ''
+    x2 = ruta_variante(variantes, ancho * 2, formato)
+    if x1 == x2:
+        return default_storage.url(x1)
+    return f'{default_storage.url(x1)} 1x, {default_storage.url(x2)} 2x'
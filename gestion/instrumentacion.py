@@ -0,0 +1,204 @@
+"""
+Instrumentación de vistas: consultas SQL, tiempo de base de datos, de plantillas y total.
+
+InstrumentacionMiddleware mide cada petición y la acumula por nombre de URL
+(`pos`, `venta_index`, ...):
+
+- consultas y tiempo de BD con connection.execute_wrapper (todas las conexiones),
+- tiempo de plantillas envolviendo el render del backend de plantillas de Django,
+- tiempo total de la vista.
+
+Con DEBUG o para usuarios staff agrega la cabecera Server-Timing (visible en la
+pestaña Red del navegador). Las estadísticas (histograma de tiempos, promedios
+y máximos) viven en memoria de cada proceso y se ven en /rendimiento/.
+
+Los presupuestos por vista (PRESUPUESTOS_VISTAS en settings) marcan las
+peticiones que los superan; el comando verificar_presupuestos recorre las
+vistas y falla si alguna los excede.
+"""
+import logging
+import threading
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import Template as _PlantillaDjango
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores (ms) de las barras del histograma; la última barra es "más de 2500 ms"
+LIMITES_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_medicion_actual = ContextVar('gestion_medicion', default=None)
+
+
+class Medicion:
+    """Métricas de una petición."""
+
+    __slots__ = ('consultas', 'db_ms', 'plantillas_ms', 'total_ms', 'vista', 'excedido')
+
+    def __init__(self):
+        self.consultas = 0
+        self.db_ms = 0.0
+        self.plantillas_ms = 0.0
+        self.total_ms = 0.0
+        self.vista = None
+        self.excedido = []
+
+    def __call__(self, execute, sql, params, many, context):
+        """execute_wrapper: cuenta y cronometra cada consulta."""
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_ms += (time.perf_counter() - inicio) * 1000
+            self.consultas += 1
+
+    def server_timing(self):
+        return (
+            f'db;dur={self.db_ms:.1f};desc="{self.consultas} consultas", '
+            f'tpl;dur={self.plantillas_ms:.1f};desc="Plantillas", '
+            f'total;dur={self.total_ms:.1f}'
+        )
+
+
+def _render_medido(render):
+    def wrapper(self, context=None, request=None):
+        medicion = _medicion_actual.get()
+        if medicion is None:
+            return render(self, context, request)
+        inicio = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            medicion.plantillas_ms += (time.perf_counter() - inicio) * 1000
+    wrapper.medido = True
+    return wrapper
+
+
+if not getattr(_PlantillaDjango.render, 'medido', False):
+    # Solo se suma tiempo dentro de una petición medida: fuera de ella no cambia nada
+    _PlantillaDjango.render = _render_medido(_PlantillaDjango.render)
+
+
+def presupuesto(vista):
+    """Presupuesto configurado para `vista` ({'consultas': n, 'ms': n}) o {}."""
+    return getattr(settings, 'PRESUPUESTOS_VISTAS', {}).get(vista, {})
+
+
+def excesos(medicion):
+    """Lista de textos con lo que `medicion` supera de su presupuesto."""
+    limite = presupuesto(medicion.vista)
+    resultado = []
+    if 'consultas' in limite and medicion.consultas > limite['consultas']:
+        resultado.append(f"{medicion.consultas} consultas (máx. {limite['consultas']})")
+    if 'ms' in limite and medicion.total_ms > limite['ms']:
+        resultado.append(f"{medicion.total_ms:.0f} ms (máx. {limite['ms']})")
+    return resultado
+
+
+class Estadisticas:
+    """Acumulado por vista en memoria del proceso (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._vistas = {}
+
+    def registrar(self, medicion):
+        with self._lock:
+            fila = self._vistas.get(medicion.vista)
+            if fila is None:
+                fila = self._vistas[medicion.vista] = {
+                    'peticiones': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'db_ms': 0.0,
+                    'plantillas_ms': 0.0, 'consultas': 0, 'max_consultas': 0, 'excedidas': 0,
+                    'histograma': [0] * (len(LIMITES_MS) + 1),
+                }
+            fila['peticiones'] += 1
+            fila['total_ms'] += medicion.total_ms
+            fila['max_ms'] = max(fila['max_ms'], medicion.total_ms)
+            fila['db_ms'] += medicion.db_ms
+            fila['plantillas_ms'] += medicion.plantillas_ms
+            fila['consultas'] += medicion.consultas
+            fila['max_consultas'] = max(fila['max_consultas'], medicion.consultas)
+            fila['excedidas'] += 1 if medicion.excedido else 0
+            indice = next((i for i, limite in enumerate(LIMITES_MS) if medicion.total_ms <= limite), len(LIMITES_MS))
+            fila['histograma'][indice] += 1
+
+    def reiniciar(self):
+        with self._lock:
+            self._vistas.clear()
+
+    def resumen(self):
+        """Filas por vista con promedios y percentiles aproximados (límite de la barra)."""
+        with self._lock:
+            copia = {vista: dict(fila, histograma=list(fila['histograma'])) for vista, fila in self._vistas.items()}
+        filas = []
+        for vista, fila in sorted(copia.items(), key=lambda par: -par[1]['total_ms']):
+            n = fila['peticiones']
+            filas.append({
+                'vista': vista,
+                'peticiones': n,
+                'promedio_ms': fila['total_ms'] / n,
+                'p50_ms': _percentil(fila['histograma'], n, 0.50, fila['max_ms']),
+                'p95_ms': _percentil(fila['histograma'], n, 0.95, fila['max_ms']),
+                'max_ms': fila['max_ms'],
+                'db_ms': fila['db_ms'] / n,
+                'plantillas_ms': fila['plantillas_ms'] / n,
+                'consultas': fila['consultas'] / n,
+                'max_consultas': fila['max_consultas'],
+                'excedidas': fila['excedidas'],
+                'presupuesto': presupuesto(vista),
+                'histograma': fila['histograma'],
+            })
+        return filas
+
+
+def _percentil(histograma, n, fraccion, maximo):
+    objetivo = n * fraccion
+    acumulado = 0
+    for i, cantidad in enumerate(histograma):
+        acumulado += cantidad
+        if acumulado >= objetivo:
+            return min(LIMITES_MS[i], maximo) if i < len(LIMITES_MS) else maximo
+    return maximo
+
+
+estadisticas = Estadisticas()
+
+
+class InstrumentacionMiddleware:
+    """Mide consultas y tiempos de cada vista (ver docstring del módulo)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'INSTRUMENTACION_ACTIVA', True):
+            return self.get_response(request)
+
+        medicion = Medicion()
+        token = _medicion_actual.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            with ExitStack() as pila:
+                for alias in connections:
+                    pila.enter_context(connections[alias].execute_wrapper(medicion))
+                response = self.get_response(request)
+        finally:
+            medicion.total_ms = (time.perf_counter() - inicio) * 1000
+            _medicion_actual.reset(token)
+
+        coincidencia = getattr(request, 'resolver_match', None)
+        medicion.vista = coincidencia.view_name if coincidencia else '(sin ruta)'
+        medicion.excedido = excesos(medicion)
+        if medicion.excedido:
+            logger.warning('Presupuesto excedido en %s: %s', medicion.vista, ', '.join(medicion.excedido))
+        estadisticas.registrar(medicion)
+
+        response.instrumentacion = medicion
+        user = getattr(request, 'user', None)
+        if settings.DEBUG or (user is not None and user.is_staff):
+            response['Server-Timing'] = medicion.server_timing()
+        return response
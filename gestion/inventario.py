@@ -0,0 +1,238 @@
+"""
+Inventario: libro de movimientos de stock y contadores repartidos.
+
+Cada cambio de stock agrega una fila a MovimientoStock (venta, anulación,
+reposición o ajuste) y actualiza el contador en la misma transacción: la suma
+del libro de un producto es su stock (ver diferencias()).
+
+El contador de un producto es Producto.stock más sus fracciones. Nadie lo
+escribe con save(): se suma o resta con UPDATE ... F('stock'), así una
+edición del producto en paralelo no pisa las ventas. El checkout consulta el
+stock con disponible(), sin bloquear filas, y el descuento se comprueba al
+final (si deja el stock en negativo, StockInsuficiente y la transacción se
+deshace); la fila del producto queda bloqueada solo desde ese UPDATE hasta el
+commit.
+
+Un producto muy vendido (p. ej. el combo "Chiquitin") puede repartir su stock
+en N filas FraccionStock (Producto.fracciones_stock = N): cada movimiento va a
+una fracción al azar y las cajas no esperan todas por la misma fila (la única
+fila que comparten todas, la serie de tickets/facturas, se toma al final del
+checkout y se retiene solo hasta el commit; ver ventas.py). El stock
+es Producto.stock + la suma de sus fracciones; compactar() (comando
+compactar_stock, periódico) pasa las fracciones a Producto.stock. Con
+fracciones, el control de stock insuficiente solo ve lo confirmado por las
+otras cajas: dos ventas simultáneas de las últimas unidades pueden dejar el
+stock unas unidades en negativo. Úselo en productos con stock holgado.
+"""
+import random
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import FraccionStock, MovimientoStock, Producto
+
+VENTA = 'venta'
+ANULACION = 'anulacion'
+REPOSICION = 'reposicion'
+AJUSTE = 'ajuste'
+
+
+class StockInsuficiente(Exception):
+    """Un movimiento dejaría el stock de un producto en negativo."""
+
+    def __init__(self, producto_id):
+        super().__init__(f'Stock insuficiente para el producto {producto_id}')
+        self.producto_id = producto_id
+
+
+def _suma(queryset, campo):
+    """Subconsulta: suma de `campo` de las filas de `queryset` del producto (0 si no hay)."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(producto=OuterRef('pk')).values('producto').annotate(s=Sum(campo)).values('s')[:1],
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+def con_stock(queryset):
+    """Anota stock_disponible (Producto.stock + fracciones) en un queryset de productos."""
+    return queryset.annotate(stock_disponible=F('stock') + _suma(FraccionStock.objects.all(), 'cantidad'))
+
+
+def disponible(productos):
+    """
+    Stock disponible {producto_id: unidades}, sin bloquear filas. `productos`:
+    objetos Producto (una consulta solo si alguno tiene fracciones) o ids.
+    """
+    stock, repartidos, ids = {}, [], []
+    for producto in productos:
+        if isinstance(producto, Producto):
+            stock[producto.pk] = producto.stock
+            if producto.fracciones_stock:
+                repartidos.append(producto.pk)
+        else:
+            ids.append(producto)
+    if repartidos:
+        fracciones = FraccionStock.objects.filter(producto_id__in=repartidos).values('producto_id')
+        for producto_id, cantidad in fracciones.annotate(s=Sum('cantidad')).values_list('producto_id', 's'):
+            stock[producto_id] += cantidad
+    if ids:
+        stock.update(con_stock(Producto.objects.filter(pk__in=ids)).values_list('pk', 'stock_disponible'))
+    return stock
+
+
+def mover(cantidades, tipo, venta=None, usuario=None, nota='', productos=None):
+    """
+    Registra los movimientos {producto_id: cantidad} (negativa: sale stock) y
+    actualiza los contadores. Llamar dentro de la transacción del documento
+    (venta, anulación). Lanza StockInsuficiente si una salida deja el stock en
+    negativo. `productos`: {id: Producto} ya consultados, para no volver a leer
+    cuáles tienen fracciones.
+    """
+    ahora = timezone.now()
+    registrar(
+        [MovimientoStock(producto_id=pk, tipo=tipo, cantidad=cantidad, venta=venta,
+                         usuario=usuario, fecha=ahora, nota=nota)
+         for pk, cantidad in cantidades.items() if cantidad],
+        productos,
+    )
+
+
+def registrar(movimientos, productos=None):
+    """Guarda los MovimientoStock (uno por producto) y aplica sus cantidades; ver mover()."""
+    if not movimientos:
+        return
+    cantidades = {m.producto_id: m.cantidad for m in movimientos}
+    if productos is None:
+        productos = Producto.objects.only('pk', 'fracciones_stock').in_bulk(cantidades.keys())
+    with transaction.atomic(savepoint=False):
+        if len(movimientos) == 1:
+            movimientos[0].save()  # Con save() el movimiento queda con su id también en MySQL
+        else:
+            MovimientoStock.objects.bulk_create(movimientos)
+        directos, repartidos = {}, {}
+        for pk, cantidad in cantidades.items():
+            producto = productos.get(pk)
+            (repartidos if producto is not None and producto.fracciones_stock else directos)[pk] = cantidad
+        if directos:
+            Producto.objects.filter(pk__in=directos.keys()).update(
+                stock=Case(*[When(pk=pk, then=F('stock') + c) for pk, c in directos.items()],
+                           output_field=IntegerField())
+            )
+        if repartidos:
+            _mover_fracciones({pk: (random.randrange(productos[pk].fracciones_stock), c) for pk, c in repartidos.items()})
+        salidas = [pk for pk, cantidad in cantidades.items() if cantidad < 0]
+        if salidas:
+            sin_stock = con_stock(Producto.objects.filter(pk__in=salidas)).filter(stock_disponible__lt=0)
+            producto_id = sin_stock.values_list('pk', flat=True).first()
+            if producto_id is not None:
+                raise StockInsuficiente(producto_id)
+
+
+def _mover_fracciones(elegidas):
+    """Suma a la fracción elegida de cada producto: {producto_id: (numero, cantidad)}."""
+    def actualizar(elegidas):
+        return FraccionStock.objects.filter(
+            reduce(or_, (Q(producto_id=pk, numero=numero) for pk, (numero, _) in elegidas.items()))
+        ).update(cantidad=Case(
+            *[When(producto_id=pk, then=F('cantidad') + c) for pk, (_, c) in elegidas.items()],
+            output_field=IntegerField(),
+        ))
+
+    if actualizar(elegidas) == len(elegidas):
+        return
+    # Fracciones que aún no existen (recién configuradas): crearlas y sumar solo en ellas
+    existentes = set(
+        FraccionStock.objects.filter(producto_id__in=elegidas.keys()).values_list('producto_id', 'numero')
+    )
+    faltantes = {pk: (numero, c) for pk, (numero, c) in elegidas.items() if (pk, numero) not in existentes}
+    FraccionStock.objects.bulk_create(
+        [FraccionStock(producto_id=pk, numero=numero) for pk, (numero, _) in faltantes.items()],
+        ignore_conflicts=True,
+    )
+    actualizar(faltantes)
+
+
+def fijar(stocks, usuario=None, nota=''):
+    """
+    Fija el stock {producto_id: unidades} (inventario físico, importación de
+    catálogo): registra la diferencia como ajuste y compacta las fracciones.
+    Retorna cuántos productos cambiaron.
+    """
+    if not stocks:
+        return 0
+    with transaction.atomic():
+        # Mismo orden de bloqueo que compactar(): producto y luego sus fracciones
+        productos = Producto.objects.select_for_update().only('pk', 'stock').in_bulk(stocks.keys())
+        fracciones = dict.fromkeys(productos, 0)
+        for producto_id, cantidad in FraccionStock.objects.select_for_update().filter(
+            producto_id__in=productos.keys()
+        ).values_list('producto_id', 'cantidad'):
+            fracciones[producto_id] += cantidad
+        ahora = timezone.now()
+        movimientos = [
+            MovimientoStock(producto_id=pk, tipo=AJUSTE, cantidad=stocks[pk] - (p.stock + fracciones[pk]),
+                            usuario=usuario, fecha=ahora, nota=nota)
+            for pk, p in productos.items() if stocks[pk] != p.stock + fracciones[pk]
+        ]
+        MovimientoStock.objects.bulk_create(movimientos, batch_size=1000)
+        cambiados = [m.producto_id for m in movimientos]
+        if cambiados:
+            Producto.objects.filter(pk__in=cambiados).update(
+                stock=Case(*[When(pk=pk, then=Value(stocks[pk])) for pk in cambiados], output_field=IntegerField())
+            )
+            FraccionStock.objects.filter(producto_id__in=cambiados).exclude(cantidad=0).update(cantidad=0)
+    return len(cambiados)
+
+
+def stock_inicial(productos, usuario=None, nota='Stock inicial'):
+    """Registra como ajuste el stock con que se crearon `productos` (objetos o queryset)."""
+    MovimientoStock.objects.bulk_create(
+        [MovimientoStock(producto_id=p.pk, tipo=AJUSTE, cantidad=p.stock, usuario=usuario, nota=nota)
+         for p in productos if p.stock],
+        batch_size=2000,
+    )
+
+
+def compactar(producto_ids=None):
+    """
+    Pasa las fracciones de cada producto a Producto.stock y deja exactamente
+    fracciones_stock filas en cero. Sin `producto_ids`, todos los que tienen o
+    tuvieron fracciones. Una transacción corta por producto. Retorna cuántos compactó.
+    """
+    if producto_ids is None:
+        producto_ids = set(Producto.objects.filter(fracciones_stock__gt=0).values_list('pk', flat=True))
+        producto_ids |= set(FraccionStock.objects.values_list('producto_id', flat=True).distinct())
+    compactados = 0
+    for producto_id in sorted(producto_ids):
+        with transaction.atomic():
+            producto = Producto.objects.select_for_update().only('pk', 'fracciones_stock').filter(pk=producto_id).first()
+            if producto is None:
+                continue
+            filas = list(FraccionStock.objects.select_for_update().filter(producto_id=producto_id))
+            suma = sum(f.cantidad for f in filas)
+            if suma:
+                Producto.objects.filter(pk=producto_id).update(stock=F('stock') + suma)
+                FraccionStock.objects.filter(producto_id=producto_id).exclude(cantidad=0).update(cantidad=0)
+            FraccionStock.objects.filter(producto_id=producto_id, numero__gte=producto.fracciones_stock).delete()
+            numeros = {f.numero for f in filas}
+            FraccionStock.objects.bulk_create(
+                [FraccionStock(producto_id=producto_id, numero=n)
+                 for n in range(producto.fracciones_stock) if n not in numeros],
+                ignore_conflicts=True,
+            )
+        compactados += 1
+    return compactados
+
+
+def diferencias():
+    """Productos cuyo libro no cuadra con su stock, con libro y stock_disponible anotados."""
+    return con_stock(Producto.objects.all()).annotate(
+        libro=_suma(MovimientoStock.objects.all(), 'cantidad')
+    ).exclude(libro=F('stock_disponible'))
@@ -1,26 +1,39 @@
 """
 Comando para hacer backup de la base de datos.
-Soporta MySQL (mysqldump) y SQLite (copia del archivo).
+Soporta MySQL (mysqldump) y SQLite (API de backup en línea), comprimido con gzip o zstd.
 
 Uso:
   python manage.py backup_db
   python manage.py backup_db --dir=/ruta/backups
-
-Para MySQL: requiere mysqldump instalado.
-Para SQLite: copia db.sqlite3 a la carpeta de backups.
+  python manage.py backup_db --compresion=zstd --conservar=14
+  python manage.py backup_db --incremental        # solo las ventas cambiadas desde el último backup
+
+Para MySQL: requiere mysqldump instalado. La salida pasa por el compresor
+mientras se genera, sin archivo temporal.
+Para SQLite: copia consistente aunque el POS esté escribiendo, por pasos de
+--paginas páginas con una pausa de --pausa ms entre pasos.
+
+Cada backup deja un manifiesto .json con su SHA-256 y su punto de control
+(ver gestion/respaldos.py). Los incrementales se aplican sobre el último
+backup completo con restore_db. Tras un backup completo se borran los
+completos más antiguos (y sus incrementales) según --conservar.
 """
 import os
 import shutil
 import subprocess
-from datetime import datetime
-from pathlib import Path
+import tempfile
+import time
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from gestion import respaldos
+from gestion.respaldos import RespaldoError
 
 
 class Command(BaseCommand):
-    help = 'Crea un backup de la base de datos (MySQL o SQLite).'
+    help = 'Crea un backup de la base de datos (MySQL o SQLite), completo o incremental.'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -29,107 +42,131 @@ class Command(BaseCommand):
             default=None,
             help='Carpeta donde guardar el backup (por defecto: backups/ en el proyecto)',
         )
+        parser.add_argument(
+            '--compresion',
+            choices=list(respaldos.COMPRESIONES),
+            default=getattr(settings, 'RESPALDOS_COMPRESION', 'gzip'),
+            help='gzip, zstd (requiere el paquete zstandard) o ninguna',
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Solo las ventas creadas o modificadas desde el último backup (requiere un backup completo previo)',
+        )
+        parser.add_argument(
+            '--conservar',
+            type=int,
+            default=getattr(settings, 'RESPALDOS_CONSERVAR', 7),
+            help='Backups completos a conservar (0: no borrar ninguno)',
+        )
+        parser.add_argument('--paginas', type=int, default=1000, help='SQLite: páginas copiadas por paso')
+        parser.add_argument('--pausa', type=float, default=5, help='SQLite: ms de pausa entre pasos')
 
     def handle(self, *args, **options):
-        backup_dir = options.get('dir')
-        if not backup_dir:
-            backup_dir = Path(settings.BASE_DIR) / 'backups'
-        else:
-            backup_dir = Path(backup_dir)
-
-        backup_dir.mkdir(parents=True, exist_ok=True)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-
         db_settings = settings.DATABASES['default']
-        engine = db_settings.get('ENGINE', '')
-
-        if 'sqlite' in engine:
-            self._backup_sqlite(db_settings, backup_dir, timestamp)
-        elif 'mysql' in engine:
-            self._backup_mysql(db_settings, backup_dir, timestamp)
-        else:
-            self.stderr.write(
-                self.style.ERROR(f'Backup no implementado para: {engine}')
-            )
+        try:
+            backup_dir = respaldos.carpeta(options.get('dir'))
+            motor = respaldos.motor(db_settings)
+            if options['incremental']:
+                self._backup_incremental(backup_dir, motor, options)
+            else:
+                if motor == 'sqlite':
+                    self._backup_sqlite(db_settings, backup_dir, options)
+                else:
+                    self._backup_mysql(db_settings, backup_dir, options)
+                for nombre in respaldos.rotar(backup_dir, options['conservar']):
+                    self.stdout.write(f'  Backup antiguo eliminado: {nombre}')
+        except RespaldoError as e:
+            raise CommandError(str(e))
+
+    def _guardar(self, escritura, inicio, hasta, motor, **datos):
+        datos = respaldos.guardar_manifiesto(
+            escritura.ruta,
+            motor=motor,
+            compresion=escritura.compresion,
+            sha256=escritura.sha256,
+            tamano=escritura.tamano,
+            creado=timezone.now().isoformat(),
+            hasta=hasta.isoformat(),
+            duracion_s=round(time.perf_counter() - inicio, 2),
+            **datos,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Backup {datos["tipo"]} guardado: {escritura.ruta} '
+            f'({escritura.tamano / 1024 / 1024:.1f} MB en {datos["duracion_s"]}s)'
+        ))
 
-    def _backup_sqlite(self, db_settings, backup_dir, timestamp):
+    def _backup_sqlite(self, db_settings, backup_dir, options):
         db_path = db_settings.get('NAME')
         if not db_path or not os.path.exists(db_path):
-            self.stderr.write(
-                self.style.ERROR(f'Archivo de base de datos no encontrado: {db_path}')
-            )
-            return
+            raise CommandError(f'Archivo de base de datos no encontrado: {db_path}')
 
-        dest = backup_dir / f'db_{timestamp}.sqlite3'
-        shutil.copy2(db_path, dest)
-        self.stdout.write(self.style.SUCCESS(f'✓ Backup SQLite guardado: {dest}'))
+        inicio = time.perf_counter()
+        hasta = timezone.now()
+        escritura = respaldos.Escritura(
+            backup_dir / respaldos.nombre('db', '.sqlite3', options['compresion'], hasta), options['compresion']
+        )
+        # La API de backup escribe en una base SQLite: copia en un temporal y luego se comprime
+        fd, temporal = tempfile.mkstemp(suffix='.sqlite3', dir=backup_dir)
+        os.close(fd)
+        try:
+            reinicios = respaldos.copiar_sqlite(
+                db_path, temporal, max(1, options['paginas']), max(0, options['pausa']) / 1000
+            )
+            if reinicios:
+                self.stdout.write(f'  La copia se reinició {reinicios} vez/veces por escrituras concurrentes')
+            with escritura as salida, open(temporal, 'rb') as origen:
+                shutil.copyfileobj(origen, salida, respaldos.TAMANO_BLOQUE)
+        finally:
+            os.unlink(temporal)
+        self._guardar(escritura, inicio, hasta, 'sqlite', tipo='completo')
 
-    def _backup_mysql(self, db_settings, backup_dir, timestamp):
+    def _backup_mysql(self, db_settings, backup_dir, options):
         # Verificar que mysqldump esté disponible
         try:
             subprocess.run(['mysqldump', '--version'], capture_output=True, check=True)
         except (subprocess.CalledProcessError, FileNotFoundError):
-            self.stderr.write(
-                self.style.ERROR(
-                    'mysqldump no encontrado. Instale el cliente MySQL o MariaDB.'
-                )
-            )
-            return
-
-        name = db_settings.get('NAME')
-        user = db_settings.get('USER')
-        password = db_settings.get('PASSWORD', '')
-        host = db_settings.get('HOST', 'localhost')
-        port = db_settings.get('PORT', '3306')
-
-        dest = backup_dir / f'db_{timestamp}.sql'
-
-        cmd = [
-            'mysqldump',
-            '--single-transaction',
-            '--quick',
-            '--lock-tables=false',
-            '-h', str(host),
-            '-P', str(port),
-            '-u', str(user),
-            name,
-        ]
+            raise CommandError('mysqldump no encontrado. Instale el cliente MySQL o MariaDB.')
 
-        # Usar archivo temporal para la contraseña (más seguro que -p en línea)
-        env = os.environ.copy()
-        config_file = None
-        if password:
-            import tempfile
-            fd, config_file = tempfile.mkstemp(suffix='.cnf', prefix='mysqldump_')
+        inicio = time.perf_counter()
+        hasta = timezone.now()
+        escritura = respaldos.Escritura(
+            backup_dir / respaldos.nombre('db', '.sql', options['compresion'], hasta), options['compresion']
+        )
+        with respaldos.credenciales_mysql(db_settings) as conexion, tempfile.TemporaryFile() as errores:
+            cmd = [
+                'mysqldump',
+                *conexion,
+                '--single-transaction',
+                '--quick',
+                '--lock-tables=false',
+                db_settings.get('NAME'),
+            ]
             try:
-                with os.fdopen(fd, 'w') as f:
-                    f.write(f'[client]\npassword={password}\n')
-                cmd.extend(['--defaults-extra-file=' + config_file])
-            except Exception:
-                os.unlink(config_file) if config_file and os.path.exists(config_file) else None
-                config_file = None
-
-        try:
-            with open(dest, 'w') as f:
-                result = subprocess.run(
-                    cmd,
-                    stdout=f,
-                    stderr=subprocess.PIPE,
-                    env=env,
-                    text=True,
-                )
-            if result.returncode != 0:
-                self.stderr.write(
-                    self.style.ERROR(f'mysqldump falló: {result.stderr}')
-                )
-                dest.unlink(missing_ok=True)
-            else:
-                self.stdout.write(self.style.SUCCESS(f'✓ Backup MySQL guardado: {dest}'))
-        except Exception as e:
-            self.stderr.write(self.style.ERROR(f'Error al crear backup: {e}'))
-        finally:
-            if config_file and os.path.exists(config_file):
-                try:
-                    os.unlink(config_file)
-                except OSError:
-                    pass
+                with escritura as salida:
+                    proceso = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=errores)
+                    shutil.copyfileobj(proceso.stdout, salida, respaldos.TAMANO_BLOQUE)
+                    if proceso.wait() != 0:
+                        errores.seek(0)
+                        raise CommandError(f'mysqldump falló: {errores.read().decode(errors="replace")}')
+            except OSError as e:
+                raise CommandError(f'Error al crear backup: {e}')
+        self._guardar(escritura, inicio, hasta, 'mysql', tipo='completo')
+
+    def _backup_incremental(self, backup_dir, motor, options):
+        base, desde = respaldos.punto_control(backup_dir, motor)
+        inicio = time.perf_counter()
+        hasta = timezone.now()
+        escritura = respaldos.Escritura(
+            backup_dir / respaldos.nombre('ventas', '.jsonl', options['compresion'], hasta), options['compresion']
+        )
+        with escritura as salida:
+            filas = respaldos.exportar_ventas(salida, desde)
+        self._guardar(
+            escritura, inicio, hasta, motor,
+            tipo='incremental', base=base['archivo'], desde=desde.isoformat(), filas=filas,
+        )
+        self.stdout.write(
+            f'  Desde {timezone.localtime(desde):%d/%m/%Y %H:%M:%S}: {filas["gestion.venta"]} ventas, '
+            f'{filas["gestion.detalleventa"]} detalles, {filas["gestion.pago"]} pagos (base {base["archivo"]})'
+        )
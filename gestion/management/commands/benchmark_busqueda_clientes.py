@@ -0,0 +1,106 @@
+"""
+Benchmark de la búsqueda de clientes del POS: cuatro `icontains` con OR (antes)
+contra la búsqueda indexada de gestion/busqueda.py (después).
+
+Ejecuta una mezcla de búsquedas típicas de caja (CI completo, inicio de teléfono,
+inicio de nombre, apellido, email) e informa mediana y p95 de cada variante.
+
+Uso:
+  python manage.py benchmark_busqueda_clientes
+  python manage.py benchmark_busqueda_clientes --sembrar=100000   # crea clientes sintéticos antes
+"""
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from gestion.busqueda import buscar_clientes, indice_texto_disponible
+from gestion.models import Cliente
+
+NOMBRES = ['José', 'María', 'Juan', 'Ana', 'Luis', 'Carmen', 'Jorge', 'Rosa', 'Carlos', 'Lucía',
+           'Mario', 'Elena', 'Pedro', 'Sofía', 'Raúl', 'Patricia', 'Hugo', 'Gabriela', 'Víctor', 'Noemí']
+APELLIDOS = ['Pérez', 'Quispe', 'Mamani', 'Condori', 'Flores', 'Rodríguez', 'Gutiérrez', 'Choque',
+             'Vargas', 'Rojas', 'López', 'Fernández', 'Huanca', 'Ticona', 'Álvarez', 'Céspedes']
+
+
+class Command(BaseCommand):
+    help = 'Mide la latencia (p50/p95) de la búsqueda de clientes antes y después del índice.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sembrar', type=int, default=0, help='Clientes sintéticos a crear antes de medir')
+        parser.add_argument('--consultas', type=int, default=200, help='Búsquedas a ejecutar por variante')
+
+    def handle(self, *args, **options):
+        if options['sembrar']:
+            self._sembrar(options['sembrar'])
+
+        muestra = list(
+            Cliente.objects.filter(activo=True).order_by('?').values('nombre_completo', 'ci_nit', 'telefono', 'email')[:500]
+        )
+        if not muestra:
+            self.stdout.write('No hay clientes; use --sembrar.')
+            return
+        consultas = []
+        for _ in range(options['consultas']):
+            c = random.choice(muestra)
+            palabras = c['nombre_completo'].split()
+            opciones = [palabras[0][:3], palabras[-1], ' '.join(palabras[:2])]
+            if c['ci_nit']:
+                opciones.append(c['ci_nit'])
+            if c['telefono']:
+                opciones.append(c['telefono'][:4])
+            if c['email']:
+                opciones.append(c['email'].split('@')[0])
+            consultas.append(random.choice(opciones))
+
+        clientes = Cliente.objects.filter(activo=True).order_by('nombre_completo')
+
+        def antes(q):
+            return list(clientes.filter(
+                Q(nombre_completo__icontains=q) | Q(telefono__icontains=q)
+                | Q(ci_nit__icontains=q) | Q(email__icontains=q)
+            )[:30])
+
+        def despues(q):
+            return buscar_clientes(q, clientes, limite=30)
+
+        self.stdout.write(
+            f'Base de datos: {connection.vendor}, clientes: {Cliente.objects.count()}, '
+            f'índice de texto: {indice_texto_disponible() or "ninguno"}\n'
+        )
+        for etiqueta, funcion in (('antes (icontains)', antes), ('después (índices)', despues)):
+            tiempos = []
+            for q in consultas:
+                inicio = time.perf_counter()
+                funcion(q)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            tiempos.sort()
+            p95 = tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))]
+            self.stdout.write(
+                f'  [{etiqueta}] mediana {statistics.median(tiempos):.2f} ms, p95 {p95:.2f} ms, '
+                f'máx {tiempos[-1]:.2f} ms'
+            )
+
+    def _sembrar(self, cantidad):
+        inicio = Cliente.objects.count()
+        creados = 0
+        while creados < cantidad:
+            lote = []
+            for i in range(min(5000, cantidad - creados)):
+                n = inicio + creados + i
+                cliente = Cliente(
+                    nombre_completo=f'{random.choice(NOMBRES)} {random.choice(APELLIDOS)} {random.choice(APELLIDOS)}',
+                    ci_nit=f'{10000000 + n}BM',
+                    telefono=f'7{random.randint(0, 9999999):07d}',
+                    email=f'cliente{n}@ejemplo.bo' if random.random() < 0.4 else None,
+                )
+                cliente.actualizar_busqueda()  # bulk_create no llama a save()
+                lote.append(cliente)
+            with transaction.atomic():
+                Cliente.objects.bulk_create(lote, batch_size=1000)
+            creados += len(lote)
+            self.stdout.write(f'  {creados}/{cantidad} clientes sembrados', ending='\r')
+        self.stdout.write(self.style.SUCCESS(f'\n✓ {cantidad} clientes sintéticos creados'))
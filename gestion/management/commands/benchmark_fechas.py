@@ -0,0 +1,114 @@
+"""
+Benchmark de filtros por fecha: `fecha__date` (no usa índices) contra rangos
+locales de gestion/fechas.py (usan los índices de la migración 0010).
+
+Imprime el plan de ejecución (EXPLAIN) y el tiempo de cada consulta de las
+vistas de ventas, cierre de caja y reportes, con el filtro anterior y el nuevo.
+
+Uso:
+  python manage.py benchmark_fechas
+  python manage.py benchmark_fechas --sembrar=1000000   # crea ventas sintéticas antes
+
+Para comparar también los índices: ejecutar con `python manage.py migrate gestion 0009`,
+luego `python manage.py migrate` y volver a ejecutar.
+"""
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from gestion.fechas import filtro_dias
+from gestion.models import Cliente, Pago, Venta
+
+
+class Command(BaseCommand):
+    help = 'Compara planes y tiempos de las consultas por fecha (fecha__date vs rango local).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sembrar', type=int, default=0, help='Ventas sintéticas a crear antes de medir')
+        parser.add_argument('--dias', type=int, default=365, help='Días de historial para las ventas sintéticas')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Ejecuciones por consulta (se informa la mediana)')
+
+    def handle(self, *args, **options):
+        if options['sembrar']:
+            self._sembrar(options['sembrar'], options['dias'])
+
+        hoy = timezone.localdate()
+        hace_30 = hoy - timedelta(days=30)
+        ventas_hoy = Venta.objects.filter(estado='completado', **filtro_dias('fecha', hoy))
+        casos = [
+            (
+                'index / venta_index: ventas del día',
+                Venta.objects.filter(fecha__date=hoy),
+                Venta.objects.filter(**filtro_dias('fecha', hoy)),
+            ),
+            (
+                'cierre_caja: completadas del día por vendedor',
+                Venta.objects.filter(fecha__date=hoy, estado='completado', usuario_id=1),
+                Venta.objects.filter(estado='completado', usuario_id=1, **filtro_dias('fecha', hoy)),
+            ),
+            (
+                'reportes: completadas últimos 30 días',
+                Venta.objects.filter(fecha__date__gte=hace_30, fecha__date__lte=hoy, estado='completado'),
+                Venta.objects.filter(estado='completado', **filtro_dias('fecha', hace_30, hoy)),
+            ),
+            (
+                'factura por número',
+                Venta.objects.filter(numero_factura=1, tipo_documento='factura'),
+                Venta.objects.filter(tipo_documento='factura', numero_factura=1),
+            ),
+            (
+                'pagos validados de las ventas del día',
+                Pago.objects.filter(venta__in=Venta.objects.filter(fecha__date=hoy, estado='completado'), validado=True),
+                Pago.objects.filter(venta__in=ventas_hoy, validado=True),
+            ),
+        ]
+
+        self.stdout.write(f'Base de datos: {connection.vendor}, ventas: {Venta.objects.count()}\n')
+        for nombre, antes, despues in casos:
+            self.stdout.write(self.style.MIGRATE_HEADING(nombre))
+            for etiqueta, qs in (('antes', antes), ('después', despues)):
+                tiempos = []
+                for _ in range(options['repeticiones']):
+                    inicio = time.perf_counter()
+                    qs.count()
+                    tiempos.append(time.perf_counter() - inicio)
+                self.stdout.write(f'  [{etiqueta}] mediana {statistics.median(tiempos) * 1000:.2f} ms')
+                for linea in qs.explain().splitlines():
+                    self.stdout.write(f'      {linea}')
+
+    def _sembrar(self, cantidad, dias):
+        usuario, _ = User.objects.get_or_create(username='benchmark', defaults={'is_active': False})
+        cliente, _ = Cliente.objects.get_or_create(ci_nit='BENCHMARK', defaults={'nombre_completo': 'Benchmark'})
+        ahora = timezone.now()
+        segundos = dias * 24 * 3600
+        campo_fecha = Venta._meta.get_field('fecha')
+        campo_fecha.auto_now_add = False  # Permitir fechas del pasado en bulk_create
+        try:
+            creadas = 0
+            while creadas < cantidad:
+                lote = min(10000, cantidad - creadas)
+                ventas = []
+                for _ in range(lote):
+                    total = Decimal(random.randint(10, 300))
+                    ventas.append(Venta(
+                        fecha=ahora - timedelta(seconds=random.randint(0, segundos)),
+                        cliente=cliente,
+                        usuario=usuario,
+                        subtotal=total,
+                        total=total,
+                        estado=random.choices(['completado', 'pendiente', 'cancelado'], [90, 7, 3])[0],
+                    ))
+                with transaction.atomic():
+                    Venta.objects.bulk_create(ventas, batch_size=2000)
+                creadas += lote
+                self.stdout.write(f'  {creadas}/{cantidad} ventas sembradas', ending='\r')
+        finally:
+            campo_fecha.auto_now_add = True
+        self.stdout.write(self.style.SUCCESS(f'\n✓ {cantidad} ventas sintéticas creadas'))
@@ -0,0 +1,376 @@
+"""
+Prueba de carga de las rutas críticas del POS con cajeros simulados en paralelo.
+
+Cada cajero es un hilo con su propio cliente HTTP de Django (en proceso, sin
+servidor) que repite una mezcla de peticiones: abrir el POS, cobrar un pedido
+(productos elegidos con la popularidad sesgada de sembrar_datos), buscar
+clientes, ver el inicio, la lista de ventas y los reportes. Informa por ruta
+peticiones por segundo, latencia p50/p95/p99, errores y consultas SQL (de
+InstrumentacionMiddleware), en texto y en JSON para comparar entre corridas,
+y las ventas por segundo sostenidas (cobros exitosos / duración).
+
+Uso:
+  python manage.py sembrar_datos --ventas=1000000      # una vez
+  python manage.py benchmark_pos --cajeros=8 --duracion=60 --salida=antes.json
+  python manage.py benchmark_pos --cajeros=8 --duracion=60 --salida=despues.json --comparar=antes.json
+  python manage.py benchmark_pos --mezcla=pos_procesar_pago=1 --peticiones=500
+
+Concurrencia de escritura (N cajas cobrando a la vez), p. ej. para comparar el
+perfil SQLite con y sin cola de escritura (ver gestion/sqlite):
+  DJANGO_USE_SQLITE=1 python manage.py benchmark_pos --cajeros=8 --mezcla=pos_procesar_pago=1 --salida=wal.json
+  DJANGO_USE_SQLITE=1 SQLITE_COLA_ESCRITURA=1 python manage.py benchmark_pos --cajeros=8 \
+      --mezcla=pos_procesar_pago=1 --comparar=wal.json
+
+Funciona con SQLite y con MySQL (la configuración de DATABASES del proyecto).
+En SQLite el JSON incluye journal_mode, synchronous, BEGIN y la cola usados.
+Los cobros crean ventas reales en la base de datos: usar una base de pruebas.
+"""
+import json
+import logging
+import random
+import statistics
+import subprocess
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from gestion.management.commands.sembrar_datos import PREFIJO_CAJERO, elegir, pesos_zipf
+from gestion.models import Cliente, DetalleVenta, MetodoPago, Producto, Venta
+
+# Peso de cada ruta en la mezcla por defecto (una caja cobra mucho más de lo que mira reportes)
+MEZCLA = {
+    'pos': 10,
+    'pos_procesar_pago': 35,
+    'pos_buscar_clientes': 25,
+    'index': 10,
+    'venta_index': 15,
+    'reportes_index': 5,
+}
+
+
+# Valores de PRAGMA synchronous
+SYNCHRONOUS = {0: 'OFF', 1: 'NORMAL', 2: 'FULL', 3: 'EXTRA'}
+
+
+def percentil(ordenados, fraccion):
+    """Percentil por rango más cercano de una lista ordenada."""
+    if not ordenados:
+        return None
+    return ordenados[min(len(ordenados) - 1, max(0, round(fraccion * len(ordenados)) - 1))]
+
+
+class Datos:
+    """Muestras de la base compartidas por los cajeros (solo lectura)."""
+
+    def __init__(self, sesgo):
+        productos = list(Producto.objects.filter(activo=True, stock__gt=1000).values_list('pk', flat=True))
+        if not productos:
+            raise CommandError('No hay productos con stock para cobrar: ejecute sembrar_datos.')
+        random.Random(0).shuffle(productos)
+        self.productos = productos
+        self.acumulados = pesos_zipf(len(productos), sesgo)
+        self.metodo_pago_id = (
+            MetodoPago.objects.filter(activo=True, requiere_validacion=False).values_list('pk', flat=True).first()
+        )
+        if self.metodo_pago_id is None:
+            raise CommandError('No hay un método de pago activo sin validación (p. ej. Efectivo).')
+        self.clientes = list(
+            Cliente.objects.filter(activo=True).exclude(ci_nit='MOSTRADOR')
+            .values_list('pk', 'nombre_completo', 'ci_nit', 'telefono')[:2000]
+        )
+        self.mostrador_id = Cliente.objects.get_or_create(
+            ci_nit='MOSTRADOR', defaults={'nombre_completo': 'Mostrador', 'activo': True}
+        )[0].pk
+
+    def pedido(self, rng):
+        items = {}
+        for _ in range(rng.randint(1, 4)):
+            producto_id = elegir(rng, self.productos, self.acumulados)
+            items[producto_id] = items.get(producto_id, 0) + rng.choice((1, 1, 2))
+        cliente_id = rng.choice(self.clientes)[0] if self.clientes and rng.random() < 0.3 else self.mostrador_id
+        return {
+            'cliente_id': cliente_id,
+            'metodo_pago_id': self.metodo_pago_id,
+            'modo_consumo': rng.choice(('local', 'llevar')),
+            'tipo_documento': 'ticket',
+            'items': [{'id': pk, 'quantity': cantidad} for pk, cantidad in items.items()],
+            'clave_idempotencia': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        }
+
+    def busqueda(self, rng):
+        if not self.clientes:
+            return 'juan'
+        _, nombre, ci_nit, telefono = rng.choice(self.clientes)
+        palabras = nombre.split()
+        opciones = [palabras[0][:3], palabras[-1], ci_nit]
+        if telefono:
+            opciones.append(telefono[:4])
+        return rng.choice(opciones)
+
+
+class Command(BaseCommand):
+    help = 'Prueba de carga del POS con cajeros concurrentes; informa rps, p50/p95/p99 y consultas (JSON).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cajeros', type=int, default=4, help='Cajeros simulados en paralelo (hilos)')
+        parser.add_argument('--duracion', type=float, default=30, help='Segundos de carga (si no se usa --peticiones)')
+        parser.add_argument('--peticiones', type=int, default=0, help='Peticiones por cajero (en lugar de --duracion)')
+        parser.add_argument('--mezcla', help='Pesos por ruta, p. ej. "pos=1,pos_procesar_pago=3" (por defecto MEZCLA)')
+        parser.add_argument('--sesgo', type=float, default=1.1, help='Exponente de Zipf para elegir productos')
+        parser.add_argument('--semilla', type=int, default=1, help='Semilla aleatoria de los cajeros')
+        parser.add_argument('--salida', help='Archivo JSON con los resultados ("-" para imprimir solo el JSON)')
+        parser.add_argument('--comparar', help='JSON de una corrida anterior para mostrar las diferencias')
+
+    def handle(self, *args, **options):
+        mezcla = self._mezcla(options['mezcla'])
+        cajeros = list(User.objects.filter(username__startswith=PREFIJO_CAJERO, is_active=True).order_by('pk'))
+        admin = User.objects.filter(is_staff=True, is_active=True).order_by('pk').first()
+        if not cajeros:
+            raise CommandError(f'No hay cajeros sintéticos ({PREFIJO_CAJERO}N): ejecute sembrar_datos.')
+        if admin is None and 'reportes_index' in mezcla:
+            raise CommandError('reportes_index requiere un usuario staff activo.')
+        datos = Datos(options['sesgo'])
+        host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+
+        n = max(1, options['cajeros'])
+        muestras = defaultdict(list)  # ruta -> [(ms, status, consultas)]
+        errores = defaultdict(lambda: defaultdict(int))  # ruta -> mensaje -> veces
+        lock = threading.Lock()
+        listos = threading.Barrier(n + 1)
+        fin = threading.Event()
+
+        def cajero(indice):
+            rng = random.Random(options['semilla'] * 1000 + indice)
+            clientes = {}
+            try:
+                clientes['cajero'] = Client(HTTP_HOST=host)
+                clientes['cajero'].force_login(cajeros[indice % len(cajeros)])
+                if admin is not None:
+                    clientes['admin'] = Client(HTTP_HOST=host)
+                    clientes['admin'].force_login(admin)
+            finally:
+                listos.wait()
+            rutas, pesos = zip(*mezcla.items())
+            hechas = 0
+            try:
+                while not fin.is_set() and (not options['peticiones'] or hechas < options['peticiones']):
+                    ruta = rng.choices(rutas, pesos)[0]
+                    inicio = time.perf_counter()
+                    try:
+                        response = self._peticion(ruta, clientes, datos, rng)
+                        ms = (time.perf_counter() - inicio) * 1000
+                        medicion = getattr(response, 'instrumentacion', None)
+                        with lock:
+                            muestras[ruta].append((ms, response.status_code, medicion.consultas if medicion else None))
+                            if response.status_code >= 400:
+                                errores[ruta][self._mensaje_error(response)] += 1
+                    except Exception as e:  # Errores de la vista o de la base (p. ej. "database is locked")
+                        ms = (time.perf_counter() - inicio) * 1000
+                        with lock:
+                            muestras[ruta].append((ms, 500, None))
+                            errores[ruta][f'{type(e).__name__}: {e}'[:120]] += 1
+                    hechas += 1
+            finally:
+                connections.close_all()
+
+        # Los errores se cuentan en el resultado: sin un log por cada petición fallida o lenta
+        silenciados = [logging.getLogger(nombre) for nombre in ('django.request', 'gestion.instrumentacion')]
+        niveles = [logger.level for logger in silenciados]
+        for logger in silenciados:
+            logger.setLevel(logging.CRITICAL)
+        try:
+            hilos = [threading.Thread(target=cajero, args=(i,), daemon=True) for i in range(n)]
+            for hilo in hilos:
+                hilo.start()
+            listos.wait()
+            inicio = time.perf_counter()
+            if not options['peticiones']:
+                fin.wait(options['duracion'])
+                fin.set()
+            for hilo in hilos:
+                hilo.join()
+            duracion = time.perf_counter() - inicio
+        finally:
+            for logger, nivel in zip(silenciados, niveles):
+                logger.setLevel(nivel)
+
+        resultado = self._resultado(options, n, duracion, muestras, errores)
+        if options['salida'] == '-':
+            self.stdout.write(json.dumps(resultado, indent=2, ensure_ascii=False))
+            return
+        self._imprimir(resultado)
+        if options['comparar']:
+            self._comparar(resultado, options['comparar'])
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f'✓ Resultados guardados en {options["salida"]}'))
+
+    def _mezcla(self, texto):
+        if not texto:
+            return dict(MEZCLA)
+        mezcla = {}
+        for parte in texto.split(','):
+            ruta, _, peso = parte.partition('=')
+            ruta = ruta.strip()
+            if ruta not in MEZCLA:
+                raise CommandError(f'Ruta desconocida en --mezcla: {ruta} (opciones: {", ".join(MEZCLA)})')
+            try:
+                mezcla[ruta] = float(peso or 1)
+            except ValueError:
+                raise CommandError(f'Peso inválido en --mezcla: {parte}')
+        return mezcla
+
+    def _peticion(self, ruta, clientes, datos, rng):
+        cliente = clientes['cajero']
+        if ruta == 'pos_procesar_pago':
+            return cliente.post(reverse(ruta), json.dumps(datos.pedido(rng)), content_type='application/json')
+        if ruta == 'pos_buscar_clientes':
+            return cliente.get(reverse(ruta), {'q': datos.busqueda(rng)})
+        if ruta == 'reportes_index':
+            return clientes['admin'].get(reverse(ruta))
+        return cliente.get(reverse(ruta))
+
+    def _mensaje_error(self, response):
+        try:
+            return f'{response.status_code}: {response.json().get("error", "")}'[:120]
+        except ValueError:
+            return f'{response.status_code}'
+
+    def _resultado(self, options, cajeros, duracion, muestras, errores):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5,
+                cwd=settings.BASE_DIR,
+            ).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            commit = None
+
+        rutas = {}
+        todas = []
+        for ruta, filas in sorted(muestras.items()):
+            tiempos = sorted(ms for ms, _, _ in filas)
+            consultas = [c for _, _, c in filas if c is not None]
+            todas.extend(tiempos)
+            rutas[ruta] = {
+                'peticiones': len(filas),
+                'errores': sum(1 for _, status, _ in filas if status >= 400),
+                'rps': len(filas) / duracion,
+                'promedio_ms': statistics.fmean(tiempos),
+                'p50_ms': percentil(tiempos, 0.50),
+                'p95_ms': percentil(tiempos, 0.95),
+                'p99_ms': percentil(tiempos, 0.99),
+                'max_ms': tiempos[-1],
+                'consultas_promedio': statistics.fmean(consultas) if consultas else None,
+                'consultas_max': max(consultas) if consultas else None,
+                'mensajes_error': dict(errores.get(ruta, {})),
+            }
+        todas.sort()
+        ventas = sum(1 for _, status, _ in muestras.get('pos_procesar_pago', ()) if status < 400)
+        return {
+            'meta': {
+                'fecha': timezone.now().isoformat(),
+                'commit': commit,
+                'base_de_datos': connection.vendor,
+                'sqlite': self._sqlite(),
+                'cajeros': cajeros,
+                'duracion_s': duracion,
+                'semilla': options['semilla'],
+                'datos': {
+                    'productos': Producto.objects.count(),
+                    'clientes': Cliente.objects.count(),
+                    'ventas': Venta.objects.count(),
+                    'detalles': DetalleVenta.objects.count(),
+                },
+            },
+            'total': {
+                'peticiones': len(todas),
+                'errores': sum(r['errores'] for r in rutas.values()),
+                'rps': len(todas) / duracion,
+                'p50_ms': percentil(todas, 0.50),
+                'p95_ms': percentil(todas, 0.95),
+                'p99_ms': percentil(todas, 0.99),
+                'ventas_por_segundo': ventas / duracion,
+            },
+            'rutas': rutas,
+        }
+
+    def _sqlite(self):
+        """PRAGMAs, BEGIN y cola de escritura de la conexión (None fuera de SQLite)."""
+        if connection.vendor != 'sqlite':
+            return None
+        valores = {}
+        with connection.cursor() as cursor:
+            for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size'):
+                cursor.execute(f'PRAGMA {pragma}')
+                valores[pragma] = cursor.fetchone()[0]
+        valores['synchronous'] = SYNCHRONOUS.get(valores['synchronous'], valores['synchronous'])
+        valores['transaction_mode'] = getattr(connection, 'modo_transaccion', None) or 'DEFERRED'
+        valores['cola_escritura'] = getattr(connection, 'cola_escritura', None) is not None
+        return valores
+
+    def _imprimir(self, resultado):
+        meta = resultado['meta']
+        sqlite = meta.get('sqlite')
+        if sqlite:
+            base_de_datos = (
+                f"sqlite ({sqlite['journal_mode']}, synchronous={sqlite['synchronous']}, "
+                f"BEGIN {sqlite['transaction_mode']}{', cola de escritura' if sqlite['cola_escritura'] else ''})"
+            )
+        else:
+            base_de_datos = meta['base_de_datos']
+        self.stdout.write(
+            f"Base de datos: {base_de_datos}, {meta['cajeros']} cajeros, {meta['duracion_s']:.1f}s, "
+            f"{meta['datos']['ventas']} ventas en la base\n"
+        )
+        self.stdout.write(f"{'ruta':<22}{'pet.':>7}{'err.':>6}{'rps':>8}{'p50':>8}{'p95':>8}{'p99':>8}{'consultas':>11}")
+        for ruta, r in resultado['rutas'].items():
+            consultas = f"{r['consultas_promedio']:.1f}" if r['consultas_promedio'] is not None else '-'
+            self.stdout.write(
+                f"{ruta:<22}{r['peticiones']:>7}{r['errores']:>6}{r['rps']:>8.1f}"
+                f"{r['p50_ms']:>8.1f}{r['p95_ms']:>8.1f}{r['p99_ms']:>8.1f}{consultas:>11}"
+            )
+            for mensaje, veces in r['mensajes_error'].items():
+                self.stdout.write(self.style.WARNING(f'    {veces}× {mensaje}'))
+        total = resultado['total']
+        ventas = f", {total['ventas_por_segundo']:.1f} ventas/s" if 'pos_procesar_pago' in resultado['rutas'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {total['peticiones']} peticiones, {total['rps']:.1f}/s{ventas}, p50 {total['p50_ms']:.1f} ms, "
+            f"p95 {total['p95_ms']:.1f} ms, p99 {total['p99_ms']:.1f} ms, {total['errores']} errores"
+        ))
+
+    def _comparar(self, resultado, ruta_archivo):
+        try:
+            with open(ruta_archivo, encoding='utf-8') as archivo:
+                anterior = json.load(archivo)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'No se pudo leer {ruta_archivo}: {e}')
+
+        def cambio(actual, previo):
+            if actual is None or not previo:
+                return '-'
+            return f'{(actual - previo) / previo * 100:+.0f}%'
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\nComparación con {ruta_archivo} ({anterior["meta"].get("commit")})'))
+        self.stdout.write(f"{'ruta':<22}{'rps':>10}{'p95':>10}{'p99':>10}{'consultas':>11}")
+        for ruta, r in resultado['rutas'].items():
+            previo = anterior.get('rutas', {}).get(ruta)
+            if not previo:
+                continue
+            self.stdout.write(
+                f"{ruta:<22}{cambio(r['rps'], previo['rps']):>10}{cambio(r['p95_ms'], previo['p95_ms']):>10}"
+                f"{cambio(r['p99_ms'], previo['p99_ms']):>10}"
+                f"{cambio(r['consultas_promedio'], previo.get('consultas_promedio')):>11}"
+            )
+        if 'pos_procesar_pago' in resultado['rutas']:
+            previo = anterior.get('total', {}).get('ventas_por_segundo')
+            self.stdout.write(f"ventas por segundo: {cambio(resultado['total']['ventas_por_segundo'], previo)}")
@@ -0,0 +1,49 @@
+"""
+Pasa las fracciones de stock de los productos muy vendidos a Producto.stock
+(ver gestion/inventario.py) y revisa que el libro de movimientos cuadre.
+
+Conviene ejecutarlo periódicamente (cron), p. ej. cada 10 minutos o al cerrar
+el día: el stock se lee igual con o sin compactar, pero menos filas por sumar.
+
+Uso:
+  python manage.py compactar_stock
+  python manage.py compactar_stock --producto=12 --fracciones=8   # repartir el stock del producto 12 en 8 filas
+  python manage.py compactar_stock --producto=12 --fracciones=0   # volver a descontar en Producto.stock
+  python manage.py compactar_stock --verificar                    # comparar el libro con el stock
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion import inventario
+from gestion.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Compacta las fracciones de stock y verifica el libro de movimientos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--producto', type=int, action='append', help='Solo este producto (id); repetible')
+        parser.add_argument('--fracciones', type=int, default=None,
+                            help='Cambiar las fracciones de stock de los productos indicados')
+        parser.add_argument('--verificar', action='store_true', help='Listar los productos cuyo libro no cuadra')
+
+    def handle(self, *args, **options):
+        ids = options['producto']
+        if options['fracciones'] is not None:
+            if not ids:
+                raise CommandError('--fracciones requiere --producto.')
+            if not 0 <= options['fracciones'] <= 64:
+                raise CommandError('--fracciones debe estar entre 0 y 64.')
+            cambiados = Producto.objects.filter(pk__in=ids).update(fracciones_stock=options['fracciones'])
+            if cambiados != len(set(ids)):
+                raise CommandError('Algún producto indicado no existe.')
+
+        compactados = inventario.compactar(ids)
+        self.stdout.write(self.style.SUCCESS(f'✓ {compactados} producto(s) compactados'))
+
+        if options['verificar']:
+            diferencias = list(inventario.diferencias().values_list('pk', 'nombre', 'libro', 'stock_disponible'))
+            for pk, nombre, libro, stock in diferencias:
+                self.stdout.write(self.style.WARNING(f'  {nombre} (#{pk}): libro {libro}, stock {stock}'))
+            if diferencias:
+                raise CommandError(f'{len(diferencias)} producto(s) con el libro descuadrado.')
+            self.stdout.write(self.style.SUCCESS('✓ El libro de movimientos cuadra con el stock'))
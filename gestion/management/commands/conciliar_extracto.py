@@ -0,0 +1,62 @@
+"""
+Importa extractos del banco (CSV u OFX) y valida en lote los pagos QR y por
+transferencia que coinciden (ver gestion/conciliacion.py). Lo que no coincide
+queda por revisar en Conciliación.
+
+CSV (separado por coma, punto y coma o tabulación; primera fila con los nombres):
+  fecha,monto,referencia,descripcion,id
+  (también: importe/abono/credito, ref/comprobante, detalle/glosa/concepto)
+
+Uso:
+  python manage.py conciliar_extracto extracto_enero.csv
+  python manage.py conciliar_extracto banco.ofx --metodo=QR --ventana=2 --usuario=admin
+"""
+import os
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion.conciliacion import VENTANA_DIAS, ConciliacionError, conciliar
+from gestion.models import MetodoPago
+
+
+class Command(BaseCommand):
+    help = 'Concilia pagos pendientes de validación con extractos bancarios CSV/OFX.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivos', nargs='+', help='Archivos .csv u .ofx')
+        parser.add_argument('--metodo', default=None, help='Solo pagos de este método (nombre o id)')
+        parser.add_argument('--ventana', type=int, default=VENTANA_DIAS,
+                            help='Días de diferencia admitidos entre el pago y el banco')
+        parser.add_argument('--usuario', default=None, help='Usuario que queda como validador')
+
+    def handle(self, *args, **options):
+        metodo = None
+        if options['metodo']:
+            valor = options['metodo']
+            metodo = MetodoPago.objects.filter(**({'pk': valor} if valor.isdigit() else {'nombre__iexact': valor})).first()
+            if metodo is None:
+                raise CommandError(f'Método de pago no encontrado: {valor}')
+        usuario = None
+        if options['usuario']:
+            usuario = User.objects.filter(username=options['usuario']).first()
+            if usuario is None:
+                raise CommandError(f'Usuario no encontrado: {options["usuario"]}')
+        if options['ventana'] < 0:
+            raise CommandError('--ventana no puede ser negativa.')
+
+        for ruta in options['archivos']:
+            try:
+                with open(ruta, 'rb') as archivo:
+                    contenido = archivo.read()
+                _, resumen = conciliar(contenido, os.path.basename(ruta), usuario=usuario,
+                                       metodo_pago=metodo, ventana=options['ventana'])
+            except (OSError, ConciliacionError) as e:
+                raise CommandError(f'No se pudo conciliar {ruta}: {e}')
+            for error in resumen['errores']:
+                self.stdout.write(self.style.WARNING(f'  {ruta}: {error}'))
+            duplicadas = f', {resumen["duplicadas"]} ya importadas' if resumen['duplicadas'] else ''
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ {ruta}: {resumen["conciliadas"]} pago(s) validados, '
+                f'{resumen["por_revisar"]} línea(s) por revisar{duplicadas}'
+            ))
@@ -0,0 +1,70 @@
+"""
+Comando para generar las miniaturas WebP/JPEG de las imágenes de productos existentes.
+
+Uso:
+  python manage.py generar_miniaturas
+  python manage.py generar_miniaturas --procesos=4
+  python manage.py generar_miniaturas --forzar   # regenera aunque ya existan
+
+Las imágenes se procesan en paralelo en varios procesos (Pillow usa CPU);
+solo el proceso principal escribe en la base de datos.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from gestion.imagenes import ImagenError, generar_derivados, guardar_variantes
+from gestion.models import Producto
+
+
+def _generar(pk, nombre, forzar):
+    """Trabajo de cada proceso: solo storage y Pillow, sin base de datos."""
+    try:
+        return pk, generar_derivados(nombre, forzar=forzar), None
+    except ImagenError as e:
+        return pk, None, str(e)
+
+
+class Command(BaseCommand):
+    help = 'Genera las miniaturas de las imágenes de productos (en paralelo).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1, help='Procesos en paralelo')
+        parser.add_argument('--forzar', action='store_true', help='Regenerar aunque ya existan')
+
+    def handle(self, *args, **options):
+        productos = {
+            p.pk: p for p in Producto.objects.exclude(imagen='').exclude(imagen__isnull=True)
+        }
+        if not productos:
+            self.stdout.write('No hay productos con imagen.')
+            return
+
+        connections.close_all()  # No compartir la conexión con los procesos hijos
+        inicio = time.perf_counter()
+        generadas = errores = 0
+        with ProcessPoolExecutor(max_workers=max(1, options['procesos']), initializer=django.setup) as pool:
+            tareas = [
+                pool.submit(_generar, p.pk, p.imagen.name, options['forzar'])
+                for p in productos.values()
+            ]
+            for tarea in as_completed(tareas):
+                pk, variantes, error = tarea.result()
+                producto = productos[pk]
+                if error:
+                    errores += 1
+                    self.stderr.write(self.style.WARNING(f'  {producto.nombre}: {error}'))
+                    continue
+                guardar_variantes(producto, variantes)
+                generadas += 1
+
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Miniaturas de {generadas} producto(s) en {duracion:.1f}s ({options["procesos"]} procesos)'
+        ))
+        if errores:
+            self.stdout.write(self.style.WARNING(f'  {errores} imagen(es) no se pudieron procesar'))
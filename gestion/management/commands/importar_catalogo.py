@@ -0,0 +1,361 @@
+"""
+Importa categorías y productos desde archivos CSV o JSON (alta o actualización en lote).
+
+CSV (separado por coma, punto y coma o tabulación; primera fila con los nombres):
+  nombre,categoria,precio_venta,costo,descuento,stock,descripcion,imagen,activo
+
+JSON: una lista de productos con esas claves, o
+  {"categorias": [{"nombre": ..., "descripcion": ...}], "productos": [...]}
+
+Los productos se identifican por nombre (sin distinguir mayúsculas, como el
+formulario de productos). Una celda vacía conserva el valor actual; costo y
+precio_venta son obligatorios solo para productos nuevos. `imagen` es una ruta
+dentro de MEDIA_ROOT (productos/pollo.jpg) o un archivo local (relativo al
+archivo importado) que se copia al storage. Las imágenes nuevas o cambiadas y
+sus miniaturas se procesan en paralelo en varios procesos.
+
+Todo se escribe con bulk_create/bulk_update en una transacción y al final se
+invalida el catálogo del POS una sola vez.
+
+Uso:
+  python manage.py importar_catalogo catalogo_inicial.json
+  python manage.py importar_catalogo menu.csv --simular        # muestra los cambios sin guardar
+  python manage.py importar_catalogo menu.csv bebidas.json --procesos=4 --sin-imagenes
+"""
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from decimal import Decimal, InvalidOperation
+
+import django
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+
+from gestion import catalogo, inventario
+from gestion.imagenes import ImagenError, eliminar_derivados, generar_derivados
+from gestion.models import Categoria, Producto
+
+CAMPOS = ('nombre', 'categoria', 'precio_venta', 'costo', 'descuento', 'stock', 'descripcion', 'imagen', 'activo')
+CARPETA_IMAGENES = 'productos'
+VERDADERO = {'1', 'true', 'si', 'sí', 'x', 'yes'}
+FALSO = {'0', 'false', 'no'}
+
+
+def _preparar_imagen(clave, local, nombre):
+    """
+    Trabajo de cada proceso: copia `local` al storage (si se indica) y genera
+    las miniaturas. Retorna (clave, nombre en el storage, variantes, error).
+    """
+    try:
+        if local:
+            with open(local, 'rb') as archivo:
+                nombre = default_storage.save(f'{CARPETA_IMAGENES}/{os.path.basename(local)}', File(archivo))
+        return clave, nombre, generar_derivados(nombre), None
+    except (OSError, ImagenError) as e:
+        return clave, None, None, str(e)
+
+
+def _decimal(valor, campo, minimo=None, maximo=None):
+    try:
+        numero = Decimal(str(valor).strip().replace(',', '.'))
+    except InvalidOperation:
+        raise ValueError(f'{campo} no es un número: {valor}')
+    if not numero.is_finite() or (minimo is not None and numero < minimo) or (maximo is not None and numero > maximo):
+        raise ValueError(f'{campo} fuera de rango: {valor}')
+    return numero.quantize(Decimal('0.01'))
+
+
+def _fila(datos):
+    """Normaliza una fila del archivo: {campo: valor} solo con las celdas no vacías."""
+    fila = {}
+    for campo in CAMPOS:
+        valor = datos.get(campo)
+        if valor is None or (isinstance(valor, str) and not valor.strip()):
+            continue
+        if campo in ('nombre', 'categoria', 'descripcion', 'imagen'):
+            fila[campo] = str(valor).strip()
+        elif campo in ('precio_venta', 'costo'):
+            fila[campo] = _decimal(valor, campo, minimo=Decimal('0.01'))
+        elif campo == 'descuento':
+            fila[campo] = _decimal(valor, campo, minimo=Decimal('0'), maximo=Decimal('100'))
+        elif campo == 'stock':
+            try:
+                fila[campo] = int(Decimal(str(valor).strip()))
+            except InvalidOperation:
+                raise ValueError(f'stock no es un número: {valor}')
+            if fila[campo] < 0:
+                raise ValueError(f'stock negativo: {valor}')
+        elif campo == 'activo':
+            texto = str(valor).strip().lower()
+            if texto not in VERDADERO | FALSO:
+                raise ValueError(f'activo debe ser sí/no: {valor}')
+            fila[campo] = texto in VERDADERO
+    if not fila.get('nombre'):
+        raise ValueError('falta el nombre')
+    if len(fila['nombre']) > Producto._meta.get_field('nombre').max_length:
+        raise ValueError('nombre demasiado largo')
+    return fila
+
+
+class Command(BaseCommand):
+    help = 'Importa categorías y productos desde CSV/JSON en lote (con --simular para ver los cambios).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivos', nargs='+', help='Archivos .csv o .json')
+        parser.add_argument('--simular', action='store_true', help='Mostrar los cambios sin guardar nada')
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1, help='Procesos para las imágenes')
+        parser.add_argument('--sin-imagenes', action='store_true', help='Ignorar la columna imagen')
+        parser.add_argument('--lote', type=int, default=1000, help='Filas por sentencia INSERT/UPDATE')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        categorias, filas, errores = self._leer(options['archivos'])
+        leidas = len(filas) + len(errores)
+        if not filas and not categorias:
+            raise CommandError('No hay filas válidas para importar.')
+
+        existentes = {}
+        for producto in inventario.con_stock(Producto.objects.all()):
+            existentes.setdefault(producto.nombre.lower(), producto)
+        nombres_categorias = set(categorias) | {f['categoria'] for _, f in filas if 'categoria' in f}
+        categoria_ids = dict(Categoria.objects.filter(nombre__in=nombres_categorias).values_list('nombre', 'id'))
+
+        nuevos, cambios, sin_cambios = [], [], []
+        for origen, fila in filas:
+            producto = existentes.get(fila['nombre'].lower())
+            if producto is None:
+                faltan = [c for c in ('categoria', 'precio_venta', 'costo') if c not in fila]
+                if faltan:
+                    errores.append(f'{origen}: producto nuevo sin {", ".join(faltan)}')
+                    continue
+                nuevos.append((origen, fila))
+            else:
+                diferencias = self._diferencias(producto, fila, categoria_ids)
+                if diferencias:
+                    cambios.append((origen, producto, fila, diferencias))
+                else:
+                    sin_cambios.append((origen, producto, fila))
+        categorias_nuevas = sorted(nombres_categorias - set(categoria_ids))
+
+        imagenes = {} if options['sin_imagenes'] else self._imagenes(nuevos, cambios, sin_cambios, errores)
+        self._informe(categorias_nuevas, nuevos, cambios, imagenes, errores, options)
+        if options['simular']:
+            self.stdout.write(self.style.WARNING('Simulación: no se guardó ningún cambio.'))
+            return
+
+        t_imagenes = time.perf_counter()
+        procesadas = self._procesar_imagenes(imagenes, options['procesos'], errores)
+        t_imagenes = time.perf_counter() - t_imagenes
+
+        t_base = time.perf_counter()
+        creados, actualizados = self._guardar(categorias, categorias_nuevas, nuevos, cambios, existentes, procesadas, options['lote'])
+        t_base = time.perf_counter() - t_base
+
+        duracion = time.perf_counter() - inicio
+        for error in errores:
+            self.stderr.write(self.style.WARNING(f'  {error}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {leidas} filas en {duracion:.2f}s ({leidas / duracion:.0f} filas/s): '
+            f'{len(categorias_nuevas)} categorías nuevas, {creados} productos creados, '
+            f'{actualizados} actualizados, {len(procesadas)} imágenes ({t_imagenes:.2f}s), '
+            f'base de datos {t_base:.2f}s, {len(errores)} error(es)'
+        ))
+
+    def _leer(self, archivos):
+        """Lee los archivos: ({categoria: descripcion | None}, [(origen, fila)], [errores])."""
+        categorias, filas, errores = {}, [], []
+        for ruta in archivos:
+            try:
+                registros, cats = self._registros(ruta)
+            except (OSError, ValueError, csv.Error) as e:
+                raise CommandError(f'No se pudo leer {ruta}: {e}')
+            for cat in cats:
+                nombre = str(cat.get('nombre') or '').strip()
+                if nombre:
+                    categorias[nombre] = (str(cat.get('descripcion') or '').strip() or None)
+            base = os.path.dirname(os.path.abspath(ruta))
+            for numero, datos in registros:
+                origen = f'{os.path.basename(ruta)}:{numero}'
+                try:
+                    if not isinstance(datos, dict):
+                        raise ValueError('la fila no es un objeto')
+                    fila = _fila(datos)
+                except ValueError as e:
+                    errores.append(f'{origen}: {e}')
+                    continue
+                fila['_base'] = base
+                filas.append((origen, fila))
+
+        # Un mismo producto repetido: vale la última fila
+        ultima = {}
+        for indice, (origen, fila) in enumerate(filas):
+            anterior = ultima.get(fila['nombre'].lower())
+            if anterior is not None:
+                errores.append(f'{filas[anterior][0]}: "{fila["nombre"]}" se repite en {origen}, se usa la última')
+            ultima[fila['nombre'].lower()] = indice
+        return categorias, [filas[i] for i in sorted(ultima.values())], errores
+
+    def _registros(self, ruta):
+        """[(número de fila, dict)] y la lista de categorías del archivo."""
+        if ruta.lower().endswith('.json'):
+            with open(ruta, encoding='utf-8') as archivo:
+                datos = json.load(archivo)
+            if isinstance(datos, list):
+                return list(enumerate(datos, 1)), []
+            if not isinstance(datos, dict):
+                raise ValueError('se esperaba una lista o un objeto con "productos"')
+            return list(enumerate(datos.get('productos') or [], 1)), datos.get('categorias') or []
+        with open(ruta, encoding='utf-8-sig', newline='') as archivo:
+            muestra = archivo.read(4096)
+            archivo.seek(0)
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t') if muestra else csv.excel
+            lector = csv.DictReader(archivo, dialect=dialecto)
+            if lector.fieldnames:
+                lector.fieldnames = [c.strip().lower() for c in lector.fieldnames]
+            return [(lector.line_num, dict(r)) for r in lector], []
+
+    def _diferencias(self, producto, fila, categoria_ids):
+        """{campo: (actual, nuevo)} de los campos de `fila` que cambian."""
+        diferencias = {}
+        for campo in ('precio_venta', 'costo', 'descuento', 'stock', 'descripcion', 'activo'):
+            actual = producto.stock_disponible if campo == 'stock' else getattr(producto, campo)
+            if campo in fila and actual != fila[campo]:
+                diferencias[campo] = (actual, fila[campo])
+        if 'categoria' in fila and categoria_ids.get(fila['categoria']) != producto.categoria_id:
+            diferencias['categoria'] = (producto.categoria_id, fila['categoria'])
+        return diferencias
+
+    def _imagenes(self, nuevos, cambios, sin_cambios, errores):
+        """{nombre en minúsculas: (archivo local o None, nombre en el storage)} de las imágenes a procesar."""
+        imagenes = {}
+        # Un producto sin otros cambios también puede traer una imagen distinta
+        candidatos = [(o, f, None) for o, f in nuevos] + [(o, f, p) for o, p, f, _ in cambios] + [(o, f, p) for o, p, f in sin_cambios]
+        for origen, fila, producto in candidatos:
+            ruta = fila.get('imagen')
+            if not ruta:
+                continue
+            local = None
+            if not default_storage.exists(ruta):
+                local = ruta if os.path.isabs(ruta) else os.path.join(fila['_base'], ruta)
+                if not os.path.isfile(local):
+                    errores.append(f'{origen}: no se encontró la imagen {ruta}')
+                    continue
+            actual = producto.imagen.name if producto is not None and producto.imagen else None
+            if local is None and actual == ruta and producto.imagen_variantes:
+                continue  # Misma imagen y miniaturas ya generadas
+            imagenes[fila['nombre'].lower()] = (local, ruta if local is None else None)
+        return imagenes
+
+    def _procesar_imagenes(self, imagenes, procesos, errores):
+        """Copia y genera miniaturas en paralelo: {nombre: (ruta, variantes)}."""
+        if not imagenes:
+            return {}
+        connections.close_all()  # No compartir la conexión con los procesos hijos
+        resultado = {}
+        with ProcessPoolExecutor(max_workers=max(1, procesos), initializer=django.setup) as pool:
+            tareas = [pool.submit(_preparar_imagen, clave, local, nombre) for clave, (local, nombre) in imagenes.items()]
+            for tarea in as_completed(tareas):
+                clave, nombre, variantes, error = tarea.result()
+                if error:
+                    errores.append(f'imagen de "{clave}": {error}')
+                else:
+                    resultado[clave] = (nombre, variantes)
+        return resultado
+
+    def _guardar(self, categorias, categorias_nuevas, nuevos, cambios, existentes, imagenes, lote):
+        reemplazadas = []
+        with transaction.atomic():
+            if categorias or categorias_nuevas:
+                filas = [Categoria(nombre=n, descripcion=categorias.get(n)) for n in set(categorias) | set(categorias_nuevas)]
+                con_descripcion = [c for c in filas if c.descripcion]
+                sin_descripcion = [c for c in filas if not c.descripcion and c.nombre in categorias_nuevas]
+                if con_descripcion:
+                    Categoria.objects.bulk_create(
+                        con_descripcion, batch_size=lote, update_conflicts=True, update_fields=['descripcion'],
+                        # MySQL resuelve el conflicto con cualquier índice único (no acepta unique_fields)
+                        unique_fields=['nombre'] if connection.features.supports_update_conflicts_with_target else None,
+                    )
+                if sin_descripcion:
+                    Categoria.objects.bulk_create(sin_descripcion, batch_size=lote, ignore_conflicts=True)
+            nombres = {f['categoria'] for _, f in nuevos} | {f['categoria'] for _, _, f, _ in cambios if 'categoria' in f}
+            categoria_ids = dict(Categoria.objects.filter(nombre__in=nombres).values_list('nombre', 'id'))
+
+            productos = []
+            for _, fila in nuevos:
+                producto = Producto(
+                    nombre=fila['nombre'],
+                    categoria_id=categoria_ids[fila['categoria']],
+                    precio_venta=fila['precio_venta'],
+                    costo=fila['costo'],
+                    descuento=fila.get('descuento', Decimal('0')),
+                    stock=fila.get('stock', 0),
+                    descripcion=fila.get('descripcion'),
+                    activo=fila.get('activo', True),
+                )
+                imagen = imagenes.get(fila['nombre'].lower())
+                if imagen:
+                    producto.imagen, producto.imagen_variantes = imagen
+                productos.append(producto)
+            Producto.objects.bulk_create(productos, batch_size=lote)
+            # Releer los creados: en MySQL bulk_create no asigna los id
+            inventario.stock_inicial(
+                Producto.objects.filter(nombre__in=[p.nombre for p in productos], stock__gt=0).only('pk', 'stock'),
+                nota='importar_catalogo',
+            )
+
+            modificados, campos, stocks = [], set(), {}
+            for _, producto, fila, diferencias in cambios:
+                for campo in diferencias:
+                    if campo == 'categoria':
+                        producto.categoria_id = categoria_ids[fila['categoria']]
+                        campos.add('categoria_id')
+                    elif campo == 'stock':
+                        stocks[producto.pk] = fila['stock']  # Como ajuste en el libro de inventario
+                    else:
+                        setattr(producto, campo, fila[campo])
+                        campos.add(campo)
+                modificados.append(producto)
+            # Productos existentes que reciben una imagen nueva
+            for producto in (existentes[n] for n in imagenes if n in existentes):
+                reemplazadas.append(producto.imagen_variantes)
+                producto.imagen, producto.imagen_variantes = imagenes[producto.nombre.lower()]
+                campos.update(('imagen', 'imagen_variantes'))
+                if producto not in modificados:
+                    modificados.append(producto)
+            if campos:
+                Producto.objects.bulk_update(modificados, sorted(campos), batch_size=lote)
+            inventario.fijar(stocks, nota='importar_catalogo')
+
+            # bulk_create/bulk_update no envían señales: una sola invalidación del catálogo del POS
+            transaction.on_commit(catalogo.invalidar)
+
+        conservar = {ruta for _, variantes in imagenes.values() for rutas in variantes.values() for ruta in rutas.values()}
+        for variantes in reemplazadas:
+            eliminar_derivados(variantes, conservar=conservar)
+        return len(productos), len(modificados)
+
+    def _informe(self, categorias_nuevas, nuevos, cambios, imagenes, errores, options):
+        detalle = options['simular'] or options['verbosity'] >= 2
+        if detalle:
+            for nombre in categorias_nuevas:
+                self.stdout.write(self.style.SUCCESS(f'+ categoría {nombre}'))
+            for _, fila in nuevos:
+                self.stdout.write(self.style.SUCCESS(
+                    f'+ {fila["nombre"]} ({fila["categoria"]}, Bs. {fila["precio_venta"]}, stock {fila.get("stock", 0)})'
+                ))
+            for _, producto, _, diferencias in cambios:
+                texto = ', '.join(f'{campo}: {antes} → {despues}' for campo, (antes, despues) in diferencias.items())
+                self.stdout.write(self.style.WARNING(f'~ {producto.nombre}: {texto}'))
+            for nombre, (local, ruta) in imagenes.items():
+                self.stdout.write(f'  imagen {nombre}: {"copiar " + local if local else ruta}')
+            if options['simular']:
+                for error in errores:
+                    self.stderr.write(self.style.WARNING(f'  {error}'))
+        self.stdout.write(
+            f'{len(categorias_nuevas)} categorías nuevas, {len(nuevos)} productos nuevos, '
+            f'{len(cambios)} con cambios, {len(imagenes)} imágenes a procesar, {len(errores)} error(es)'
+        )
@@ -0,0 +1,58 @@
+"""
+Procesa la cola de eventos posteriores a la venta (gestion/eventos.py).
+
+Con EVENTOS_MODO='externo' los eventos solo los procesan estos workers; se
+pueden lanzar varios en paralelo. Con el modo 'hilo' (por defecto) sirve para
+vaciar la cola a mano o reintentar eventos con error.
+
+Uso:
+  python manage.py procesar_eventos                  # procesa lo pendiente y termina
+  python manage.py procesar_eventos --continuo       # worker: sigue esperando eventos nuevos
+  python manage.py procesar_eventos --reintentar     # vuelve a encolar los eventos con error
+  python manage.py procesar_eventos --purgar=7       # borra los procesados hace más de 7 días
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from gestion import eventos
+from gestion.models import Evento
+
+
+class Command(BaseCommand):
+    help = 'Procesa los eventos en cola (resúmenes y demás efectos posteriores a la venta).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--continuo', action='store_true', help='No terminar: esperar eventos nuevos')
+        parser.add_argument('--intervalo', type=float, default=1.0, help='Segundos de espera con la cola vacía')
+        parser.add_argument('--lote', type=int, default=100, help='Eventos por vuelta')
+        parser.add_argument('--reintentar', action='store_true', help='Volver a encolar los eventos con error')
+        parser.add_argument('--purgar', type=int, default=None, metavar='DIAS',
+                            help='Borrar los eventos procesados hace más de DIAS días')
+
+    def handle(self, *args, **options):
+        if options['reintentar']:
+            self.stdout.write(f'{eventos.reintentar_errores()} evento(s) con error encolados de nuevo')
+        if options['purgar'] is not None:
+            self.stdout.write(f'{eventos.purgar(options["purgar"])} evento(s) procesados eliminados')
+
+        total = 0
+        try:
+            while True:
+                procesados = eventos.procesar_pendientes(options['lote'])
+                total += procesados
+                if procesados:
+                    continue
+                if not options['continuo']:
+                    break
+                close_old_connections()
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+
+        errores = Evento.objects.filter(estado='error').count()
+        pendientes = Evento.objects.filter(estado='pendiente').count()
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {total} evento(s) procesados; {pendientes} pendiente(s), {errores} con error'
+        ))
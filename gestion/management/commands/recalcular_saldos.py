@@ -0,0 +1,57 @@
+"""
+Recalcula Venta.monto_pagado y Venta.monto_validado desde los pagos, en un
+solo UPDATE. Los saldos se mantienen solos con cada Pago guardado o validado;
+este comando es para después de cargas directas en la base de datos
+(bulk_create, SQL a mano) o para revisar que cuadren.
+
+Uso:
+  python manage.py recalcular_saldos
+  python manage.py recalcular_saldos --desde=2025-01-01 --hasta=2025-01-31
+  python manage.py recalcular_saldos --verificar      # solo listar las ventas descuadradas
+"""
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion.fechas import inicio_dia
+from gestion.models import Venta
+from gestion.ventas import recalcular_saldos, saldos_descuadrados
+
+
+def _fecha(valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'Fecha inválida: {valor} (formato YYYY-MM-DD)')
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los saldos pagados/validados de las ventas desde sus pagos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=_fecha, default=None, help='Fecha inicial (YYYY-MM-DD)')
+        parser.add_argument('--hasta', type=_fecha, default=None, help='Fecha final (YYYY-MM-DD)')
+        parser.add_argument('--verificar', action='store_true', help='No modificar: listar las ventas descuadradas')
+
+    def handle(self, *args, **options):
+        ventas = Venta.objects.all()
+        if options['desde']:
+            ventas = ventas.filter(fecha__gte=inicio_dia(options['desde']))
+        if options['hasta']:
+            ventas = ventas.filter(fecha__lt=inicio_dia(options['hasta'] + timedelta(days=1)))
+
+        if options['verificar']:
+            descuadradas = list(saldos_descuadrados(ventas).values_list(
+                'pk', 'monto_pagado', 'pagado', 'monto_validado', 'validado'
+            ))
+            for pk, monto_pagado, pagado, monto_validado, validado in descuadradas:
+                self.stdout.write(self.style.WARNING(
+                    f'  Venta #{pk}: pagado {monto_pagado} (pagos {pagado}), validado {monto_validado} (pagos {validado})'
+                ))
+            if descuadradas:
+                raise CommandError(f'{len(descuadradas)} venta(s) con saldos descuadrados.')
+            self.stdout.write(self.style.SUCCESS('✓ Los saldos de las ventas cuadran con sus pagos'))
+            return
+
+        actualizadas = recalcular_saldos(ventas)
+        self.stdout.write(self.style.SUCCESS(f'✓ Saldos recalculados en {actualizadas} venta(s)'))
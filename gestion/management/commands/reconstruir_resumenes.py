@@ -0,0 +1,54 @@
+"""
+Comando para reconstruir los resúmenes de ventas (ResumenDiario, ResumenProducto y ResumenPago) desde el historial.
+
+Uso:
+  python manage.py reconstruir_resumenes
+  python manage.py reconstruir_resumenes --desde=2025-01-01 --hasta=2025-01-31
+  python manage.py reconstruir_resumenes --solo=productos
+  python manage.py reconstruir_resumenes --solo=pagos
+
+Las fechas son días locales (America/La_Paz). Útil después de migrar o si se
+editaron ventas directamente en la base de datos.
+"""
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion.eventos import procesar_pendientes
+from gestion.resumenes import reconstruir, reconstruir_pagos, reconstruir_productos
+
+
+def _fecha(valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'Fecha inválida: {valor} (formato YYYY-MM-DD)')
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las tablas ResumenDiario y ResumenProducto a partir de las ventas registradas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=_fecha, default=None, help='Fecha inicial (YYYY-MM-DD)')
+        parser.add_argument('--hasta', type=_fecha, default=None, help='Fecha final (YYYY-MM-DD)')
+        parser.add_argument(
+            '--solo',
+            choices=['diario', 'productos', 'pagos'],
+            default=None,
+            help='Reconstruir solo una de las tablas',
+        )
+
+    def handle(self, *args, **options):
+        # Aplicar antes los eventos en cola: si no, se sumarían otra vez sobre lo reconstruido
+        while procesar_pendientes():
+            pass
+        rango = {'desde': options['desde'], 'hasta': options['hasta']}
+        if options['solo'] in (None, 'diario'):
+            filas = reconstruir(**rango)
+            self.stdout.write(self.style.SUCCESS(f'✓ Resumen diario reconstruido: {filas} fila(s)'))
+        if options['solo'] in (None, 'productos'):
+            filas = reconstruir_productos(**rango)
+            self.stdout.write(self.style.SUCCESS(f'✓ Resumen por producto reconstruido: {filas} fila(s)'))
+        if options['solo'] in (None, 'pagos'):
+            filas = reconstruir_pagos(**rango)
+            self.stdout.write(self.style.SUCCESS(f'✓ Resumen de pagos reconstruido: {filas} fila(s)'))
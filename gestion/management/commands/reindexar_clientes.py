@@ -0,0 +1,38 @@
+"""
+Comando para recalcular las columnas de búsqueda de clientes y el índice de texto.
+
+Uso:
+  python manage.py reindexar_clientes
+
+Útil después de cargar clientes directamente en la base de datos, o en SQLite
+después de migraciones que recrean la tabla gestion_cliente (se pierden los
+triggers que mantienen la tabla FTS5).
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from gestion.busqueda import indice_texto_disponible, instalar_indice_texto
+from gestion.models import Cliente
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las columnas normalizadas de Cliente y reinstala el índice de texto.'
+
+    def handle(self, *args, **options):
+        campos = ['busqueda', 'ci_nit_digitos', 'telefono_digitos']
+        total = 0
+        ultimo = 0
+        while True:
+            lote = list(Cliente.objects.filter(pk__gt=ultimo).order_by('pk')[:2000])
+            if not lote:
+                break
+            for cliente in lote:
+                cliente.actualizar_busqueda()
+            with transaction.atomic():
+                Cliente.objects.bulk_update(lote, campos)
+            total += len(lote)
+            ultimo = lote[-1].pk
+
+        instalar_indice_texto()
+        indice = indice_texto_disponible() or 'ninguno (LIKE sobre la columna normalizada)'
+        self.stdout.write(self.style.SUCCESS(f'✓ {total} cliente(s) reindexados; índice de texto: {indice}'))
@@ -0,0 +1,156 @@
+"""
+Restaura un backup hecho con backup_db, verificando antes su checksum.
+
+Sin argumentos restaura el backup completo más reciente de la carpeta y luego
+aplica sus incrementales en orden (el estado del último backup). Todos los
+archivos de la cadena se verifican (SHA-256 del manifiesto) antes de tocar la
+base de datos. Si se indica un incremental, solo se aplica ese incremental
+sobre la base actual.
+
+Uso:
+  python manage.py restore_db
+  python manage.py restore_db db_20250131_230000.sql.gz --hasta=ventas_20250201_130000.jsonl.gz
+  python manage.py restore_db --sin-incrementales --noinput
+  python manage.py restore_db --verificar          # solo comprobar los checksums
+
+Para MySQL: requiere el cliente mysql instalado.
+Después de aplicar incrementales se reconstruyen los resúmenes de las fechas afectadas.
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from gestion import respaldos
+from gestion.respaldos import RespaldoError
+
+
+class Command(BaseCommand):
+    help = 'Restaura un backup de backup_db (completo y sus incrementales) verificando los checksums.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', nargs='?', help='Backup completo o incremental (por defecto el último completo)')
+        parser.add_argument(
+            '--dir',
+            type=str,
+            default=None,
+            help='Carpeta de los backups (por defecto: backups/ en el proyecto)',
+        )
+        parser.add_argument('--hasta', help='Aplicar los incrementales hasta este archivo (inclusive)')
+        parser.add_argument('--sin-incrementales', action='store_true', help='Restaurar solo el backup completo')
+        parser.add_argument('--verificar', action='store_true', help='Solo verificar los checksums, sin restaurar')
+        parser.add_argument(
+            '--noinput', '--no-input',
+            action='store_false',
+            dest='interactive',
+            help='No pedir confirmación',
+        )
+
+    def handle(self, *args, **options):
+        db_settings = settings.DATABASES['default']
+        try:
+            backup_dir = respaldos.carpeta(options.get('dir'))
+            motor = respaldos.motor(db_settings)
+            archivos = self._cadena(backup_dir, motor, options)
+            for manifiesto in archivos:
+                respaldos.verificar(manifiesto)
+                self.stdout.write(f'  ✓ {manifiesto["archivo"]}: checksum correcto')
+            if options['verificar']:
+                self.stdout.write(self.style.SUCCESS(f'✓ {len(archivos)} archivo(s) verificados'))
+                return
+
+            if options['interactive']:
+                respuesta = input(
+                    f'Se reemplazarán datos de la base "{db_settings.get("NAME")}" con '
+                    f'{", ".join(m["archivo"] for m in archivos)}. Escriba "si" para continuar: '
+                )
+                if respuesta.strip().lower() not in ('si', 'sí'):
+                    raise CommandError('Restauración cancelada.')
+
+            fechas = []
+            for manifiesto in archivos:
+                if manifiesto['tipo'] == 'completo':
+                    self._restaurar_completo(manifiesto, db_settings, motor)
+                else:
+                    fechas += self._aplicar_incremental(manifiesto)
+        except RespaldoError as e:
+            raise CommandError(str(e))
+
+        fechas = [f for f in fechas if f]
+        if fechas:
+            desde, hasta = timezone.localdate(min(fechas)), timezone.localdate(max(fechas))
+            self.stdout.write(f'Reconstruyendo resúmenes del {desde:%d/%m/%Y} al {hasta:%d/%m/%Y}...')
+            call_command('reconstruir_resumenes', desde=desde, hasta=hasta, stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Restaurado hasta {timezone.localtime(archivos[-1]["hasta"]):%d/%m/%Y %H:%M:%S}'
+        ))
+
+    def _cadena(self, backup_dir, motor, options):
+        """Manifiestos a restaurar, en orden."""
+        todos = respaldos.manifiestos(backup_dir)
+        if options['archivo']:
+            elegido = respaldos.buscar(backup_dir, options['archivo'])
+            if elegido['tipo'] == 'incremental':
+                return [elegido]
+        else:
+            completos = [m for m in todos if m['tipo'] == 'completo' and m.get('motor') == motor]
+            if not completos:
+                raise CommandError(f'No hay backups completos en {backup_dir}')
+            elegido = completos[-1]
+        if elegido.get('motor') != motor:
+            raise CommandError(f'{elegido["archivo"]} es un backup {elegido.get("motor")}, la base actual es {motor}')
+        if options['sin_incrementales']:
+            return [elegido]
+        if elegido['ruta'].parent != backup_dir:
+            todos = respaldos.manifiestos(elegido['ruta'].parent)
+        return respaldos.cadena(todos, elegido, options['hasta'])
+
+    def _restaurar_completo(self, manifiesto, db_settings, motor):
+        self.stdout.write(f'Restaurando {manifiesto["archivo"]}...')
+        connections.close_all()
+        if motor == 'sqlite':
+            self._restaurar_sqlite(manifiesto, db_settings)
+        else:
+            self._restaurar_mysql(manifiesto, db_settings)
+
+    def _restaurar_sqlite(self, manifiesto, db_settings):
+        db_path = db_settings.get('NAME')
+        fd, temporal = tempfile.mkstemp(suffix='.sqlite3', dir=os.path.dirname(os.path.abspath(db_path)))
+        try:
+            with respaldos.lectura(manifiesto['ruta']) as origen, os.fdopen(fd, 'wb') as destino:
+                shutil.copyfileobj(origen, destino, respaldos.TAMANO_BLOQUE)
+            respaldos.revisar_sqlite(temporal)
+            # Copiar con la API de backup: reemplaza el contenido aunque otros procesos tengan la base abierta
+            respaldos.copiar_sqlite(temporal, db_path, paginas=-1, pausa=0)
+        finally:
+            os.unlink(temporal)
+
+    def _restaurar_mysql(self, manifiesto, db_settings):
+        with respaldos.credenciales_mysql(db_settings) as conexion, tempfile.TemporaryFile() as errores:
+            try:
+                proceso = subprocess.Popen(
+                    ['mysql', *conexion, db_settings.get('NAME')], stdin=subprocess.PIPE, stderr=errores
+                )
+            except FileNotFoundError:
+                raise CommandError('mysql no encontrado. Instale el cliente MySQL o MariaDB.')
+            try:
+                with respaldos.lectura(manifiesto['ruta']) as origen:
+                    shutil.copyfileobj(origen, proceso.stdin, respaldos.TAMANO_BLOQUE)
+                proceso.stdin.close()
+            except BrokenPipeError:
+                pass  # mysql terminó antes: el error queda en su salida
+            if proceso.wait() != 0:
+                errores.seek(0)
+                raise CommandError(f'mysql falló: {errores.read().decode(errors="replace")}')
+
+    def _aplicar_incremental(self, manifiesto):
+        with respaldos.lectura(manifiesto['ruta']) as entrada:
+            filas, desde, hasta = respaldos.importar_ventas(entrada)
+        self.stdout.write(f'  {manifiesto["archivo"]}: {filas} filas aplicadas')
+        return [desde, hasta]
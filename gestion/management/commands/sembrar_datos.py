@@ -0,0 +1,222 @@
+"""
+Siembra datos sintéticos realistas para benchmarks y pruebas de carga.
+
+Crea categorías, productos, clientes, cajeros y un historial de ventas con
+detalles y pagos. La popularidad de los productos sigue una ley de Zipf
+(pocos productos concentran la mayoría de las ventas) y las horas siguen los
+picos de almuerzo y cena. Con la misma --semilla se obtienen los mismos datos.
+
+Las ventas se insertan con bulk_create por lotes, con ids explícitos (MySQL no
+retorna los ids de bulk_create) y números de ticket/factura reservados por
+bloques en su Secuencia. Al final se reconstruyen los resúmenes.
+
+Uso:
+  python manage.py sembrar_datos
+  python manage.py sembrar_datos --productos=20000 --clientes=50000 --ventas=2000000
+  python manage.py sembrar_datos --ventas=100000 --dias=90 --semilla=7 --sin-resumenes
+
+Los cajeros sintéticos se llaman cajero_bm_1, cajero_bm_2, ... (sin contraseña
+utilizable); los usa el comando benchmark_pos.
+"""
+import bisect
+import itertools
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from gestion import inventario, numeracion
+from gestion.management.commands.benchmark_busqueda_clientes import APELLIDOS, NOMBRES
+from gestion.models import Categoria, Cliente, DetalleVenta, MetodoPago, Pago, Producto, Venta
+
+PREFIJO_CAJERO = 'cajero_bm_'
+CATEGORIAS = ['Pollos', 'Combos', 'Porciones', 'Bebidas', 'Postres', 'Ensaladas', 'Sándwiches',
+              'Salsas', 'Promociones', 'Infantil']
+# Peso relativo de cada hora del día (picos de almuerzo y cena)
+PESO_HORAS = [0, 0, 0, 0, 0, 0, 0, 1, 2, 2, 3, 6, 10, 10, 6, 3, 3, 4, 7, 9, 9, 6, 3, 1]
+
+
+def pesos_zipf(cantidad, sesgo):
+    """Pesos acumulados de Zipf para `cantidad` elementos (el primero es el más popular)."""
+    return list(itertools.accumulate(1 / (rango ** sesgo) for rango in range(1, cantidad + 1)))
+
+
+def elegir(rng, elementos, acumulados):
+    """Elemento al azar según pesos acumulados (búsqueda binaria, O(log n))."""
+    return elementos[bisect.bisect_left(acumulados, rng.random() * acumulados[-1])]
+
+
+class Command(BaseCommand):
+    help = 'Siembra productos, clientes y ventas sintéticas (popularidad sesgada) para benchmarks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=20000, help='Productos a crear')
+        parser.add_argument('--clientes', type=int, default=50000, help='Clientes a crear')
+        parser.add_argument('--ventas', type=int, default=1000000, help='Ventas a crear')
+        parser.add_argument('--lineas', type=float, default=2.5, help='Promedio de líneas por venta')
+        parser.add_argument('--dias', type=int, default=365, help='Días de historial')
+        parser.add_argument('--cajeros', type=int, default=8, help='Cajeros sintéticos')
+        parser.add_argument('--sesgo', type=float, default=1.1, help='Exponente de Zipf de la popularidad')
+        parser.add_argument('--semilla', type=int, default=42, help='Semilla aleatoria (datos reproducibles)')
+        parser.add_argument('--lote', type=int, default=5000, help='Ventas por transacción')
+        parser.add_argument('--sin-resumenes', action='store_true', help='No reconstruir los resúmenes al final')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['semilla'])
+        inicio = time.perf_counter()
+
+        categorias = self._categorias()
+        productos = self._productos(rng, options['productos'], categorias)
+        clientes = self._clientes(rng, options['clientes'])
+        cajeros = self._cajeros(options['cajeros'])
+        metodos = list(MetodoPago.objects.filter(activo=True))
+        if not metodos:
+            metodos = [MetodoPago.objects.create(nombre='Efectivo', tipo='efectivo')]
+
+        if options['ventas']:
+            self._ventas(rng, options, productos, clientes, cajeros, metodos)
+            if not options['sin_resumenes']:
+                self.stdout.write('Reconstruyendo resúmenes...')
+                call_command('reconstruir_resumenes', stdout=self.stdout)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Datos sembrados en {time.perf_counter() - inicio:.0f}s: '
+            f'{Producto.objects.count()} productos, {Cliente.objects.count()} clientes, '
+            f'{Venta.objects.count()} ventas, {DetalleVenta.objects.count()} detalles'
+        ))
+
+    def _categorias(self):
+        return [Categoria.objects.get_or_create(nombre=nombre)[0] for nombre in CATEGORIAS]
+
+    def _productos(self, rng, cantidad, categorias):
+        inicio = Producto.objects.count()
+        lote = []
+        for i in range(cantidad):
+            precio = Decimal(rng.choice([5, 8, 10, 12, 15, 18, 22, 25, 30, 35, 45, 60, 85, 120]))
+            lote.append(Producto(
+                nombre=f'{rng.choice(CATEGORIAS)} {inicio + i + 1}',
+                costo=(precio * Decimal('0.45')).quantize(Decimal('0.01')),
+                precio_venta=precio,
+                stock=10 ** 9,  # Sin quiebres de stock durante la prueba de carga
+                categoria=rng.choice(categorias),
+            ))
+        ultimo = Producto.objects.aggregate(m=Max('pk'))['m'] or 0
+        with transaction.atomic():
+            Producto.objects.bulk_create(lote, batch_size=2000)
+            inventario.stock_inicial(Producto.objects.filter(pk__gt=ultimo).only('pk', 'stock'))
+        if cantidad:
+            self.stdout.write(f'  {cantidad} productos')
+        return list(Producto.objects.filter(activo=True).values_list('pk', 'precio_venta', 'categoria_id'))
+
+    def _clientes(self, rng, cantidad):
+        inicio = Cliente.objects.count()
+        creados = 0
+        while creados < cantidad:
+            lote = []
+            for i in range(min(5000, cantidad - creados)):
+                n = inicio + creados + i
+                cliente = Cliente(
+                    nombre_completo=f'{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}',
+                    ci_nit=f'{20000000 + n}SD',
+                    telefono=f'7{rng.randint(0, 9999999):07d}',
+                    email=f'cliente{n}@ejemplo.bo' if rng.random() < 0.3 else None,
+                )
+                cliente.actualizar_busqueda()  # bulk_create no llama a save()
+                lote.append(cliente)
+            with transaction.atomic():
+                Cliente.objects.bulk_create(lote, batch_size=1000)
+            creados += len(lote)
+        if cantidad:
+            self.stdout.write(f'  {cantidad} clientes')
+        return list(Cliente.objects.filter(activo=True).values_list('pk', flat=True))
+
+    def _cajeros(self, cantidad):
+        cajeros = []
+        for i in range(1, cantidad + 1):
+            usuario, creado = User.objects.get_or_create(username=f'{PREFIJO_CAJERO}{i}')
+            if creado:
+                usuario.set_unusable_password()
+                usuario.save(update_fields=['password'])
+            cajeros.append(usuario.pk)
+        return cajeros
+
+    def _ventas(self, rng, options, productos, clientes, cajeros, metodos):
+        cantidad = options['ventas']
+        rng.shuffle(productos)  # La popularidad no depende del id
+        acumulados = pesos_zipf(len(productos), options['sesgo'])
+        horas = list(range(24))
+        acumulados_horas = list(itertools.accumulate(PESO_HORAS))
+        max_lineas = max(1, round(options['lineas'] * 2 - 1))  # Uniforme 1..max: promedio = --lineas
+        ahora = timezone.localtime()
+        hoy = ahora.replace(minute=0, second=0, microsecond=0)
+
+        siguiente_id = (Venta.objects.aggregate(m=Max('pk'))['m'] or 0) + 1
+        campos_fecha = [Venta._meta.get_field('fecha'), Pago._meta.get_field('fecha_pago')]
+        for campo in campos_fecha:
+            campo.auto_now_add = False  # Permitir fechas del pasado en bulk_create
+        try:
+            creadas = 0
+            while creadas < cantidad:
+                tamano = min(options['lote'], cantidad - creadas)
+                ventas, detalles, pagos = [], [], []
+                es_factura = [rng.random() < 0.1 for _ in range(tamano)]
+                with transaction.atomic():
+                    facturas = iter(numeracion.reservar(numeracion.SECUENCIA_FACTURA, sum(es_factura)) if any(es_factura) else ())
+                    tickets = iter(numeracion.reservar(numeracion.SECUENCIA_TICKET, tamano - sum(es_factura)) if not all(es_factura) else ())
+                    for factura in es_factura:
+                        fecha = hoy.replace(hour=elegir(rng, horas, acumulados_horas)) + timedelta(
+                            days=-rng.randint(0, options['dias'] - 1), minutes=rng.randint(0, 59)
+                        )
+                        if fecha > ahora:
+                            fecha -= timedelta(days=1)
+                        venta = Venta(
+                            pk=siguiente_id,
+                            fecha=fecha,
+                            cliente_id=rng.choice(clientes),
+                            usuario_id=rng.choice(cajeros),
+                            modo_consumo='llevar' if rng.random() < 0.35 else 'local',
+                            tipo_documento='factura' if factura else 'ticket',
+                            numero_factura=next(facturas) if factura else None,
+                            numero_ticket=None if factura else next(tickets),
+                            estado=rng.choices(('completado', 'pendiente', 'cancelado'), (95, 3, 2))[0],
+                        )
+                        siguiente_id += 1
+                        total = Decimal('0')
+                        elegidos = {}
+                        for _ in range(rng.randint(1, max_lineas)):
+                            pk, precio, _categoria = elegir(rng, productos, acumulados)
+                            elegidos.setdefault(pk, [precio, 0])[1] += rng.choice((1, 1, 1, 2, 2, 3))
+                        for pk, (precio, cantidad_linea) in elegidos.items():
+                            detalle = DetalleVenta(venta=venta, producto_id=pk, cantidad=cantidad_linea, precio_unitario=precio)
+                            detalle.calcular_importes()
+                            total += detalle.subtotal
+                            detalles.append(detalle)
+                        venta.subtotal = venta.total = venta.monto_pagado = total
+                        ventas.append(venta)
+                        metodo = rng.choice(metodos)
+                        validado = venta.estado == 'completado'
+                        venta.monto_validado = total if validado else Decimal('0')
+                        pagos.append(Pago(
+                            venta=venta,
+                            metodo_pago=metodo,
+                            monto=total,
+                            fecha_pago=fecha,
+                            validado=validado,
+                            fecha_validacion=fecha if validado else None,
+                        ))
+                    Venta.objects.bulk_create(ventas)
+                    DetalleVenta.objects.bulk_create(detalles, batch_size=5000)
+                    Pago.objects.bulk_create(pagos, batch_size=5000)
+                creadas += tamano
+                self.stdout.write(f'  {creadas}/{cantidad} ventas', ending='\r')
+        finally:
+            for campo in campos_fecha:
+                campo.auto_now_add = True
+        self.stdout.write(f'  {cantidad} ventas')
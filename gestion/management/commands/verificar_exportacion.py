@@ -0,0 +1,123 @@
+"""
+Verifica que la exportación a CSV (gestion/exportacion.py) use memoria
+constante: exporta N ventas y después N × --factor, con sus detalles y pagos,
+y falla si el pico de memoria de Python (tracemalloc) de la exportación grande
+supera al de la chica en más de --tolerancia.
+
+Las ventas se crean dentro de una transacción que se revierte al final: no
+quedan en la base (tampoco los productos, clientes ni métodos de pago de prueba).
+
+Uso:
+  python manage.py verificar_exportacion
+  python manage.py verificar_exportacion --ventas=5000 --factor=10 --tolerancia=0.25
+"""
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from gestion.exportacion import TIPOS, csv_por_partes
+from gestion.models import Categoria, Cliente, DetalleVenta, MetodoPago, Pago, Producto, Venta
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Verifica que la memoria de la exportación CSV no crezca con la cantidad de filas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ventas', type=int, default=5000, help='Ventas de la exportación chica')
+        parser.add_argument('--factor', type=int, default=10, help='Veces más ventas en la exportación grande')
+        parser.add_argument('--tolerancia', type=float, default=0.25,
+                            help='Crecimiento máximo admitido del pico de memoria (0.25 = 25%%)')
+
+    def handle(self, *args, **options):
+        chica = options['ventas']
+        grande = chica * options['factor']
+        if chica < 1 or options['factor'] < 2:
+            raise CommandError('--ventas debe ser al menos 1 y --factor al menos 2.')
+
+        resultados = {}
+        try:
+            with transaction.atomic():
+                primera, corte = self._sembrar(grande, chica)
+                ventas = Venta.objects.filter(pk__gte=primera)
+                for tipo in TIPOS:
+                    resultados[tipo] = (
+                        self._medir(tipo, ventas.filter(pk__lt=corte)),
+                        self._medir(tipo, ventas),
+                    )
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        fallas = []
+        for tipo, ((filas_chica, pico_chica, seg_chica), (filas_grande, pico_grande, seg_grande)) in resultados.items():
+            crecimiento = (pico_grande - pico_chica) / pico_chica if pico_chica else 0
+            linea = (
+                f'{tipo:<9} {filas_chica:>8} filas: {pico_chica / 1024:>8.0f} KB ({seg_chica:.2f}s)   '
+                f'{filas_grande:>8} filas: {pico_grande / 1024:>8.0f} KB ({seg_grande:.2f}s)   {crecimiento:+.0%}'
+            )
+            if crecimiento > options['tolerancia']:
+                fallas.append(tipo)
+                self.stdout.write(self.style.ERROR(linea))
+            else:
+                self.stdout.write(linea)
+
+        if fallas:
+            raise CommandError(
+                f'La memoria de la exportación crece con las filas ({", ".join(fallas)}): '
+                f'más de {options["tolerancia"]:.0%} con {options["factor"]}× ventas.'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Memoria constante: {chica} y {grande} ventas dentro de {options["tolerancia"]:.0%}'
+        ))
+
+    def _sembrar(self, cantidad, chica):
+        """
+        Crea `cantidad` ventas con un detalle y un pago cada una. Retorna el id de
+        la primera y el de la venta número `chica` + 1 (fin de la exportación chica).
+        """
+        usuario = User.objects.create(username=f'verificar_exportacion_{int(time.time() * 1000)}')
+        cliente = Cliente.objects.create(nombre_completo='Cliente de prueba', ci_nit=f'VX{usuario.pk}')
+        producto = Producto.objects.create(
+            nombre='Producto de prueba', costo=Decimal('5'), precio_venta=Decimal('20'), stock=0,
+            categoria=Categoria.objects.create(nombre=f'Prueba {usuario.pk}'),
+        )
+        metodo = MetodoPago.objects.create(nombre=f'Prueba {usuario.pk}', tipo='efectivo')
+        ventas = Venta.objects.bulk_create(
+            [Venta(cliente=cliente, usuario=usuario, subtotal=20, total=20, monto_pagado=20, monto_validado=20,
+                   estado='completado') for _ in range(cantidad)],
+            batch_size=5000,
+        )
+        if ventas[0].pk is None:  # Bases sin RETURNING (MySQL): leer los ids creados
+            ventas = list(Venta.objects.filter(usuario=usuario).only('pk').order_by('pk'))
+        detalles = []
+        for venta in ventas:
+            detalle = DetalleVenta(venta=venta, producto=producto, cantidad=1, precio_unitario=Decimal('20'))
+            detalle.calcular_importes()
+            detalles.append(detalle)
+        DetalleVenta.objects.bulk_create(detalles, batch_size=5000)
+        Pago.objects.bulk_create(
+            [Pago(venta=venta, metodo_pago=metodo, monto=20, validado=True) for venta in ventas],
+            batch_size=5000,
+        )
+        return ventas[0].pk, ventas[chica].pk
+
+    def _medir(self, tipo, ventas):
+        """Exporta sin guardar el CSV; retorna (filas, pico de memoria en bytes, segundos)."""
+        lineas = 0
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        try:
+            for _ in csv_por_partes(tipo, ventas):
+                lineas += 1
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return max(lineas - 2, 0), pico, time.perf_counter() - inicio  # BOM y encabezado
@@ -0,0 +1,102 @@
+"""
+Prueba de estrés de la numeración consecutiva (gestion/numeracion.py).
+
+Lanza varios hilos que reservan números en paralelo, cada uno en su propia
+transacción, y hace rollback de una parte de ellas para simular ventas
+fallidas. Al final verifica que los números confirmados no tengan
+duplicados ni huecos. Usa una serie temporal, no toca facturas ni tickets.
+
+Uso:
+  python manage.py verificar_numeracion
+  python manage.py verificar_numeracion --hilos=8 --por-hilo=200 --rollback=0.2
+"""
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+
+from gestion import numeracion
+from gestion.models import Secuencia
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Verifica que la numeración no tenga duplicados ni huecos bajo concurrencia.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=4, help='Cajas simuladas en paralelo')
+        parser.add_argument('--por-hilo', type=int, default=100, help='Reservas por hilo')
+        parser.add_argument(
+            '--rollback',
+            type=float,
+            default=0.1,
+            help='Fracción de transacciones que se revierten (0 a 1)',
+        )
+
+    def handle(self, *args, **options):
+        hilos = options['hilos']
+        por_hilo = options['por_hilo']
+        prob_rollback = options['rollback']
+        serie = f'estres_{int(time.time() * 1000)}'
+
+        confirmados = []
+        errores = []
+        lock = threading.Lock()
+
+        def caja():
+            try:
+                hechas = 0
+                while hechas < por_hilo:
+                    try:
+                        with transaction.atomic():
+                            numero = numeracion.siguiente(serie)
+                            if random.random() < prob_rollback:
+                                raise _Rollback()
+                    except _Rollback:
+                        hechas += 1
+                        continue
+                    except OperationalError:
+                        # SQLite: "database is locked" bajo contención; se reintenta
+                        time.sleep(0.01)
+                        continue
+                    with lock:
+                        confirmados.append(numero)
+                    hechas += 1
+            except Exception as e:  # pragma: no cover - se informa abajo
+                errores.append(e)
+            finally:
+                connection.close()
+
+        inicio = time.perf_counter()
+        threads = [threading.Thread(target=caja) for _ in range(hilos)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        duracion = time.perf_counter() - inicio
+
+        Secuencia.objects.filter(nombre=serie).delete()
+
+        if errores:
+            raise CommandError(f'Errores en los hilos: {errores[0]!r}')
+
+        total = len(confirmados)
+        duplicados = total - len(set(confirmados))
+        esperados = set(range(1, total + 1))
+        huecos = sorted(esperados - set(confirmados))
+
+        self.stdout.write(
+            f'{hilos} hilos, {total} números confirmados en {duracion:.2f}s '
+            f'({total / duracion if duracion else 0:.0f}/s)'
+        )
+        if duplicados or huecos:
+            raise CommandError(
+                f'Numeración inválida: {duplicados} duplicados, {len(huecos)} huecos '
+                f'(primeros: {huecos[:10]})'
+            )
+        self.stdout.write(self.style.SUCCESS('✓ Sin duplicados ni huecos'))
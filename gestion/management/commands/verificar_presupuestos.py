@@ -0,0 +1,89 @@
+"""
+Verifica los presupuestos de consultas y tiempo por vista (PRESUPUESTOS_VISTAS).
+
+Pide cada vista con presupuesto como un usuario staff (una petición de
+calentamiento y luego --repeticiones medidas) y compara el máximo de consultas
+y la mediana del tiempo total con el presupuesto. Termina con error si alguna
+vista lo excede: sirve como prueba en CI o antes de desplegar.
+
+Uso:
+  python manage.py verificar_presupuestos
+  python manage.py verificar_presupuestos --repeticiones=10 --usuario=admin
+  python manage.py verificar_presupuestos --vista=pos --vista=venta_index
+"""
+import statistics
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import NoReverseMatch, reverse
+
+from gestion.instrumentacion import Medicion, excesos
+
+
+class Command(BaseCommand):
+    help = 'Mide las vistas con presupuesto y falla si alguna lo excede.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=5, help='Peticiones medidas por vista')
+        parser.add_argument('--usuario', help='Usuario staff con el que se piden las vistas (por defecto el primero)')
+        parser.add_argument('--vista', action='append', help='Solo estas vistas (se puede repetir)')
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'INSTRUMENTACION_ACTIVA', True):
+            raise CommandError('La instrumentación está desactivada (INSTRUMENTACION_ACTIVA=False).')
+        presupuestos = getattr(settings, 'PRESUPUESTOS_VISTAS', {})
+        vistas = options['vista'] or list(presupuestos)
+        if not vistas:
+            raise CommandError('No hay presupuestos configurados (PRESUPUESTOS_VISTAS).')
+
+        usuarios = User.objects.filter(is_staff=True, is_active=True).order_by('pk')
+        if options['usuario']:
+            usuarios = usuarios.filter(username=options['usuario'])
+        usuario = usuarios.first()
+        if usuario is None:
+            raise CommandError('No hay un usuario staff activo para pedir las vistas.')
+
+        host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+        cliente = Client(HTTP_HOST=host)
+        cliente.force_login(usuario)
+        repeticiones = max(1, options['repeticiones'])
+
+        fallidas = []
+        for vista in vistas:
+            presupuesto = presupuestos.get(vista, {})
+            try:
+                url = presupuesto.get('url') or reverse(vista)
+            except NoReverseMatch:
+                self.stderr.write(self.style.WARNING(f'  {vista}: requiere argumentos, configure "url" en su presupuesto'))
+                continue
+
+            cliente.get(url)  # Calentamiento: cachés del catálogo, conexiones, plantillas
+            mediciones = []
+            for _ in range(repeticiones):
+                response = cliente.get(url)
+                if response.status_code >= 400:
+                    raise CommandError(f'{vista} ({url}) respondió {response.status_code}')
+                mediciones.append(response.instrumentacion)
+
+            resultado = Medicion()
+            resultado.vista = vista
+            resultado.consultas = max(m.consultas for m in mediciones)
+            resultado.total_ms = statistics.median(m.total_ms for m in mediciones)
+            resultado.db_ms = statistics.median(m.db_ms for m in mediciones)
+            resultado.plantillas_ms = statistics.median(m.plantillas_ms for m in mediciones)
+            problemas = excesos(resultado)
+            linea = (
+                f'{vista:<28} {resultado.consultas:>3} consultas  {resultado.total_ms:7.1f} ms '
+                f'(BD {resultado.db_ms:.1f}, plantillas {resultado.plantillas_ms:.1f})'
+            )
+            if problemas:
+                fallidas.append(f'{vista}: {", ".join(problemas)}')
+                self.stdout.write(self.style.ERROR(f'✗ {linea}  excede: {", ".join(problemas)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'✓ {linea}'))
+
+        if fallidas:
+            raise CommandError(f'{len(fallidas)} vista(s) exceden su presupuesto: ' + '; '.join(fallidas))
+        self.stdout.write(self.style.SUCCESS('✓ Todas las vistas dentro de su presupuesto'))
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:04
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def inicializar_numeracion(apps, schema_editor):
+    """Tickets existentes conservan su número (id) y las secuencias parten del máximo actual."""
+    Venta = apps.get_model('gestion', 'Venta')
+    Secuencia = apps.get_model('gestion', 'Secuencia')
+    Venta.objects.filter(tipo_documento='ticket').update(numero_ticket=F('id'))
+    ultimo_ticket = Venta.objects.filter(tipo_documento='ticket').aggregate(m=Max('numero_ticket'))['m'] or 0
+    ultima_factura = Venta.objects.filter(tipo_documento='factura').aggregate(m=Max('numero_factura'))['m'] or 0
+    Secuencia.objects.update_or_create(nombre='ticket', defaults={'valor': ultimo_ticket})
+    Secuencia.objects.update_or_create(nombre='factura', defaults={'valor': ultima_factura})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0007_promocion_descripcion_blank'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Secuencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('valor', models.PositiveBigIntegerField(default=0, help_text='Último número asignado')),
+            ],
+            options={
+                'verbose_name': 'Secuencia',
+                'verbose_name_plural': 'Secuencias',
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='numero_ticket',
+            field=models.PositiveIntegerField(blank=True, help_text='Solo para ventas tipo ticket', null=True, verbose_name='Número de ticket'),
+        ),
+        migrations.RunPython(inicializar_numeracion, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='venta',
+            constraint=models.UniqueConstraint(condition=models.Q(('tipo_documento', 'ticket')), fields=('numero_ticket',), name='unique_numero_ticket_ticket'),
+        ),
+    ]
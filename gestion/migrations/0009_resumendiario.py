@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('gestion', '0008_secuencia_numero_ticket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('num_ventas', models.IntegerField(default=0)),
+                ('num_completadas', models.IntegerField(default=0)),
+                ('num_pendientes', models.IntegerField(default=0)),
+                ('num_canceladas', models.IntegerField(default=0)),
+                ('total_completado', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_pendiente', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('productos_vendidos', models.IntegerField(default=0, help_text='Unidades vendidas en ventas completadas')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='resumenes_diarios', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Resumen diario',
+                'verbose_name_plural': 'Resúmenes diarios',
+                'ordering': ['-fecha'],
+                'unique_together': {('fecha', 'usuario')},
+            },
+        ),
+    ]
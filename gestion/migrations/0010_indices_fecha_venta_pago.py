@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0009_resumendiario'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cierrecaja',
+            index=models.Index(fields=['usuario', 'fecha_cierre'], name='cierre_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['venta', 'validado'], name='pago_venta_validado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['fecha'], name='venta_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['estado', 'fecha'], name='venta_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['usuario', 'estado', 'fecha'], name='venta_usuario_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['tipo_documento', 'numero_factura'], name='venta_tipo_doc_factura_idx'),
+        ),
+    ]
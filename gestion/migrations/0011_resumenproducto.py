@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('gestion', '0010_indices_fecha_venta_pago'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('hora', models.PositiveSmallIntegerField(help_text='Hora local (0-23)')),
+                ('modo_consumo', models.CharField(choices=[('local', 'En el local'), ('llevar', 'Para llevar')], default='local', max_length=10)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('categoria', models.ForeignKey(help_text='Categoría del producto al momento de la venta', on_delete=django.db.models.deletion.CASCADE, related_name='resumenes', to='gestion.categoria')),
+                ('metodo_pago', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='gestion.metodopago')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='resumenes', to='gestion.producto')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='resumenes_producto', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Resumen por producto',
+                'verbose_name_plural': 'Resúmenes por producto',
+                'ordering': ['-fecha', 'hora'],
+                'unique_together': {('fecha', 'hora', 'producto', 'categoria', 'usuario', 'metodo_pago', 'modo_consumo')},
+            },
+        ),
+    ]
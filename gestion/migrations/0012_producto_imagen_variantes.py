@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0011_resumenproducto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='imagen_variantes',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Miniaturas WebP/JPEG de la imagen (ver gestion/imagenes.py)'),
+        ),
+    ]
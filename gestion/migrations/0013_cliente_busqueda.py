@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:18
+
+from django.db import migrations, models
+
+from gestion.busqueda import columnas_busqueda, eliminar_indice_texto, instalar_indice_texto
+
+
+def llenar_columnas_busqueda(apps, schema_editor):
+    Cliente = apps.get_model('gestion', 'Cliente')
+    clientes = list(Cliente.objects.all())
+    for cliente in clientes:
+        for campo, valor in columnas_busqueda(
+            cliente.nombre_completo, cliente.email, cliente.ci_nit, cliente.telefono
+        ).items():
+            setattr(cliente, campo, valor)
+    Cliente.objects.bulk_update(clientes, ['busqueda', 'ci_nit_digitos', 'telefono_digitos'], batch_size=1000)
+
+
+def crear_indice_texto(apps, schema_editor):
+    instalar_indice_texto(schema_editor)
+
+
+def borrar_indice_texto(apps, schema_editor):
+    eliminar_indice_texto(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0012_producto_imagen_variantes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='busqueda',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='ci_nit_digitos',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='telefono_digitos',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.RunPython(llenar_columnas_busqueda, migrations.RunPython.noop),
+        migrations.RunPython(crear_indice_texto, borrar_indice_texto),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0013_cliente_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venta',
+            name='clave_idempotencia',
+            field=models.UUIDField(blank=True, editable=False, help_text='UUID del carrito enviado por el POS; un reintento con la misma clave no duplica la venta', null=True, unique=True, verbose_name='Clave de idempotencia'),
+        ),
+    ]
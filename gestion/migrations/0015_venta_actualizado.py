@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0014_venta_clave_idempotencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venta',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, help_text='Lo usan los backups incrementales (backup_db --incremental)', verbose_name='Última modificación'),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('gestion', '0015_venta_actualizado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenPago',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('num_pagos', models.IntegerField(default=0)),
+                ('monto', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('metodo_pago', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='resumenes', to='gestion.metodopago')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='resumenes_pago', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Resumen de pagos',
+                'verbose_name_plural': 'Resúmenes de pagos',
+                'ordering': ['-fecha'],
+                'unique_together': {('fecha', 'usuario', 'metodo_pago')},
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:46
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0016_resumenpago'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Evento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('venta_registrada', 'Venta registrada'), ('venta_completada', 'Venta completada'), ('venta_cancelada', 'Venta cancelada'), ('venta_reabierta', 'Venta vuelta a pendiente'), ('pago_validado', 'Pago validado')], max_length=30)),
+                ('datos', models.JSONField(blank=True, default=dict)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('hecho', 'Procesado'), ('error', 'Con error')], default='pendiente', max_length=10)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('disponible', models.DateTimeField(default=django.utils.timezone.now, help_text='No se procesa antes de esta hora (reintentos)')),
+                ('procesado', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Evento',
+                'verbose_name_plural': 'Eventos',
+                'ordering': ['-pk'],
+                'indexes': [models.Index(fields=['estado', 'disponible'], name='evento_estado_disponible_idx')],
+            },
+        ),
+    ]
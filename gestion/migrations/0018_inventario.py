@@ -0,0 +1,67 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def saldo_inicial(apps, schema_editor):
+    """El stock actual de cada producto abre el libro de inventario como ajuste."""
+    Producto = apps.get_model('gestion', 'Producto')
+    MovimientoStock = apps.get_model('gestion', 'MovimientoStock')
+    MovimientoStock.objects.bulk_create(
+        [MovimientoStock(producto_id=pk, tipo='ajuste', cantidad=stock, nota='Saldo inicial')
+         for pk, stock in Producto.objects.exclude(stock=0).values_list('pk', 'stock').iterator()],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('gestion', '0017_evento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='fracciones_stock',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Contadores de stock repartidos para productos muy vendidos (0: se descuenta en stock). Ver gestion/inventario.py'),
+        ),
+        migrations.CreateModel(
+            name='MovimientoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('venta', 'Venta'), ('anulacion', 'Anulación de venta'), ('reposicion', 'Reposición'), ('ajuste', 'Ajuste')], max_length=12)),
+                ('cantidad', models.IntegerField(help_text='Positiva: entra stock; negativa: sale')),
+                ('fecha', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('nota', models.CharField(blank=True, default='', max_length=200)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='movimientos_stock', to='gestion.producto')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos_stock', to=settings.AUTH_USER_MODEL)),
+                ('venta', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos_stock', to='gestion.venta')),
+            ],
+            options={
+                'verbose_name': 'Movimiento de stock',
+                'verbose_name_plural': 'Movimientos de stock',
+                'ordering': ['-fecha', '-pk'],
+                'indexes': [models.Index(fields=['producto', 'fecha'], name='movstock_producto_fecha_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='FraccionStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.PositiveSmallIntegerField()),
+                ('cantidad', models.IntegerField(default=0)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fracciones', to='gestion.producto')),
+            ],
+            options={
+                'verbose_name': 'Fracción de stock',
+                'verbose_name_plural': 'Fracciones de stock',
+                'unique_together': {('producto', 'numero')},
+            },
+        ),
+        migrations.RunPython(saldo_inicial, migrations.RunPython.noop),
+    ]
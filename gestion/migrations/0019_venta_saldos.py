@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:57
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def calcular_saldos(apps, schema_editor):
+    """Saldos de las ventas existentes desde sus pagos (un UPDATE; ver ventas.recalcular_saldos)."""
+    Venta = apps.get_model('gestion', 'Venta')
+    Pago = apps.get_model('gestion', 'Pago')
+
+    def suma(**filtro):
+        pagos = Pago.objects.filter(venta=OuterRef('pk'), **filtro).values('venta').annotate(s=Sum('monto')).values('s')
+        return Coalesce(Subquery(pagos[:1], output_field=models.DecimalField(max_digits=10, decimal_places=2)), Decimal('0'))
+
+    Venta.objects.update(monto_pagado=suma(), monto_validado=suma(validado=True))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0018_inventario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venta',
+            name='monto_pagado',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='Suma de los pagos registrados', max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='monto_validado',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='Suma de los pagos validados', max_digits=10),
+        ),
+        migrations.RunPython(calcular_saldos, migrations.RunPython.noop),
+    ]
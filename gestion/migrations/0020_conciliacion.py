@@ -0,0 +1,77 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('gestion', '0019_venta_saldos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExtractoBancario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('archivo', models.CharField(max_length=200)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('lineas', models.PositiveIntegerField(default=0)),
+                ('conciliadas', models.PositiveIntegerField(default=0)),
+                ('por_revisar', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Extracto bancario',
+                'verbose_name_plural': 'Extractos bancarios',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MovimientoBancario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('identificador', models.CharField(help_text='Id de la transacción en el banco (FITID) o huella de la línea: evita importarla dos veces', max_length=100, unique=True)),
+                ('fecha', models.DateField()),
+                ('monto', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('referencia', models.CharField(blank=True, default='', max_length=100)),
+                ('descripcion', models.CharField(blank=True, default='', max_length=200)),
+                ('estado', models.CharField(choices=[('conciliado', 'Conciliado'), ('revisar', 'Por revisar'), ('ignorado', 'Ignorado')], default='revisar', max_length=12)),
+            ],
+            options={
+                'verbose_name': 'Movimiento bancario',
+                'verbose_name_plural': 'Movimientos bancarios',
+                'ordering': ['fecha', 'pk'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['validado', 'fecha_pago', 'monto'], name='pago_validado_fecha_monto_idx'),
+        ),
+        migrations.AddField(
+            model_name='movimientobancario',
+            name='extracto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='gestion.extractobancario'),
+        ),
+        migrations.AddField(
+            model_name='movimientobancario',
+            name='pago',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimiento_bancario', to='gestion.pago'),
+        ),
+        migrations.AddField(
+            model_name='extractobancario',
+            name='metodo_pago',
+            field=models.ForeignKey(blank=True, help_text='Solo se concilian pagos de este método (vacío: todos los que requieren validación)', null=True, on_delete=django.db.models.deletion.PROTECT, to='gestion.metodopago'),
+        ),
+        migrations.AddField(
+            model_name='extractobancario',
+            name='usuario',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='extractos', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='movimientobancario',
+            index=models.Index(fields=['estado', 'fecha'], name='movbanco_estado_fecha_idx'),
+        ),
+    ]
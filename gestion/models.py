@@ -1,5 +1,5 @@
 from django.db import models
-from django.db.models import Q
+from django.db.models import F, Q
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
@@ -45,8 +45,19 @@ class Producto(models.Model):
     )
     
     stock = models.IntegerField(default=0, validators=[MinValueValidator(0)])
+    fracciones_stock = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Contadores de stock repartidos para productos muy vendidos (0: se descuenta en stock). "
+                  "Ver gestion/inventario.py"
+    )
     categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, related_name='productos')
     imagen = models.ImageField(upload_to='productos/', null=True, blank=True)
+    imagen_variantes = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Miniaturas WebP/JPEG de la imagen (ver gestion/imagenes.py)"
+    )
     activo = models.BooleanField(default=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     
@@ -84,6 +95,11 @@ class Cliente(models.Model):
     direccion = models.TextField(blank=True, null=True)
     fecha_registro = models.DateTimeField(auto_now_add=True)
     activo = models.BooleanField(default=True)
+
+    # Columnas normalizadas para la búsqueda indexada (ver gestion/busqueda.py)
+    busqueda = models.CharField(max_length=255, blank=True, default='', editable=False, db_index=True)
+    ci_nit_digitos = models.CharField(max_length=20, blank=True, default='', editable=False, db_index=True)
+    telefono_digitos = models.CharField(max_length=20, blank=True, default='', editable=False, db_index=True)
     
     class Meta:
         ordering = ['nombre_completo']
@@ -91,6 +107,19 @@ class Cliente(models.Model):
     def __str__(self):
         return self.nombre_completo
 
+    def actualizar_busqueda(self):
+        """Recalcula las columnas de búsqueda (también usado antes de bulk_create)"""
+        from .busqueda import columnas_busqueda
+        for campo, valor in columnas_busqueda(self.nombre_completo, self.email, self.ci_nit, self.telefono).items():
+            setattr(self, campo, valor)
+
+    def save(self, *args, **kwargs):
+        self.actualizar_busqueda()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'busqueda', 'ci_nit_digitos', 'telefono_digitos'}
+        super().save(*args, **kwargs)
+
 class MetodoPago(models.Model):
     TIPO_CHOICES = [
         ('efectivo', 'Efectivo'),
@@ -153,6 +182,19 @@ class Promocion(models.Model):
         if self.fecha_inicio and self.fecha_fin and self.fecha_fin <= self.fecha_inicio:
             raise ValidationError({'fecha_fin': 'La fecha fin debe ser posterior a la fecha de inicio.'})
 
+class Secuencia(models.Model):
+    """Contador de numeración consecutiva (facturas, tickets). Ver gestion/numeracion.py."""
+    nombre = models.CharField(max_length=50, unique=True)
+    valor = models.PositiveBigIntegerField(default=0, help_text="Último número asignado")
+
+    class Meta:
+        verbose_name = "Secuencia"
+        verbose_name_plural = "Secuencias"
+        ordering = ['nombre']
+
+    def __str__(self):
+        return f"{self.nombre}: {self.valor}"
+
 class Venta(models.Model):
     ESTADO_CHOICES = [
         ('pendiente', 'Pendiente'),
@@ -169,6 +211,12 @@ class Venta(models.Model):
     ]
     
     fecha = models.DateTimeField(auto_now_add=True)
+    actualizado = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name='Última modificación',
+        help_text='Lo usan los backups incrementales (backup_db --incremental)'
+    )
     tipo_documento = models.CharField(
         max_length=10,
         choices=TIPO_DOCUMENTO_CHOICES,
@@ -181,6 +229,12 @@ class Venta(models.Model):
         verbose_name='Número de factura',
         help_text='Solo para ventas tipo factura'
     )
+    numero_ticket = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Número de ticket',
+        help_text='Solo para ventas tipo ticket'
+    )
     cliente = models.ForeignKey(Cliente, on_delete=models.PROTECT)
     usuario = models.ForeignKey(User, on_delete=models.PROTECT, verbose_name="Vendedor")
     modo_consumo = models.CharField(
@@ -194,22 +248,61 @@ class Venta(models.Model):
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     descuento_total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    # Sumas de los pagos, al día con UPDATE ... F() en cada Pago (ver Pago.save y
+    # manage.py recalcular_saldos): el pago completo es una comparación de columnas
+    monto_pagado = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0, editable=False,
+        help_text="Suma de los pagos registrados"
+    )
+    monto_validado = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0, editable=False,
+        help_text="Suma de los pagos validados"
+    )
     
     estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
     notas = models.TextField(blank=True, null=True)
+    clave_idempotencia = models.UUIDField(
+        null=True,
+        blank=True,
+        unique=True,
+        editable=False,
+        verbose_name='Clave de idempotencia',
+        help_text='UUID del carrito enviado por el POS; un reintento con la misma clave no duplica la venta'
+    )
     
     class Meta:
         ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['fecha'], name='venta_fecha_idx'),
+            models.Index(fields=['estado', 'fecha'], name='venta_estado_fecha_idx'),
+            models.Index(fields=['usuario', 'estado', 'fecha'], name='venta_usuario_estado_fecha_idx'),
+            models.Index(fields=['tipo_documento', 'numero_factura'], name='venta_tipo_doc_factura_idx'),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['numero_factura'],
                 condition=Q(tipo_documento='factura'),
                 name='unique_numero_factura_factura',
             ),
+            models.UniqueConstraint(
+                fields=['numero_ticket'],
+                condition=Q(tipo_documento='ticket'),
+                name='unique_numero_ticket_ticket',
+            ),
         ]
 
     def __str__(self):
         return f"Venta #{self.id} - {self.cliente}"
+
+    def save(self, *args, **kwargs):
+        # Los saldos los suma Pago con F(): un save() completo los pisaría con lo leído antes
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in ('monto_pagado', 'monto_validado')
+            ]
+        super().save(*args, **kwargs)
     
     def calcular_totales(self):
         """Calcula subtotal, descuentos y total de la venta"""
@@ -221,8 +314,17 @@ class Venta(models.Model):
     
     def tiene_pago_completo(self):
         """Verifica si la venta tiene el pago completo"""
-        total_pagado = sum(pago.monto for pago in self.pagos.filter(validado=True))
-        return total_pagado >= self.total
+        return self.monto_validado >= self.total
+
+    def sumar_pagos(self, pagado, validado):
+        """Suma a monto_pagado/monto_validado con F() (y a los valores en memoria)."""
+        if pagado or validado:
+            Venta.objects.filter(pk=self.pk).update(
+                monto_pagado=F('monto_pagado') + pagado,
+                monto_validado=F('monto_validado') + validado,
+            )
+            self.monto_pagado += pagado
+            self.monto_validado += validado
 
 class DetalleVenta(models.Model):
     venta = models.ForeignKey(Venta, on_delete=models.CASCADE, related_name='detalles')
@@ -238,7 +340,8 @@ class DetalleVenta(models.Model):
     descuento_aplicado = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2)
     
-    def save(self, *args, **kwargs):
+    def calcular_importes(self):
+        """Calcula descuento aplicado y subtotal (también usado antes de bulk_create)"""
         # Calcular subtotal base
         subtotal_base = self.cantidad * self.precio_unitario
         
@@ -250,7 +353,9 @@ class DetalleVenta(models.Model):
         
         # Calcular subtotal final
         self.subtotal = subtotal_base - self.descuento_aplicado
-        
+
+    def save(self, *args, **kwargs):
+        self.calcular_importes()
         super().save(*args, **kwargs)
 
 class Pago(models.Model):
@@ -281,22 +386,68 @@ class Pago(models.Model):
     
     class Meta:
         ordering = ['-fecha_pago']
+        indexes = [
+            models.Index(fields=['venta', 'validado'], name='pago_venta_validado_idx'),
+            models.Index(fields=['validado', 'fecha_pago', 'monto'], name='pago_validado_fecha_monto_idx'),
+        ]
     
     def __str__(self):
-        return f"Pago {self.metodo_pago} - Bs. {self.monto} (Venta #{self.venta.id})"
+        return f"Pago {self.metodo_pago} - Bs. {self.monto} (Venta #{self.venta_id})"
+
+    def save(self, *args, **kwargs):
+        """Guarda el pago y suma la diferencia a los saldos de la venta."""
+        from django.db import transaction
+
+        with transaction.atomic(savepoint=False):
+            anterior = None
+            if not self._state.adding:
+                anterior = Pago.objects.filter(pk=self.pk).values('venta_id', 'monto', 'validado').first()
+            super().save(*args, **kwargs)
+            pagado, validado = self.monto, (self.monto if self.validado else 0)
+            if anterior and anterior['venta_id'] != self.venta_id:
+                Venta(pk=anterior['venta_id']).sumar_pagos(
+                    -anterior['monto'], -anterior['monto'] if anterior['validado'] else 0
+                )
+            elif anterior:
+                pagado -= anterior['monto']
+                validado -= anterior['monto'] if anterior['validado'] else 0
+            self._venta().sumar_pagos(pagado, validado)
+
+    def delete(self, *args, **kwargs):
+        from django.db import transaction
+
+        with transaction.atomic(savepoint=False):
+            venta = self._venta()
+            resultado = super().delete(*args, **kwargs)
+            venta.sumar_pagos(-self.monto, -self.monto if self.validado else 0)
+        return resultado
+
+    def _venta(self):
+        """La venta ya cargada, o una instancia solo con su id (para el UPDATE de saldos)."""
+        return self.venta if Pago.venta.is_cached(self) else Venta(pk=self.venta_id)
     
     def validar_pago(self, usuario):
         """Valida el pago"""
+        from . import eventos
+        from .sqlite import escritura
+
         if not self.validado:
-            self.validado = True
-            self.fecha_validacion = timezone.now()
-            self.validado_por = usuario
-            self.save()
-            
-            # Verificar si la venta está completamente pagada
-            if self.venta.tiene_pago_completo() and self.venta.estado == 'pendiente':
-                self.venta.estado = 'completado'
-                self.venta.save()
+            with escritura():
+                self.validado = True
+                self.fecha_validacion = timezone.now()
+                self.validado_por = usuario
+                self.save()  # Suma el monto a Venta.monto_validado
+                venta = self.venta
+                
+                if venta.estado == 'completado':
+                    # La venta ya cuenta en el turno: sumar solo este pago
+                    eventos.pago_validado(self)
+                # Completar la venta si quedó pagada: comparación de columnas en un UPDATE condicional
+                elif Venta.objects.filter(pk=venta.pk, estado='pendiente', monto_validado__gte=F('total')).update(
+                    estado='completado', actualizado=timezone.now()
+                ):
+                    venta.estado = 'completado'
+                    eventos.cambio_estado(venta, 'pendiente')
             
             return True
         return False
@@ -306,10 +457,13 @@ class Pago(models.Model):
         from django.core.exceptions import ValidationError
         
         # Validar que el monto no exceda el total de la venta
-        if self.venta:
-            total_pagado = sum(
-                pago.monto for pago in self.venta.pagos.exclude(id=self.id)
-            )
+        if self.venta_id:
+            total_pagado = self.venta.monto_pagado
+            if self.pk:
+                # Sin el monto guardado de este mismo pago (se está editando)
+                total_pagado -= Pago.objects.filter(pk=self.pk, venta_id=self.venta_id).values_list(
+                    'monto', flat=True
+                ).first() or 0
             if total_pagado + self.monto > self.venta.total:
                 raise ValidationError(
                     f'El monto total de pagos ({total_pagado + self.monto}) '
@@ -317,6 +471,154 @@ class Pago(models.Model):
                 )
 
 
+class MovimientoStock(models.Model):
+    """Libro de inventario: cada entrada o salida de stock, solo se agregan filas (ver gestion/inventario.py)."""
+    TIPO_CHOICES = [
+        ('venta', 'Venta'),
+        ('anulacion', 'Anulación de venta'),
+        ('reposicion', 'Reposición'),
+        ('ajuste', 'Ajuste'),
+    ]
+
+    producto = models.ForeignKey(Producto, on_delete=models.PROTECT, related_name='movimientos_stock')
+    tipo = models.CharField(max_length=12, choices=TIPO_CHOICES)
+    cantidad = models.IntegerField(help_text="Positiva: entra stock; negativa: sale")
+    venta = models.ForeignKey(Venta, on_delete=models.SET_NULL, null=True, blank=True, related_name='movimientos_stock')
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='movimientos_stock')
+    fecha = models.DateTimeField(default=timezone.now, db_index=True)
+    nota = models.CharField(max_length=200, blank=True, default='')
+
+    class Meta:
+        verbose_name = "Movimiento de stock"
+        verbose_name_plural = "Movimientos de stock"
+        ordering = ['-fecha', '-pk']
+        indexes = [
+            models.Index(fields=['producto', 'fecha'], name='movstock_producto_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.cantidad:+d} {self.producto.nombre}"
+
+
+class FraccionStock(models.Model):
+    """
+    Uno de los contadores de un producto con fracciones_stock: acumula los
+    movimientos desde la última compactación. Stock = Producto.stock + suma de
+    sus fracciones.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='fracciones')
+    numero = models.PositiveSmallIntegerField()
+    cantidad = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Fracción de stock"
+        verbose_name_plural = "Fracciones de stock"
+        unique_together = [['producto', 'numero']]
+
+    def __str__(self):
+        return f"{self.producto.nombre} #{self.numero}: {self.cantidad:+d}"
+
+
+class ExtractoBancario(models.Model):
+    """Archivo de extracto del banco (CSV u OFX) importado para conciliar pagos (ver gestion/conciliacion.py)."""
+    archivo = models.CharField(max_length=200)
+    metodo_pago = models.ForeignKey(
+        MetodoPago,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        help_text="Solo se concilian pagos de este método (vacío: todos los que requieren validación)"
+    )
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='extractos')
+    fecha = models.DateTimeField(auto_now_add=True)
+    lineas = models.PositiveIntegerField(default=0)
+    conciliadas = models.PositiveIntegerField(default=0)
+    por_revisar = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Extracto bancario"
+        verbose_name_plural = "Extractos bancarios"
+        ordering = ['-fecha']
+
+    def __str__(self):
+        return f"{self.archivo} ({self.fecha:%d/%m/%Y %H:%M})"
+
+
+class MovimientoBancario(models.Model):
+    """Línea de un extracto: un abono del banco y el pago con que se concilió."""
+    ESTADO_CHOICES = [
+        ('conciliado', 'Conciliado'),
+        ('revisar', 'Por revisar'),
+        ('ignorado', 'Ignorado'),
+    ]
+
+    extracto = models.ForeignKey(ExtractoBancario, on_delete=models.CASCADE, related_name='movimientos')
+    identificador = models.CharField(
+        max_length=100,
+        unique=True,
+        help_text="Id de la transacción en el banco (FITID) o huella de la línea: evita importarla dos veces"
+    )
+    fecha = models.DateField()
+    monto = models.DecimalField(max_digits=10, decimal_places=2)
+    referencia = models.CharField(max_length=100, blank=True, default='')
+    descripcion = models.CharField(max_length=200, blank=True, default='')
+    estado = models.CharField(max_length=12, choices=ESTADO_CHOICES, default='revisar')
+    pago = models.OneToOneField(
+        Pago,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='movimiento_bancario'
+    )
+
+    class Meta:
+        verbose_name = "Movimiento bancario"
+        verbose_name_plural = "Movimientos bancarios"
+        ordering = ['fecha', 'pk']
+        indexes = [
+            models.Index(fields=['estado', 'fecha'], name='movbanco_estado_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha:%d/%m/%Y} Bs. {self.monto} {self.referencia}".rstrip()
+
+
+class Evento(models.Model):
+    """Evento posterior a una venta en cola para los workers (ver gestion/eventos.py)."""
+    TIPO_CHOICES = [
+        ('venta_registrada', 'Venta registrada'),
+        ('venta_completada', 'Venta completada'),
+        ('venta_cancelada', 'Venta cancelada'),
+        ('venta_reabierta', 'Venta vuelta a pendiente'),
+        ('pago_validado', 'Pago validado'),
+    ]
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('hecho', 'Procesado'),
+        ('error', 'Con error'),
+    ]
+
+    tipo = models.CharField(max_length=30, choices=TIPO_CHOICES)
+    datos = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default='pendiente')
+    intentos = models.PositiveSmallIntegerField(default=0)
+    creado = models.DateTimeField(auto_now_add=True)
+    disponible = models.DateTimeField(default=timezone.now, help_text="No se procesa antes de esta hora (reintentos)")
+    procesado = models.DateTimeField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "Evento"
+        verbose_name_plural = "Eventos"
+        ordering = ['-pk']
+        indexes = [
+            models.Index(fields=['estado', 'disponible'], name='evento_estado_disponible_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} #{self.pk} ({self.get_estado_display()})"
+
+
 class CierreCaja(models.Model):
     """Registro de cierre de caja al final del turno."""
     usuario = models.ForeignKey(User, on_delete=models.PROTECT, related_name='cierres_caja')
@@ -347,6 +649,9 @@ class CierreCaja(models.Model):
         verbose_name = "Cierre de Caja"
         verbose_name_plural = "Cierres de Caja"
         ordering = ['-fecha_cierre']
+        indexes = [
+            models.Index(fields=['usuario', 'fecha_cierre'], name='cierre_usuario_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"Cierre {self.usuario.username} - {self.fecha_cierre.strftime('%d/%m/%Y %H:%M')}"
@@ -367,3 +672,72 @@ class CierreCajaDetallePago(models.Model):
         verbose_name = "Detalle de pago (cierre)"
         verbose_name_plural = "Detalles de pago (cierre)"
         unique_together = [['cierre', 'metodo_pago']]
+
+
+class ResumenDiario(models.Model):
+    """Totales de ventas por día (hora local) y vendedor; se actualiza en cada venta. Ver gestion/resumenes.py."""
+    fecha = models.DateField()
+    usuario = models.ForeignKey(User, on_delete=models.PROTECT, related_name='resumenes_diarios')
+    num_ventas = models.IntegerField(default=0)
+    num_completadas = models.IntegerField(default=0)
+    num_pendientes = models.IntegerField(default=0)
+    num_canceladas = models.IntegerField(default=0)
+    total_completado = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_pendiente = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    productos_vendidos = models.IntegerField(default=0, help_text="Unidades vendidas en ventas completadas")
+
+    class Meta:
+        verbose_name = "Resumen diario"
+        verbose_name_plural = "Resúmenes diarios"
+        ordering = ['-fecha']
+        unique_together = [['fecha', 'usuario']]
+
+    def __str__(self):
+        return f"{self.fecha.strftime('%d/%m/%Y')} - {self.usuario.username}"
+
+
+class ResumenPago(models.Model):
+    """
+    Pagos validados de ventas completadas por día (hora local), vendedor y método de pago.
+    Es el libro del turno que leen el cierre de caja y el reporte X. Ver gestion/resumenes.py.
+    """
+    fecha = models.DateField()
+    usuario = models.ForeignKey(User, on_delete=models.PROTECT, related_name='resumenes_pago')
+    metodo_pago = models.ForeignKey(MetodoPago, on_delete=models.PROTECT, related_name='resumenes')
+    num_pagos = models.IntegerField(default=0)
+    monto = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Resumen de pagos"
+        verbose_name_plural = "Resúmenes de pagos"
+        ordering = ['-fecha']
+        unique_together = [['fecha', 'usuario', 'metodo_pago']]
+
+    def __str__(self):
+        return f"{self.fecha.strftime('%d/%m/%Y')} - {self.usuario.username} - {self.metodo_pago.nombre}"
+
+
+class ResumenProducto(models.Model):
+    """
+    Unidades e importe vendidos (ventas completadas) por día, hora local, producto,
+    vendedor, método de pago y modo de consumo. Alimenta Reportes. Ver gestion/resumenes.py.
+    """
+    fecha = models.DateField()
+    hora = models.PositiveSmallIntegerField(help_text="Hora local (0-23)")
+    producto = models.ForeignKey(Producto, on_delete=models.PROTECT, related_name='resumenes')
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, related_name='resumenes',
+                                  help_text="Categoría del producto al momento de la venta")
+    usuario = models.ForeignKey(User, on_delete=models.PROTECT, related_name='resumenes_producto')
+    metodo_pago = models.ForeignKey(MetodoPago, on_delete=models.PROTECT, null=True, blank=True)
+    modo_consumo = models.CharField(max_length=10, choices=Venta.MODO_CONSUMO_CHOICES, default='local')
+    cantidad = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Resumen por producto"
+        verbose_name_plural = "Resúmenes por producto"
+        ordering = ['-fecha', 'hora']
+        unique_together = [['fecha', 'hora', 'producto', 'categoria', 'usuario', 'metodo_pago', 'modo_consumo']]
+
+    def __str__(self):
+        return f"{self.fecha.strftime('%d/%m/%Y')} {self.hora:02d}h - {self.producto.nombre}"
@@ -0,0 +1,55 @@
+"""
+Numeración consecutiva de facturas y tickets.
+
+Cada serie vive en una fila de Secuencia que se incrementa con un UPDATE
+atómico (F('valor') + n). El UPDATE toma el bloqueo de la fila hasta que la
+transacción que lo llamó termina, así que:
+
+- dos cajas nunca obtienen el mismo número, y
+- si la venta hace rollback, el número vuelve a quedar libre (sin huecos).
+
+El costo es O(1): no depende del historial de ventas (antes se usaba MAX()).
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import Secuencia
+
+SECUENCIA_FACTURA = 'factura'
+SECUENCIA_TICKET = 'ticket'
+SECUENCIA_CATALOGO = 'catalogo'  # Versión del catálogo del POS (ver catalogo.py)
+
+
+def reservar(nombre, cantidad=1):
+    """
+    Reserva `cantidad` números consecutivos de la serie y retorna un range.
+
+    Para numeración sin huecos debe llamarse dentro de la transacción del
+    documento que usa el número. Una caja puede reservar un bloque de tickets
+    por adelantado (cantidad > 1); los números del bloque que no use quedan
+    como huecos, por eso las facturas se reservan de a uno.
+    """
+    if cantidad < 1:
+        raise ValueError('La cantidad a reservar debe ser al menos 1')
+    with transaction.atomic():
+        filas = Secuencia.objects.filter(nombre=nombre).update(valor=F('valor') + cantidad)
+        if not filas:
+            try:
+                with transaction.atomic():
+                    Secuencia.objects.create(nombre=nombre, valor=0)
+            except IntegrityError:
+                pass  # Otra caja la creó al mismo tiempo
+            Secuencia.objects.filter(nombre=nombre).update(valor=F('valor') + cantidad)
+        fin = Secuencia.objects.values_list('valor', flat=True).get(nombre=nombre)
+    return range(fin - cantidad + 1, fin + 1)
+
+
+def siguiente(nombre):
+    """Reserva y retorna el siguiente número de la serie."""
+    return reservar(nombre, 1)[0]
+
+
+def valor_actual(nombre):
+    """Último número asignado de la serie (lectura sin bloqueo, para mostrar)."""
+    return Secuencia.objects.filter(nombre=nombre).values_list('valor', flat=True).first() or 0
+
@@ -0,0 +1,86 @@
+"""
+Paginación por cursor (keyset) sobre (fecha, id).
+
+En lugar de OFFSET, cada página continúa desde la última fila vista con
+`fecha < f OR (fecha = f AND id < i)`, que usa el índice de fecha. La página N
+cuesta lo mismo que la primera, sin importar cuántos años de ventas haya.
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+def codificar_cursor(obj, campo='fecha'):
+    """Token opaco (base64 url-safe) con la posición de `obj` en el orden (campo, id)."""
+    valor = f'{getattr(obj, campo).isoformat()}|{obj.pk}'
+    return base64.urlsafe_b64encode(valor.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(token):
+    """(datetime, id) del token, o None si el token no es válido."""
+    if not token:
+        return None
+    try:
+        relleno = '=' * (-len(token) % 4)
+        fecha_iso, pk = base64.urlsafe_b64decode(token + relleno).decode().split('|')
+        return datetime.fromisoformat(fecha_iso), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def paginar(queryset, despues=None, antes=None, tamano=50, campo='fecha'):
+    """
+    Página de `queryset` en orden descendente por (campo, id).
+
+    `despues`: token de la página siguiente (filas más antiguas).
+    `antes`: token de la página anterior (filas más recientes).
+    Retorna (filas, token_siguiente, token_anterior); los tokens son None
+    cuando no hay más filas en esa dirección.
+    """
+    cursor_despues = decodificar_cursor(despues)
+    cursor_antes = decodificar_cursor(antes) if cursor_despues is None else None
+
+    if cursor_antes:
+        valor, pk = cursor_antes
+        qs = queryset.filter(
+            Q(**{f'{campo}__gt': valor}) | Q(**{campo: valor, 'pk__gt': pk})
+        ).order_by(campo, 'pk')
+        filas = list(qs[:tamano + 1])
+        hay_mas_recientes = len(filas) > tamano
+        filas = list(reversed(filas[:tamano]))
+        hay_mas_antiguas = True
+    else:
+        qs = queryset
+        if cursor_despues:
+            valor, pk = cursor_despues
+            qs = qs.filter(Q(**{f'{campo}__lt': valor}) | Q(**{campo: valor, 'pk__lt': pk}))
+        filas = list(qs.order_by(f'-{campo}', '-pk')[:tamano + 1])
+        hay_mas_antiguas = len(filas) > tamano
+        filas = filas[:tamano]
+        hay_mas_recientes = cursor_despues is not None
+
+    siguiente = codificar_cursor(filas[-1], campo) if filas and hay_mas_antiguas else None
+    anterior = codificar_cursor(filas[0], campo) if filas and hay_mas_recientes else None
+    return filas, siguiente, anterior
+
+
+def recorrer_por_lotes(queryset, campos, tamano=2000):
+    """
+    Itera `queryset.values_list(*campos)` en lotes ordenados por pk (keyset).
+
+    Cada lote es una consulta `pk > último` con LIMIT, así la memoria queda
+    acotada a `tamano` filas aunque el driver (p. ej. PyMySQL) no use
+    cursores del lado del servidor.
+    """
+    ultimo = None
+    while True:
+        qs = queryset.order_by('pk')
+        if ultimo is not None:
+            qs = qs.filter(pk__gt=ultimo)
+        lote = list(qs.values_list('pk', *campos)[:tamano])
+        for fila in lote:
+            yield fila[1:]
+        if len(lote) < tamano:
+            return
+        ultimo = lote[-1][0]
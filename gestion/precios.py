@@ -0,0 +1,91 @@
+"""
+Motor de precios con promociones.
+
+Carga de una sola vez todas las promociones vigentes y sus productos (dos
+consultas, sin importar el tamaño del catálogo) y calcula en memoria el mejor
+descuento por producto. Lo usan el POS, el procesamiento de pagos y el admin.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.utils import timezone
+
+from .models import Promocion
+
+
+def promociones_vigentes(ahora=None):
+    """QuerySet de promociones activas cuya vigencia incluye `ahora`."""
+    ahora = ahora or timezone.now()
+    return Promocion.objects.filter(
+        activo=True,
+        fecha_inicio__lte=ahora,
+        fecha_fin__gte=ahora,
+    )
+
+
+class MapaDescuentos:
+    """
+    Mejor descuento (%) vigente por producto.
+
+    Las promociones sin productos asociados aplican a todo el catálogo
+    (como indica el formulario de promociones).
+    """
+
+    def __init__(self, por_producto=None, general=Decimal('0')):
+        self.por_producto = por_producto or {}
+        self.general = general
+
+    def descuento(self, producto_id):
+        """Porcentaje de descuento de promoción para el producto (0 si no tiene)."""
+        return max(self.por_producto.get(producto_id, Decimal('0')), self.general)
+
+    def precio(self, producto):
+        """Precio final del producto con la mejor promoción vigente aplicada."""
+        precio_base = producto.precio_final()
+        desc = self.descuento(producto.pk)
+        if desc > 0:
+            precio_promo = precio_base * (1 - desc / Decimal('100'))
+            return precio_promo.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        return precio_base
+
+
+def mapa_descuentos(ahora=None):
+    """Construye el MapaDescuentos con dos consultas (promociones + relación M2M)."""
+    promos = list(promociones_vigentes(ahora).values_list('pk', 'descuento_porcentaje'))
+    if not promos:
+        return MapaDescuentos()
+    descuento_promo = dict(promos)
+    enlaces = Promocion.productos.through.objects.filter(
+        promocion_id__in=descuento_promo.keys()
+    ).values_list('promocion_id', 'producto_id')
+
+    por_producto = {}
+    con_productos = set()
+    for promo_id, producto_id in enlaces:
+        con_productos.add(promo_id)
+        desc = descuento_promo[promo_id]
+        if desc > por_producto.get(producto_id, Decimal('0')):
+            por_producto[producto_id] = desc
+    general = max(
+        (desc for pk, desc in promos if pk not in con_productos),
+        default=Decimal('0'),
+    )
+    return MapaDescuentos(por_producto, general)
+
+
+def precios_catalogo(productos, mapa=None):
+    """
+    Lista de dicts {'producto', 'precio_display', 'tiene_promo'} para un catálogo.
+
+    Usa un único MapaDescuentos para todo el catálogo.
+    """
+    if mapa is None:
+        mapa = mapa_descuentos()
+    resultado = []
+    for p in productos:
+        precio = mapa.precio(p)
+        resultado.append({
+            'producto': p,
+            'precio_display': precio,
+            'tiene_promo': precio < p.precio_final(),
+        })
+    return resultado
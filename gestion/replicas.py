@@ -0,0 +1,113 @@
+"""
+Lecturas en una réplica de la base de datos (alias 'replica').
+
+Las vistas de consulta pesada (dashboard, lista de ventas, cierre de caja,
+Reportes; ver REPLICA_VISTAS en settings) leen de la réplica para no competir
+con el checkout por bloqueos ni por el buffer pool de MySQL en 'default'.
+Todo lo demás, y todas las escrituras, van a 'default'.
+
+- ReplicaMiddleware marca la petición: solo GET/HEAD a una vista de
+  REPLICA_VISTAS lee de la réplica.
+- RouterReplica (DATABASE_ROUTERS) envía las lecturas de una petición marcada
+  a la réplica, salvo dentro de transaction.atomic o después de que la misma
+  petición escribió algo: desde ahí lee de 'default'.
+- Leer lo propio: cuando una petición escribe (o es un POST), el navegador
+  recibe una cookie que dura REPLICA_PEGAJOSA_SEGUNDOS; mientras exista, ese
+  usuario lee de 'default' aunque la réplica vaya unos segundos atrasada.
+- Los comandos de solo lectura (exportar_ventas) usan `with lectura():`.
+
+Sin el alias 'replica' en DATABASES todo sigue en 'default'.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+ALIAS = 'replica'
+COOKIE = 'escritura_reciente'
+METODOS_LECTURA = ('GET', 'HEAD')
+
+_estado_actual = ContextVar('gestion_replica', default=None)
+
+
+class _Estado:
+    """Ruteo de la petición o comando en curso."""
+
+    __slots__ = ('replica', 'escribio')
+
+    def __init__(self, replica=False):
+        self.replica = replica
+        self.escribio = False
+
+
+def configurada():
+    return ALIAS in settings.DATABASES
+
+
+@contextmanager
+def lectura():
+    """Las lecturas dentro del bloque van a la réplica (si está configurada)."""
+    token = _estado_actual.set(_Estado(replica=configurada()))
+    try:
+        yield
+    finally:
+        _estado_actual.reset(token)
+
+
+class RouterReplica:
+    """Lecturas marcadas a la réplica; escrituras y migraciones siempre a 'default'."""
+
+    def db_for_read(self, model, **hints):
+        estado = _estado_actual.get()
+        if (estado is not None and estado.replica and not estado.escribio
+                and not connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        estado = _estado_actual.get()
+        if estado is not None:
+            estado.escribio = True  # Leer lo propio: el resto de la petición lee de 'default'
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, ALIAS}:
+            return True  # La réplica es una copia de 'default'
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == ALIAS:
+            return False  # Recibe el esquema por replicación
+        return None
+
+
+class ReplicaMiddleware:
+    """Marca las peticiones que leen de la réplica y la cookie de escritura reciente."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        estado = _Estado()
+        token = _estado_actual.set(estado)
+        try:
+            response = self.get_response(request)
+        finally:
+            _estado_actual.reset(token)
+        if estado.escribio or request.method not in METODOS_LECTURA:
+            response.set_cookie(
+                COOKIE, '1',
+                max_age=getattr(settings, 'REPLICA_PEGAJOSA_SEGUNDOS', 5),
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        estado = _estado_actual.get()
+        if (estado is not None and configurada() and request.method in METODOS_LECTURA
+                and COOKIE not in request.COOKIES
+                and request.resolver_match.url_name in getattr(settings, 'REPLICA_VISTAS', ())):
+            estado.replica = True
+        return None
@@ -0,0 +1,443 @@
+"""
+Backups de la base de datos: compresión, manifiestos, puntos de control y rotación.
+
+Cada backup es un archivo de la carpeta de backups con un manifiesto JSON al
+lado (mismo nombre + .json):
+
+    db_20250131_230000.sql.gz              completo (mysqldump) o .sqlite3.gz (SQLite)
+    db_20250131_230000.sql.gz.json
+    ventas_20250201_130000.jsonl.gz        incremental: ventas cambiadas desde el punto anterior
+    ventas_20250201_130000.jsonl.gz.json
+
+El manifiesto guarda el tipo, el motor, el SHA-256 y el tamaño del archivo tal
+como quedó en disco y el punto de control `hasta` (los cambios hasta ese
+momento están en el backup). Un incremental guarda además el backup completo
+`base` sobre el que se aplica y el punto `desde` del que parte. restore_db
+verifica el SHA-256 antes de tocar la base de datos.
+
+Los archivos se escriben como .parcial y se renombran al terminar: un backup
+interrumpido nunca parece válido.
+"""
+import gzip
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core import serializers
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import numeracion
+from .sqlite import instantanea
+from .models import Cliente, DetalleVenta, FraccionStock, MovimientoStock, Pago, Producto, Secuencia, Venta
+
+COMPRESIONES = {'gzip': '.gz', 'zstd': '.zst', 'ninguna': ''}
+TAMANO_BLOQUE = 1024 * 1024
+MAX_REINICIOS_SQLITE = 3  # Luego se copia en un solo paso para no reiniciarse indefinidamente
+
+
+class RespaldoError(Exception):
+    pass
+
+
+class _CopiaReiniciada(Exception):
+    pass
+
+
+def carpeta(ruta=None):
+    """Carpeta de backups (por defecto backups/ en el proyecto), creada si no existe."""
+    ruta = Path(ruta) if ruta else Path(settings.BASE_DIR) / 'backups'
+    ruta.mkdir(parents=True, exist_ok=True)
+    return ruta
+
+
+def motor(db_settings):
+    """'sqlite' o 'mysql' según el ENGINE de la base de datos."""
+    engine = db_settings.get('ENGINE', '')
+    if 'sqlite' in engine:
+        return 'sqlite'
+    if 'mysql' in engine:
+        return 'mysql'
+    raise RespaldoError(f'Backup no implementado para: {engine}')
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise RespaldoError('Para comprimir con zstd instale el paquete zstandard (pip install zstandard).')
+    return zstandard
+
+
+class Escritura:
+    """
+    Escribe un archivo comprimido calculando su SHA-256 al vuelo (sin volver a leerlo).
+
+        with Escritura(ruta, 'gzip') as salida:
+            salida.write(datos)
+        escritura.sha256, escritura.tamano
+    """
+
+    def __init__(self, ruta, compresion):
+        if compresion not in COMPRESIONES:
+            raise RespaldoError(f'Compresión desconocida: {compresion}')
+        self.ruta = Path(ruta)
+        self.compresion = compresion
+        self.sha256 = None
+        self.tamano = 0
+
+    def __enter__(self):
+        self._parcial = self.ruta.with_name(self.ruta.name + '.parcial')
+        self._archivo = open(self._parcial, 'wb')
+        self._hash = hashlib.sha256()
+        if self.compresion == 'gzip':
+            self._flujo = gzip.GzipFile(filename='', mode='wb', fileobj=self, compresslevel=6)
+        elif self.compresion == 'zstd':
+            self._flujo = _zstandard().ZstdCompressor(level=3, threads=-1).stream_writer(self, closefd=False)
+        else:
+            self._flujo = self
+        return self._flujo
+
+    def write(self, datos):
+        # Destino del compresor: lo que llega aquí es lo que queda en disco
+        self._hash.update(datos)
+        self.tamano += len(datos)
+        return self._archivo.write(datos)
+
+    def flush(self):
+        self._archivo.flush()
+
+    def __exit__(self, tipo, valor, traza):
+        try:
+            if self._flujo is not self:
+                self._flujo.close()
+            self._archivo.close()
+        except Exception:
+            self._parcial.unlink(missing_ok=True)
+            raise
+        if tipo is not None:
+            self._parcial.unlink(missing_ok=True)
+            return False
+        os.replace(self._parcial, self.ruta)
+        self.sha256 = self._hash.hexdigest()
+        return False
+
+
+@contextmanager
+def lectura(ruta):
+    """Abre un backup para leer su contenido descomprimido (según la extensión)."""
+    ruta = Path(ruta)
+    if ruta.suffix == '.gz':
+        flujo = gzip.open(ruta, 'rb')
+    elif ruta.suffix == '.zst':
+        flujo = _zstandard().ZstdDecompressor().stream_reader(open(ruta, 'rb'), closefd=True)
+    else:
+        flujo = open(ruta, 'rb')
+    try:
+        yield flujo
+    finally:
+        flujo.close()
+
+
+def sha256(ruta):
+    resumen = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(TAMANO_BLOQUE), b''):
+            resumen.update(bloque)
+    return resumen.hexdigest()
+
+
+def nombre(prefijo, extension, compresion, momento=None):
+    momento = timezone.localtime(momento)
+    return f'{prefijo}_{momento:%Y%m%d_%H%M%S}{extension}{COMPRESIONES[compresion]}'
+
+
+def guardar_manifiesto(ruta, **datos):
+    ruta = Path(ruta)
+    datos = {'archivo': ruta.name, **datos}
+    with open(ruta.with_name(ruta.name + '.json'), 'w', encoding='utf-8') as archivo:
+        json.dump(datos, archivo, indent=2, ensure_ascii=False, default=str)
+    return datos
+
+
+def manifiestos(ruta_carpeta):
+    """Manifiestos de la carpeta ordenados por punto de control; cada uno con 'ruta' (Path del backup)."""
+    encontrados = []
+    for ruta in Path(ruta_carpeta).glob('*.json'):
+        try:
+            with open(ruta, encoding='utf-8') as archivo:
+                datos = json.load(archivo)
+        except (OSError, ValueError):
+            continue
+        if isinstance(datos, dict) and datos.get('archivo') and datos.get('tipo') in ('completo', 'incremental'):
+            datos['ruta'] = ruta.with_name(datos['archivo'])
+            datos['hasta'] = parse_datetime(datos['hasta'])
+            encontrados.append(datos)
+    return sorted(encontrados, key=lambda m: (m['hasta'], m['archivo']))
+
+
+def buscar(ruta_carpeta, archivo):
+    """Manifiesto del backup `archivo` (nombre o ruta)."""
+    nombre_archivo = Path(archivo).name
+    if Path(archivo).parent != Path('.'):
+        ruta_carpeta = Path(archivo).parent
+    for manifiesto in manifiestos(ruta_carpeta):
+        if manifiesto['archivo'] == nombre_archivo:
+            return manifiesto
+    raise RespaldoError(f'No se encontró el manifiesto de {archivo} ({nombre_archivo}.json)')
+
+
+def cadena(todos, completo, hasta=None):
+    """Backup completo seguido de sus incrementales en orden (hasta el incremental `hasta`, inclusive)."""
+    resultado = [completo]
+    for manifiesto in todos:
+        if manifiesto['tipo'] == 'incremental' and manifiesto.get('base') == completo['archivo']:
+            resultado.append(manifiesto)
+            if manifiesto['archivo'] == hasta:
+                return resultado
+    if hasta and hasta != completo['archivo']:
+        raise RespaldoError(f'{hasta} no es un incremental de {completo["archivo"]}')
+    return resultado
+
+
+def punto_control(ruta_carpeta, motor_actual):
+    """
+    (manifiesto del último backup completo, `desde` del próximo incremental).
+
+    `desde` es el último `hasta` de la cadena menos RESPALDOS_MARGEN_SEGUNDOS:
+    actualizado, fecha_pago y la fecha de los movimientos se fijan antes del
+    commit, así que una venta fechada justo antes de `hasta` puede confirmarse
+    después de que el backup leyó la base. El incremental siguiente la vuelve a
+    leer; repetir filas no importa porque importar_ventas actualiza por id.
+    """
+    todos = manifiestos(ruta_carpeta)
+    completos = [m for m in todos if m['tipo'] == 'completo' and m.get('motor') == motor_actual]
+    if not completos:
+        raise RespaldoError('No hay un backup completo en la carpeta: ejecute primero backup_db sin --incremental.')
+    base = completos[-1]
+    margen = timedelta(seconds=getattr(settings, 'RESPALDOS_MARGEN_SEGUNDOS', 600))
+    return base, cadena(todos, base)[-1]['hasta'] - margen
+
+
+def verificar(manifiesto):
+    """Comprueba que el archivo exista y que su SHA-256 coincida con el manifiesto."""
+    ruta = manifiesto['ruta']
+    if not ruta.exists():
+        raise RespaldoError(f'Falta el archivo {ruta}')
+    if ruta.stat().st_size != manifiesto.get('tamano') or sha256(ruta) != manifiesto.get('sha256'):
+        raise RespaldoError(f'{ruta.name} está dañado: el checksum no coincide con su manifiesto')
+
+
+def rotar(ruta_carpeta, conservar):
+    """
+    Conserva los `conservar` backups completos más recientes y borra los
+    anteriores junto con sus incrementales. Retorna los nombres borrados.
+    """
+    if conservar < 1:
+        return []
+    todos = manifiestos(ruta_carpeta)
+    completos = [m for m in todos if m['tipo'] == 'completo']
+    vigentes = {m['archivo'] for m in completos[-conservar:]}
+    borrados = []
+    for manifiesto in todos:
+        clave = manifiesto['archivo'] if manifiesto['tipo'] == 'completo' else manifiesto.get('base')
+        if clave in vigentes:
+            continue
+        manifiesto['ruta'].unlink(missing_ok=True)
+        manifiesto['ruta'].with_name(manifiesto['archivo'] + '.json').unlink(missing_ok=True)
+        borrados.append(manifiesto['archivo'])
+    return borrados
+
+
+@contextmanager
+def credenciales_mysql(db_settings):
+    """
+    Opciones de conexión para mysqldump/mysql. La contraseña va en un archivo
+    temporal (--defaults-extra-file, que debe ser la primera opción), no en la línea de comandos.
+    """
+    opciones = []
+    config_file = None
+    password = db_settings.get('PASSWORD', '')
+    if password:
+        fd, config_file = tempfile.mkstemp(suffix='.cnf', prefix='mysql_')
+        with os.fdopen(fd, 'w') as f:
+            f.write(f'[client]\npassword={password}\n')
+        opciones.append('--defaults-extra-file=' + config_file)
+    opciones += [
+        '-h', str(db_settings.get('HOST') or 'localhost'),
+        '-P', str(db_settings.get('PORT') or '3306'),
+        '-u', str(db_settings.get('USER')),
+    ]
+    try:
+        yield opciones
+    finally:
+        if config_file and os.path.exists(config_file):
+            try:
+                os.unlink(config_file)
+            except OSError:
+                pass
+
+
+def copiar_sqlite(origen, destino, paginas, pausa):
+    """
+    Copia consistente de una base SQLite en uso con la API de backup en línea.
+
+    Copia `paginas` páginas por paso y espera `pausa` segundos entre pasos para
+    que las cajas puedan escribir. Si otra conexión escribe durante la copia,
+    SQLite la reinicia; tras MAX_REINICIOS_SQLITE reinicios la copia se hace en
+    un solo paso para que termine. Retorna la cantidad de reinicios.
+    """
+    reinicios = 0
+    anterior = None
+
+    def progreso(estado, restantes, total):
+        nonlocal anterior, reinicios
+        if anterior is not None and restantes > anterior:
+            reinicios += 1
+            if reinicios >= MAX_REINICIOS_SQLITE:
+                raise _CopiaReiniciada
+        anterior = restantes
+        if pausa:
+            time.sleep(pausa)
+
+    fuente = sqlite3.connect(origen, timeout=30)
+    copia = sqlite3.connect(destino)
+    try:
+        try:
+            fuente.backup(copia, pages=paginas, progress=progreso)
+        except _CopiaReiniciada:
+            fuente.backup(copia, pages=-1)
+    finally:
+        copia.close()
+        fuente.close()
+    return reinicios
+
+
+def revisar_sqlite(ruta):
+    """Lanza RespaldoError si `ruta` no es una base SQLite íntegra."""
+    conexion = sqlite3.connect(ruta)
+    try:
+        resultado = conexion.execute('PRAGMA integrity_check').fetchone()[0]
+    except sqlite3.DatabaseError as e:
+        raise RespaldoError(f'El backup no es una base SQLite válida: {e}')
+    finally:
+        conexion.close()
+    if resultado != 'ok':
+        raise RespaldoError(f'El backup SQLite no pasó integrity_check: {resultado}')
+
+
+def ventas_cambiadas(desde):
+    """Ventas creadas o modificadas después de `desde`, incluidas las que recibieron o validaron pagos."""
+    pagos = Pago.objects.filter(Q(fecha_pago__gt=desde) | Q(fecha_validacion__gt=desde)).values('venta_id')
+    return Venta.objects.filter(Q(actualizado__gt=desde) | Q(pk__in=pagos))
+
+
+def _bloques(ids, tamano):
+    """`ids` ordenados, en listas de a `tamano` (límite de parámetros por consulta)."""
+    ids = sorted(ids)
+    for i in range(0, len(ids), tamano):
+        yield ids[i:i + tamano]
+
+
+def exportar_ventas(salida, desde, lote=2000):
+    """
+    Escribe en `salida` (binario) las filas de las ventas cambiadas desde `desde`
+    en JSON Lines: clientes y productos que usan (stock y fracciones al momento
+    del backup), ventas, detalles, pagos y los movimientos de stock desde `desde`.
+    Retorna {modelo: filas}.
+
+    Todo se lee en una sola transacción (instantanea) y los ids de las ventas se
+    calculan una vez: una venta que se confirma durante la exportación no deja
+    detalles o pagos en el archivo sin su venta (restore_db fallaría por la
+    clave foránea).
+    """
+    filas = {}
+    texto = io.TextIOWrapper(salida, encoding='utf-8', newline='\n')
+    try:
+        with instantanea():
+            movimientos = MovimientoStock.objects.filter(fecha__gt=desde)
+            ventas = set(ventas_cambiadas(desde).values_list('pk', flat=True))
+            ventas.update(movimientos.exclude(venta=None).values_list('venta_id', flat=True))
+            clientes, productos = set(), set(movimientos.values_list('producto_id', flat=True))
+            for bloque in _bloques(ventas, lote):
+                clientes.update(Venta.objects.filter(pk__in=bloque).values_list('cliente_id', flat=True))
+                productos.update(DetalleVenta.objects.filter(venta_id__in=bloque).values_list('producto_id', flat=True))
+            conjuntos = [
+                (Cliente, 'pk', clientes),
+                (Producto, 'pk', productos),
+                (FraccionStock, 'producto_id', productos),
+                (Venta, 'pk', ventas),
+                (DetalleVenta, 'venta_id', ventas),
+                (Pago, 'venta_id', ventas),
+                (MovimientoStock, None, None),
+            ]
+            for modelo, campo, ids in conjuntos:
+                etiqueta = modelo._meta.label_lower
+                filas[etiqueta] = 0
+                if campo is None:
+                    querysets = [movimientos.order_by('pk')]
+                else:
+                    querysets = (
+                        modelo.objects.filter(**{f'{campo}__in': bloque}).order_by('pk')
+                        for bloque in _bloques(ids, lote)
+                    )
+
+                def objetos(querysets=querysets, etiqueta=etiqueta):
+                    for queryset in querysets:
+                        for objeto in queryset.iterator(chunk_size=lote):
+                            filas[etiqueta] += 1
+                            yield objeto
+
+                serializers.serialize('jsonl', objetos(), stream=texto)
+        texto.flush()
+    finally:
+        texto.detach()  # Quien abrió `salida` la cierra
+    return filas
+
+
+def importar_ventas(entrada):
+    """
+    Aplica un backup incremental (upsert por id, en una transacción) y pone al
+    día las series de facturas y tickets y los saldos de las ventas restauradas.
+    Retorna (filas, primera fecha, última fecha).
+    """
+    from .ventas import recalcular_saldos
+
+    filas = 0
+    fechas = []
+    ventas = []
+    texto = io.TextIOWrapper(entrada, encoding='utf-8')
+    try:
+        with transaction.atomic():
+            for objeto in serializers.deserialize('jsonl', texto, ignorenonexistent=True):
+                objeto.save()
+                filas += 1
+                if isinstance(objeto.object, Venta):
+                    ventas.append(objeto.object.pk)
+                    fecha = objeto.object.fecha
+                    fechas = [min(fechas[0], fecha), max(fechas[1], fecha)] if fechas else [fecha, fecha]
+            sincronizar_secuencias()
+            # Los pagos del archivo pueden ser posteriores a la foto de su venta
+            recalcular_saldos(Venta.objects.filter(pk__in=ventas))
+    finally:
+        texto.detach()
+    return filas, *(fechas or (None, None))
+
+
+def sincronizar_secuencias():
+    """Lleva cada serie al menos hasta el mayor número usado (tras restaurar ventas)."""
+    for serie, campo in ((numeracion.SECUENCIA_FACTURA, 'numero_factura'), (numeracion.SECUENCIA_TICKET, 'numero_ticket')):
+        maximo = Venta.objects.filter(tipo_documento=serie).aggregate(m=Max(campo))['m'] or 0
+        secuencia, _ = Secuencia.objects.get_or_create(nombre=serie)
+        if secuencia.valor < maximo:
+            Secuencia.objects.filter(pk=secuencia.pk).update(valor=maximo)
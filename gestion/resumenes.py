@@ -0,0 +1,377 @@
+"""
+Resumen diario de ventas (tabla ResumenDiario).
+
+Cada venta aporta a la fila (día local, vendedor) según su estado. Cuando la
+venta se crea o cambia de estado se aplica solo la diferencia con UPDATE y
+F(), de modo que el dashboard lee unas pocas filas indexadas en lugar de
+agregar sobre Venta y DetalleVenta.
+
+ResumenProducto guarda, solo para ventas completadas, unidades e importe por
+(día, hora, producto, categoría, vendedor, método de pago, modo de consumo):
+Reportes suma unas cientos de filas en lugar de agrupar DetalleVenta. Se
+actualiza con un número fijo de consultas (SELECT, INSERT de las filas
+nuevas y un UPDATE con CASE) sin importar cuántos productos tenga la venta.
+
+ResumenPago es el libro del turno: monto de los pagos validados de ventas
+completadas por (día, vendedor, método de pago). Se actualiza al cobrar, al
+validar un pago y cuando una venta entra o sale de 'completado' (desde los
+eventos de la venta, ver eventos.py), así el cierre
+de caja y el reporte X leen unas pocas filas sin recorrer las ventas del día.
+
+`reconstruir`, `reconstruir_productos` y `reconstruir_pagos` recalculan las
+tablas desde el historial (comando reconstruir_resumenes).
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, OuterRef, Subquery, Sum, When
+from django.db.models.functions import ExtractHour, TruncDate
+from django.utils import timezone
+
+from .models import DetalleVenta, Pago, ResumenDiario, ResumenPago, ResumenProducto, Venta
+
+CAMPOS = (
+    'num_ventas', 'num_completadas', 'num_pendientes', 'num_canceladas',
+    'total_completado', 'total_pendiente', 'productos_vendidos',
+)
+
+
+def _aporte(estado, total, cantidad):
+    """Contribución de una venta en `estado` a su fila de resumen."""
+    if estado == 'completado':
+        return {'num_completadas': 1, 'total_completado': total, 'productos_vendidos': cantidad}
+    if estado == 'pendiente':
+        return {'num_pendientes': 1, 'total_pendiente': total}
+    if estado == 'cancelado':
+        return {'num_canceladas': 1}
+    return {}
+
+
+def _sumar(modelo, clave, deltas):
+    """Suma `deltas` a la fila `clave` de `modelo` (la crea si no existe)."""
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas:
+        return
+    actualizacion = {campo: F(campo) + valor for campo, valor in deltas.items()}
+    with transaction.atomic():
+        if modelo.objects.filter(**clave).update(**actualizacion):
+            return
+        try:
+            with transaction.atomic():
+                modelo.objects.create(**clave, **deltas)
+                return
+        except IntegrityError:
+            pass  # Otra caja creó la fila al mismo tiempo
+        modelo.objects.filter(**clave).update(**actualizacion)
+
+
+def _aplicar(fecha, usuario_id, deltas):
+    _sumar(ResumenDiario, {'fecha': fecha, 'usuario_id': usuario_id}, deltas)
+
+
+def fecha_local(venta):
+    return timezone.localtime(venta.fecha).date()
+
+
+def _aplicar_productos(venta, lineas, metodo_pago_id, signo):
+    """
+    Suma (signo=1) o resta (signo=-1) las `lineas` de la venta en ResumenProducto.
+    `lineas`: iterable de (producto_id, categoria_id, cantidad, subtotal).
+    """
+    acumulado = defaultdict(lambda: [0, Decimal('0')])
+    for producto_id, categoria_id, cantidad, subtotal in lineas:
+        acumulado[(producto_id, categoria_id)][0] += cantidad
+        acumulado[(producto_id, categoria_id)][1] += subtotal
+    if not acumulado:
+        return
+
+    momento = timezone.localtime(venta.fecha)
+    clave = {
+        'fecha': momento.date(),
+        'hora': momento.hour,
+        'usuario_id': venta.usuario_id,
+        'metodo_pago_id': metodo_pago_id,
+        'modo_consumo': venta.modo_consumo,
+    }
+    filas = ResumenProducto.objects.filter(producto_id__in={p for p, _ in acumulado}, **clave)
+
+    def ids_existentes():
+        return {(p, c): pk for pk, p, c in filas.values_list('pk', 'producto_id', 'categoria_id')}
+
+    with transaction.atomic():
+        ids = ids_existentes()
+        faltantes = [k for k in acumulado if k not in ids]
+        if faltantes:
+            # ignore_conflicts: otra caja pudo crear la misma fila al mismo tiempo
+            ResumenProducto.objects.bulk_create([
+                ResumenProducto(producto_id=p, categoria_id=c, **clave) for p, c in faltantes
+            ], ignore_conflicts=True)
+            ids = ids_existentes()
+        ResumenProducto.objects.filter(pk__in=ids.values()).update(
+            cantidad=Case(
+                *[When(pk=ids[k], then=F('cantidad') + signo * v[0]) for k, v in acumulado.items()],
+                output_field=IntegerField(),
+            ),
+            total=Case(
+                *[When(pk=ids[k], then=F('total') + signo * v[1]) for k, v in acumulado.items()],
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+
+
+def _aplicar_pagos(venta, pagos, signo):
+    """
+    Suma (signo=1) o resta (signo=-1) pagos validados de la venta en ResumenPago.
+    `pagos`: iterable de (metodo_pago_id, monto). Una consulta por método (casi siempre uno).
+    """
+    acumulado = defaultdict(lambda: [0, Decimal('0')])
+    for metodo_pago_id, monto in pagos:
+        acumulado[metodo_pago_id][0] += 1
+        acumulado[metodo_pago_id][1] += monto
+    fecha = fecha_local(venta)
+    for metodo_pago_id, (num_pagos, monto) in acumulado.items():
+        _sumar(
+            ResumenPago,
+            {'fecha': fecha, 'usuario_id': venta.usuario_id, 'metodo_pago_id': metodo_pago_id},
+            {'num_pagos': signo * num_pagos, 'monto': signo * monto},
+        )
+
+
+def _pagos_validados(venta):
+    return venta.pagos.filter(validado=True).values_list('metodo_pago_id', 'monto')
+
+
+def _lineas_guardadas(venta):
+    return venta.detalles.values_list('producto_id', 'producto__categoria_id', 'cantidad', 'subtotal')
+
+
+def _metodo_pago_id(venta):
+    return venta.pagos.order_by('pk').values_list('metodo_pago_id', flat=True).first()
+
+
+def registrar_venta(venta, cantidad, detalles=None, metodo_pago_id=None, pagos=None):
+    """
+    Suma una venta recién creada (`cantidad` = unidades vendidas).
+
+    `detalles`, `metodo_pago_id` y `pagos` (validados, como (metodo_pago_id, monto))
+    evitan releer la venta cuando quien llama ya los tiene en memoria.
+    """
+    deltas = _aporte(venta.estado, venta.total, cantidad)
+    deltas['num_ventas'] = 1
+    _aplicar(fecha_local(venta), venta.usuario_id, deltas)
+    if venta.estado == 'completado':
+        if detalles is None:
+            lineas = _lineas_guardadas(venta)
+        else:
+            lineas = [(d.producto_id, d.producto.categoria_id, d.cantidad, d.subtotal) for d in detalles]
+        if metodo_pago_id is None:
+            metodo_pago_id = _metodo_pago_id(venta)
+        _aplicar_productos(venta, lineas, metodo_pago_id, 1)
+        _aplicar_pagos(venta, _pagos_validados(venta) if pagos is None else pagos, 1)
+
+
+def registrar_cambio_estado(venta, estado_anterior, cantidad=None, pagos=None):
+    """
+    Mueve la venta de `estado_anterior` a `venta.estado` en sus filas de resumen.
+    `pagos`: sus pagos validados como (metodo_pago_id, monto); si no se indican se leen.
+    """
+    if estado_anterior == venta.estado:
+        return
+    if cantidad is None:
+        cantidad = venta.detalles.aggregate(c=Sum('cantidad'))['c'] or 0
+    antes = _aporte(estado_anterior, venta.total, cantidad)
+    despues = _aporte(venta.estado, venta.total, cantidad)
+    deltas = {campo: despues.get(campo, 0) - antes.get(campo, 0) for campo in set(antes) | set(despues)}
+    _aplicar(fecha_local(venta), venta.usuario_id, deltas)
+    if 'completado' in (estado_anterior, venta.estado):
+        signo = 1 if venta.estado == 'completado' else -1
+        _aplicar_productos(venta, _lineas_guardadas(venta), _metodo_pago_id(venta), signo)
+        _aplicar_pagos(venta, _pagos_validados(venta) if pagos is None else pagos, signo)
+
+
+def registrar_pago_validado(pago):
+    """Suma al turno un pago recién validado de una venta que ya estaba completada."""
+    _aplicar_pagos(pago.venta, [(pago.metodo_pago_id, pago.monto)], 1)
+
+
+def totales_del_dia(fecha, usuario=None):
+    """Totales del día (todos los vendedores, o solo `usuario`) en una consulta."""
+    filas = ResumenDiario.objects.filter(fecha=fecha)
+    if usuario is not None:
+        filas = filas.filter(usuario=usuario)
+    totales = filas.aggregate(**{campo: Sum(campo) for campo in CAMPOS})
+    for campo in CAMPOS:
+        if totales[campo] is None:
+            totales[campo] = Decimal('0.00') if campo.startswith('total_') else 0
+    return totales
+
+
+def pagos_del_dia(fecha, usuario=None):
+    """
+    Pagos validados del día por método (todos los vendedores, o solo `usuario`):
+    lista de {'metodo_pago_id', 'metodo_pago__nombre', 'num_pagos', 'monto'}.
+    """
+    filas = ResumenPago.objects.filter(fecha=fecha)
+    if usuario is not None:
+        filas = filas.filter(usuario=usuario)
+    return [
+        fila for fila in filas.values('metodo_pago_id', 'metodo_pago__nombre')
+        .annotate(num_pagos=Sum('num_pagos'), monto=Sum('monto')).order_by('metodo_pago__nombre')
+        if fila['monto']
+    ]
+
+
+@transaction.atomic
+def reconstruir(desde=None, hasta=None):
+    """
+    Recalcula ResumenDiario desde Venta/DetalleVenta para el rango de fechas
+    locales [desde, hasta] (todo el historial si no se indican).
+    Retorna la cantidad de filas creadas.
+    """
+    tz = timezone.get_current_timezone()
+    ventas = Venta.objects.annotate(dia=TruncDate('fecha', tzinfo=tz))
+    detalles = DetalleVenta.objects.filter(venta__estado='completado').annotate(
+        dia=TruncDate('venta__fecha', tzinfo=tz)
+    )
+    existentes = ResumenDiario.objects.all()
+    if desde:
+        ventas = ventas.filter(dia__gte=desde)
+        detalles = detalles.filter(dia__gte=desde)
+        existentes = existentes.filter(fecha__gte=desde)
+    if hasta:
+        ventas = ventas.filter(dia__lte=hasta)
+        detalles = detalles.filter(dia__lte=hasta)
+        existentes = existentes.filter(fecha__lte=hasta)
+
+    filas = defaultdict(lambda: defaultdict(int))
+    for fila in ventas.values('dia', 'usuario_id', 'estado').annotate(n=Count('id'), total=Sum('total')):
+        acumulado = filas[(fila['dia'], fila['usuario_id'])]
+        acumulado['num_ventas'] += fila['n']
+        for campo, valor in _aporte(fila['estado'], fila['total'] or Decimal('0'), 0).items():
+            if campo.startswith('num_'):
+                valor = fila['n']
+            acumulado[campo] += valor
+    for fila in detalles.values('dia', 'venta__usuario_id').annotate(c=Sum('cantidad')):
+        filas[(fila['dia'], fila['venta__usuario_id'])]['productos_vendidos'] += fila['c'] or 0
+
+    existentes.delete()
+    ResumenDiario.objects.bulk_create([
+        ResumenDiario(fecha=dia, usuario_id=usuario_id, **valores)
+        for (dia, usuario_id), valores in filas.items()
+    ], batch_size=1000)
+    return len(filas)
+
+
+@transaction.atomic
+def reconstruir_productos(desde=None, hasta=None):
+    """
+    Recalcula ResumenProducto desde DetalleVenta (ventas completadas) para el rango
+    de fechas locales [desde, hasta] (todo el historial si no se indican).
+    Retorna la cantidad de filas creadas.
+    """
+    tz = timezone.get_current_timezone()
+    primer_pago = Pago.objects.filter(venta=OuterRef('venta')).order_by('pk').values('metodo_pago')[:1]
+    detalles = DetalleVenta.objects.filter(venta__estado='completado').annotate(
+        dia=TruncDate('venta__fecha', tzinfo=tz),
+        hora=ExtractHour('venta__fecha', tzinfo=tz),
+        metodo=Subquery(primer_pago),
+    )
+    existentes = ResumenProducto.objects.all()
+    if desde:
+        detalles = detalles.filter(dia__gte=desde)
+        existentes = existentes.filter(fecha__gte=desde)
+    if hasta:
+        detalles = detalles.filter(dia__lte=hasta)
+        existentes = existentes.filter(fecha__lte=hasta)
+
+    grupos = detalles.values(
+        'dia', 'hora', 'producto_id', 'producto__categoria_id', 'venta__usuario_id', 'metodo', 'venta__modo_consumo'
+    ).annotate(c=Sum('cantidad'), t=Sum('subtotal')).order_by()
+
+    existentes.delete()
+    filas = [
+        ResumenProducto(
+            fecha=g['dia'],
+            hora=g['hora'],
+            producto_id=g['producto_id'],
+            categoria_id=g['producto__categoria_id'],
+            usuario_id=g['venta__usuario_id'],
+            metodo_pago_id=g['metodo'],
+            modo_consumo=g['venta__modo_consumo'],
+            cantidad=g['c'] or 0,
+            total=g['t'] or Decimal('0'),
+        )
+        for g in grupos
+    ]
+    ResumenProducto.objects.bulk_create(filas, batch_size=1000)
+    return len(filas)
+
+
+@transaction.atomic
+def reconstruir_pagos(desde=None, hasta=None):
+    """
+    Recalcula ResumenPago desde Pago (validados, de ventas completadas) para el
+    rango de fechas locales [desde, hasta] (todo el historial si no se indican).
+    Retorna la cantidad de filas creadas.
+    """
+    tz = timezone.get_current_timezone()
+    pagos = Pago.objects.filter(validado=True, venta__estado='completado').annotate(
+        dia=TruncDate('venta__fecha', tzinfo=tz)
+    )
+    existentes = ResumenPago.objects.all()
+    if desde:
+        pagos = pagos.filter(dia__gte=desde)
+        existentes = existentes.filter(fecha__gte=desde)
+    if hasta:
+        pagos = pagos.filter(dia__lte=hasta)
+        existentes = existentes.filter(fecha__lte=hasta)
+
+    grupos = pagos.values('dia', 'venta__usuario_id', 'metodo_pago_id').annotate(
+        n=Count('id'), m=Sum('monto')
+    ).order_by()
+
+    existentes.delete()
+    filas = [
+        ResumenPago(
+            fecha=g['dia'],
+            usuario_id=g['venta__usuario_id'],
+            metodo_pago_id=g['metodo_pago_id'],
+            num_pagos=g['n'],
+            monto=g['m'] or Decimal('0'),
+        )
+        for g in grupos
+    ]
+    ResumenPago.objects.bulk_create(filas, batch_size=1000)
+    return len(filas)
+
+
+def reporte_periodo(desde, hasta):
+    """
+    Desgloses de Reportes para los días locales [desde, hasta]: productos más
+    vendidos y totales por categoría, vendedor, hora del día y modo de consumo
+    (de ResumenProducto), y total por método de pago (de ResumenPago: pagos
+    validados, así una venta pagada con dos métodos suma a cada uno lo suyo).
+    """
+    filas = ResumenProducto.objects.filter(fecha__gte=desde, fecha__lte=hasta)
+
+    def por(*campos, orden='-total', limite=None):
+        grupos = filas.values(*campos).annotate(cantidad=Sum('cantidad'), total=Sum('total')).order_by(orden)
+        return list(grupos[:limite] if limite else grupos)
+
+    modos = dict(Venta.MODO_CONSUMO_CHOICES)
+    por_modo = por('modo_consumo')
+    for fila in por_modo:
+        fila['modo_consumo_display'] = modos.get(fila['modo_consumo'], fila['modo_consumo'])
+
+    return {
+        'productos_mas_vendidos': por('producto__nombre', orden='-cantidad', limite=20),
+        'pagos_periodo': list(
+            ResumenPago.objects.filter(fecha__gte=desde, fecha__lte=hasta)
+            .values('metodo_pago__nombre').annotate(total=Sum('monto')).order_by('-total')
+        ),
+        'por_categoria': por('categoria__nombre'),
+        'por_vendedor': por('usuario__username'),
+        'por_hora': por('hora', orden='hora'),
+        'por_modo_consumo': por_modo,
+    }
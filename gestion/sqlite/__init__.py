@@ -0,0 +1,140 @@
+"""
+Perfil SQLite para producción con varias cajas (ENGINE 'gestion.sqlite').
+
+Es el backend sqlite3 de Django con tres agregados, configurados en OPTIONS
+(ver SQLITE_OPCIONES en settings):
+
+- pragmas: se ejecutan al abrir cada conexión. El perfil usa WAL (las lecturas
+  no esperan a la caja que escribe), synchronous=NORMAL (en WAL no pierde
+  integridad, solo las últimas transacciones ante un corte de luz), busy_timeout,
+  mmap_size y cache_size.
+- transaction_mode: 'IMMEDIATE' abre cada transacción con BEGIN IMMEDIATE (como
+  la opción de Django 5.1). Con BEGIN a secas una transacción que primero lee y
+  después escribe falla con "database is locked" sin esperar el busy_timeout si
+  otra caja escribió en el medio.
+- cola_escritura: las transacciones de escritura() del proceso esperan su turno
+  en una cola (FIFO) en lugar de reintentar contra el bloqueo del archivo.
+
+escritura() envuelve las transacciones del checkout (cobro, anulación,
+validación de pagos, eventos). En MySQL y con el backend sqlite3 estándar es
+un transaction.atomic. instantanea() es su contraparte de solo lectura: una
+transacción que ve una sola foto de la base (backups incrementales).
+"""
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+
+class ColaEscritura:
+    """
+    Turnos en orden de llegada para escribir en una base (un escritor a la vez).
+
+    Es reentrante: los on_commit de una transacción (p. ej. los eventos en modo
+    sincrono) corren con el turno todavía tomado y pueden volver a escribir.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._esperando = deque()  # (hilo, Event)
+        self._duenio = None
+        self._niveles = 0
+
+    def tomar(self, espera):
+        """Espera el turno hasta `espera` segundos; retorna False si no llegó."""
+        hilo = threading.get_ident()
+        with self._lock:
+            if self._duenio == hilo:
+                self._niveles += 1
+                return True
+            if self._duenio is None:
+                self._duenio, self._niveles = hilo, 1
+                return True
+            turno = threading.Event()
+            self._esperando.append((hilo, turno))
+        if turno.wait(espera):
+            return True
+        with self._lock:
+            if turno.is_set():  # El turno llegó justo al vencer la espera
+                return True
+            self._esperando.remove((hilo, turno))
+        return False
+
+    def soltar(self):
+        with self._lock:
+            self._niveles -= 1
+            if self._niveles:
+                return
+            if self._esperando:
+                self._duenio, turno = self._esperando.popleft()
+                self._niveles = 1
+                turno.set()
+            else:
+                self._duenio = None
+
+
+@contextmanager
+def escritura(using=None):
+    """
+    transaction.atomic para transacciones que escriben (BEGIN IMMEDIATE en SQLite).
+
+    Con cola_escritura espera su turno antes de abrir la transacción. Dentro de
+    otra transacción es un savepoint: el turno y el BEGIN son de la de afuera.
+    """
+    using = using or DEFAULT_DB_ALIAS
+    conexion = connections[using]
+    if conexion.in_atomic_block or not hasattr(conexion, 'modo_inicio'):
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    cola = conexion.cola_escritura
+    if cola is not None and not cola.tomar(conexion.espera_cola):
+        raise OperationalError('database is locked (sin turno en la cola de escritura)')
+    try:
+        with _transaccion(conexion, using, 'IMMEDIATE'):
+            yield
+    finally:
+        if cola is not None:
+            cola.soltar()
+
+
+@contextmanager
+def instantanea(using=None):
+    """
+    Transacción de lectura en la que todas las consultas ven la misma foto de la
+    base, aunque las cajas sigan confirmando ventas mientras tanto.
+
+    MySQL: REPEATABLE READ (Django abre las conexiones en READ COMMITTED), la foto
+    se toma en la primera lectura. SQLite: BEGIN DEFERRED aunque el perfil use
+    IMMEDIATE, para no tomar el bloqueo de escritura; la foto también se toma en
+    la primera lectura. En WAL las cajas siguen escribiendo; sin WAL (journal
+    DELETE) sus commits esperan a que termine, hasta busy_timeout.
+    """
+    using = using or DEFAULT_DB_ALIAS
+    conexion = connections[using]
+    if conexion.in_atomic_block:
+        raise transaction.TransactionManagementError('instantanea() no puede usarse dentro de otra transacción.')
+    with _transaccion(conexion, using, 'DEFERRED'):
+        if conexion.vendor == 'mysql':
+            with conexion.cursor() as cursor:
+                # Antes de cualquier lectura: aplica a la transacción que se está abriendo
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+        yield
+
+
+@contextmanager
+def _transaccion(conexion, using, modo):
+    """transaction.atomic con BEGIN `modo` en el backend gestion.sqlite."""
+    if not hasattr(conexion, 'modo_inicio'):
+        with transaction.atomic(using=using):
+            yield
+        return
+    try:
+        conexion.modo_inicio = modo  # Lo lee el BEGIN que ejecuta atomic al entrar
+        with transaction.atomic(using=using):
+            conexion.modo_inicio = None
+            yield
+    finally:
+        conexion.modo_inicio = None
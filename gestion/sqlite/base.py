@@ -0,0 +1,46 @@
+"""Backend 'gestion.sqlite': sqlite3 de Django con PRAGMAs, BEGIN IMMEDIATE y cola de escritura."""
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS
+from django.db.backends.sqlite3 import base
+
+from . import ColaEscritura
+
+OPCIONES = ('pragmas', 'transaction_mode', 'cola_escritura')
+MODOS_TRANSACCION = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+# Una cola por alias, compartida por las conexiones de todos los hilos del proceso
+_colas = {}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, settings_dict, alias=DEFAULT_DB_ALIAS):
+        super().__init__(settings_dict, alias)
+        opciones = self.settings_dict['OPTIONS']
+        self.pragmas = dict(opciones.get('pragmas') or {})
+        self.modo_transaccion = (opciones.get('transaction_mode') or '').upper() or None
+        if self.modo_transaccion and self.modo_transaccion not in MODOS_TRANSACCION:
+            raise ImproperlyConfigured(
+                f'transaction_mode de SQLite inválido: {self.modo_transaccion} '
+                f'(opciones: {", ".join(MODOS_TRANSACCION)})'
+            )
+        self.cola_escritura = _colas.setdefault(alias, ColaEscritura()) if opciones.get('cola_escritura') else None
+        # La cola espera lo mismo que SQLite esperaría el bloqueo del archivo
+        self.espera_cola = int(self.pragmas.get('busy_timeout', 5000)) / 1000
+        self.modo_inicio = None  # BEGIN de la próxima transacción (escritura()/instantanea())
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        for opcion in OPCIONES:
+            kwargs.pop(opcion, None)  # No son argumentos de sqlite3.connect
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        # busy_timeout primero: cambiar journal_mode necesita el bloqueo del archivo
+        for nombre in sorted(self.pragmas, key=lambda n: n != 'busy_timeout'):
+            conn.execute(f'PRAGMA {nombre} = {self.pragmas[nombre]}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        modo = self.modo_inicio or self.modo_transaccion
+        self.cursor().execute(f'BEGIN {modo}' if modo else 'BEGIN')
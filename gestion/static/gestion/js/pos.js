@@ -2,6 +2,8 @@
 class POS {
     constructor() {
         this.cart = [];
+        this.cartKey = null; // Clave de idempotencia del carrito (ver saveCart)
+        this.sincronizando = false;
         this.currentCategory = 'all';
         this.clienteSearchTimeout = null;
         this.init();
@@ -12,25 +14,171 @@ class POS {
         this.attachEventListeners();
         this.renderCart();
         this.updateTicketNumber(); // Usa siguiente_ticket del servidor (consecutivo con ventas)
+        this.loadCatalogo();
+        // Ventas guardadas sin conexión: se envían al cargar, al volver la red y cada 30 s
+        this.actualizarIndicadorCola();
+        this.sincronizarCola();
+        window.addEventListener('online', () => this.sincronizarCola());
+        setInterval(() => this.sincronizarCola(), 30000);
+    }
+
+    // Catálogo (productos, categorías, métodos de pago) desde /pos/catalogo.json.
+    // El navegador revalida con ETag: si no cambió, el servidor responde 304 sin cuerpo.
+    // Se guarda una copia en localStorage para seguir vendiendo si el servidor no responde.
+    async loadCatalogo() {
+        const grid = document.querySelector('.products-grid');
+        if (!window.posData || !window.posData.catalogoUrl || !grid) return;
+        try {
+            const response = await fetch(window.posData.catalogoUrl, {
+                cache: 'no-cache',
+                headers: { 'Accept': 'application/json' }
+            });
+            if (!response.ok) throw new Error('HTTP ' + response.status);
+            const texto = await response.text();
+            this.renderCatalogo(JSON.parse(texto));
+            try {
+                localStorage.setItem('posCatalogo', texto);
+            } catch (e) {
+                console.warn('No se pudo guardar el catálogo en el navegador:', e);
+            }
+        } catch (error) {
+            console.error('Error al cargar el catálogo:', error);
+            const guardado = localStorage.getItem('posCatalogo');
+            if (guardado) {
+                this.renderCatalogo(JSON.parse(guardado));
+                this.showNotification('Sin conexión: usando el último catálogo descargado');
+                return;
+            }
+            grid.innerHTML = '';
+            const aviso = document.createElement('p');
+            aviso.className = 'products-loading';
+            aviso.style.cssText = 'grid-column: 1 / -1; text-align: center; color: #c41e3a; padding: 2rem;';
+            aviso.textContent = 'No se pudo cargar el catálogo. Recargue la página.';
+            grid.appendChild(aviso);
+        }
+    }
+
+    renderCatalogo(catalogo) {
+        const campos = catalogo.campos;
+        const productos = catalogo.productos.map(fila => {
+            const p = {};
+            campos.forEach((campo, i) => { p[campo] = fila[i]; });
+            return p;
+        });
+        window.posData.clienteMostradorId = catalogo.cliente_mostrador_id;
+
+        const tabs = document.querySelector('.category-tabs');
+        if (tabs) {
+            tabs.querySelectorAll('.category-tab:not([data-category="all"])').forEach(tab => tab.remove());
+            catalogo.categorias.forEach(([id, nombre]) => {
+                const tab = document.createElement('button');
+                tab.className = 'category-tab';
+                tab.dataset.category = String(id);
+                tab.textContent = nombre;
+                tabs.appendChild(tab);
+            });
+        }
+
+        const select = document.getElementById('metodo_pago_select');
+        if (select) {
+            select.querySelectorAll('option:not([value=""])').forEach(opt => opt.remove());
+            catalogo.metodos_pago.forEach(([id, nombre]) => {
+                const opt = document.createElement('option');
+                opt.value = id;
+                opt.textContent = nombre;
+                select.appendChild(opt);
+            });
+        }
+
+        const grid = document.querySelector('.products-grid');
+        const fragment = document.createDocumentFragment();
+        productos.forEach(p => fragment.appendChild(this.productCard(p)));
+        grid.innerHTML = '';
+        grid.appendChild(fragment);
+        this.filterByCategory(this.currentCategory);
+    }
+
+    productCard(p) {
+        const precio = parseFloat(p.precio).toFixed(2);
+        const card = document.createElement('div');
+        card.className = 'product-card';
+        card.dataset.productId = String(p.id);
+        card.dataset.productName = p.nombre;
+        card.dataset.productPrice = precio;
+        card.dataset.category = String(p.categoria_id);
+        card.style.cssText = 'display: flex; flex-direction: column; overflow: visible; position: relative;';
+
+        if (p.tiene_promo) {
+            const badge = document.createElement('span');
+            badge.className = 'promo-badge';
+            badge.textContent = 'PROMO';
+            card.appendChild(badge);
+        }
+
+        const media = document.createElement('div');
+        media.style.cssText = 'width: 100%; height: 130px; min-height: 130px; max-height: 130px; flex-shrink: 0; overflow: hidden; border-radius: 8px 8px 0 0;';
+        if (p.imagen) {
+            // Miniatura WebP con JPEG de respaldo (srcset 1x/2x); sin miniaturas, la original
+            const picture = document.createElement('picture');
+            if (p.imagen_webp) {
+                const source = document.createElement('source');
+                source.type = 'image/webp';
+                source.srcset = p.imagen_webp;
+                picture.appendChild(source);
+            }
+            const img = document.createElement('img');
+            img.src = p.imagen;
+            if (p.imagen_srcset) img.srcset = p.imagen_srcset;
+            img.alt = p.nombre;
+            img.loading = 'lazy';
+            img.style.cssText = 'width: 100%; height: 130px; object-fit: cover; display: block;';
+            picture.appendChild(img);
+            media.appendChild(picture);
+        } else {
+            media.innerHTML = '<div style="width: 100%; height: 130px; background: linear-gradient(135deg, #c41e3a 0%, #9a1830 100%); display: flex; align-items: center; justify-content: center;">' +
+                '<i class="fas fa-drumstick-bite" style="font-size: 3rem; color: #f8d210; opacity: 0.9;"></i></div>';
+        }
+        card.appendChild(media);
+
+        const info = document.createElement('div');
+        info.className = 'product-info';
+        info.style.cssText = 'display: flex !important; visibility: visible !important; opacity: 1 !important; padding: 10px !important; background: white !important; flex-shrink: 0; min-height: 50px; width: 100%; box-sizing: border-box; border-top: 1px solid #eee; border-radius: 0 0 8px 8px;';
+        const name = document.createElement('div');
+        name.className = 'product-name';
+        name.style.cssText = 'display: block !important; visibility: visible !important; font-size: 0.85rem; font-weight: 600; color: #333; flex: 1; overflow: hidden; text-overflow: ellipsis; white-space: nowrap;';
+        name.textContent = p.nombre;
+        const price = document.createElement('div');
+        price.className = 'product-price-tag';
+        price.style.cssText = 'display: block !important; visibility: visible !important; font-size: 0.85rem; font-weight: 700; color: #2c3e50; margin-left: 8px; white-space: nowrap;';
+        price.textContent = 'Bs. ' + precio;
+        info.appendChild(name);
+        info.appendChild(price);
+        card.appendChild(info);
+        return card;
     }
 
     attachEventListeners() {
-        // Product cards click
-        document.querySelectorAll('.product-card').forEach(card => {
-            card.addEventListener('click', (e) => {
+        // Product cards click (delegado: las tarjetas se dibujan al cargar el catálogo)
+        const grid = document.querySelector('.products-grid');
+        if (grid) {
+            grid.addEventListener('click', (e) => {
+                const card = e.target.closest('.product-card');
+                if (!card) return;
                 const productId = card.dataset.productId;
                 const productName = card.dataset.productName;
                 const productPrice = parseFloat(card.dataset.productPrice);
                 this.addToCart(productId, productName, productPrice);
             });
-        });
+        }
 
-        // Category tabs
-        document.querySelectorAll('.category-tab').forEach(tab => {
-            tab.addEventListener('click', (e) => {
-                this.filterByCategory(tab.dataset.category);
+        // Category tabs (delegado)
+        const tabs = document.querySelector('.category-tabs');
+        if (tabs) {
+            tabs.addEventListener('click', (e) => {
+                const tab = e.target.closest('.category-tab');
+                if (tab) this.filterByCategory(tab.dataset.category);
             });
-        });
+        }
 
         // Search
         const searchInput = document.querySelector('.search-input');
@@ -86,8 +234,9 @@ class POS {
         }
         // Venta Mostrador: pre-selecciona cliente para ventas rápidas
         const btnVentaMostrador = document.getElementById('btnVentaMostrador');
-        if (btnVentaMostrador && window.posData && window.posData.clienteMostradorId) {
+        if (btnVentaMostrador && window.posData) {
             btnVentaMostrador.addEventListener('click', () => {
+                if (!window.posData.clienteMostradorId) return; // Catálogo aún no cargado
                 const tipoDoc = document.querySelector('input[name="tipo_documento"]:checked');
                 if (tipoDoc && tipoDoc.value === 'factura') {
                     if (typeof showAlertModal === 'function') showAlertModal('Para factura debe seleccionar un cliente con NIT/CI. No puede usar Mostrador.', 'warning');
@@ -446,21 +595,30 @@ class POS {
             return;
         }
 
+        const pedido = {
+            cliente_id: clienteId,
+            metodo_pago_id: metodoPagoId,
+            modo_consumo: modoConsumo,
+            tipo_documento: tipoDocumento,
+            items: this.cart,
+            clave_idempotencia: this.cartKey
+        };
+
         try {
-            const response = await fetch(window.posData.procesarPagoUrl, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'X-CSRFToken': window.posData.csrfToken
-                },
-                body: JSON.stringify({
-                    cliente_id: clienteId,
-                    metodo_pago_id: metodoPagoId,
-                    modo_consumo: modoConsumo,
-                    tipo_documento: tipoDocumento,
-                    items: this.cart
-                })
-            });
+            if (navigator.onLine === false) {
+                this.guardarSinConexion(pedido);
+                return;
+            }
+            let response;
+            try {
+                response = await this.postConReintentos(window.posData.procesarPagoUrl, pedido);
+            } catch (error) {
+                // Sin respuesta del servidor: se envía después con la misma clave (si la venta
+                // llegó a registrarse, la sincronización la reconoce y no la duplica)
+                console.warn('Servidor sin respuesta, venta guardada sin conexión:', error);
+                this.guardarSinConexion(pedido);
+                return;
+            }
 
             const data = await response.json();
 
@@ -472,7 +630,7 @@ class POS {
                 this.cart = [];
                 this.saveCart();
                 this.renderCart();
-                this.setSiguienteTicket(data.venta_id + 1);
+                if (data.numero_ticket) this.setSiguienteTicket(data.numero_ticket + 1);
 
                 // Mostrar modal de confirmación en la página (en lugar del alert del navegador)
                 this.showVentaCompletadaModal(data.venta_id, data.total);
@@ -491,8 +649,142 @@ class POS {
     }
 
 
+    // POST JSON que reintenta ante errores de red o 502/503/504. Es seguro porque el
+    // servidor deduplica por clave_idempotencia: un reintento nunca duplica la venta.
+    async postConReintentos(url, body, intentos = 3) {
+        for (let intento = 1; ; intento++) {
+            try {
+                const response = await fetch(url, {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                        'X-CSRFToken': window.posData.csrfToken
+                    },
+                    body: JSON.stringify(body)
+                });
+                if (intento >= intentos || ![502, 503, 504].includes(response.status)) return response;
+            } catch (error) {
+                if (intento >= intentos) throw error;
+            }
+            await new Promise(resolve => setTimeout(resolve, 500 * 2 ** (intento - 1)));
+        }
+    }
+
+    leerCola() {
+        try {
+            return JSON.parse(localStorage.getItem('posColaVentas')) || [];
+        } catch (e) {
+            return [];
+        }
+    }
+
+    guardarCola(cola) {
+        localStorage.setItem('posColaVentas', JSON.stringify(cola));
+        this.actualizarIndicadorCola();
+    }
+
+    actualizarIndicadorCola() {
+        const indicador = document.getElementById('offlineQueueDisplay');
+        if (!indicador) return;
+        const pendientes = this.leerCola().length;
+        indicador.hidden = pendientes === 0;
+        indicador.innerHTML = `<i class="fas fa-wifi"></i> ${pendientes} sin enviar`;
+    }
+
+    // Guarda el pedido en la cola local y deja la caja lista para la siguiente venta
+    guardarSinConexion(pedido) {
+        const cola = this.leerCola();
+        cola.push({
+            ...pedido,
+            fecha: new Date().toISOString(),
+            total: this.cart.reduce((suma, item) => suma + item.price * item.quantity, 0)
+        });
+        this.guardarCola(cola);
+        this.closePaymentModal();
+        this.cart = [];
+        this.saveCart();
+        this.renderCart();
+        this.showNotification('Sin conexión: venta guardada, se enviará al reconectar');
+    }
+
+    // Envía la cola en lotes a /pos/sincronizar/ (una transacción por lote en el servidor)
+    async sincronizarCola() {
+        if (this.sincronizando || !window.posData || !window.posData.sincronizarUrl) return;
+        const cola = this.leerCola();
+        if (cola.length === 0 || navigator.onLine === false) return;
+        this.sincronizando = true;
+        let quedan = false;
+        try {
+            const lote = cola.slice(0, window.posData.sincronizacionMax || 50);
+            const response = await fetch(window.posData.sincronizarUrl, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': window.posData.csrfToken
+                },
+                body: JSON.stringify({ ventas: lote.map(({ total, ...pedido }) => pedido) })
+            });
+            if (!response.ok) return;
+            const data = await response.json();
+
+            const procesadas = new Set();
+            const rechazadas = [];
+            let ultimoTicket = 0;
+            data.resultados.forEach((resultado, i) => {
+                if (resultado.success) {
+                    ultimoTicket = Math.max(ultimoTicket, resultado.numero_ticket || 0);
+                } else if (resultado.status === 409) {
+                    return; // Conflicto transitorio: se reintenta en el próximo envío
+                } else {
+                    rechazadas.push({ ...lote[i], error: resultado.error });
+                }
+                procesadas.add(lote[i].clave_idempotencia);
+            });
+            // La cola pudo crecer mientras se enviaba: se quitan solo los pedidos procesados
+            const restantes = this.leerCola().filter(p => !procesadas.has(p.clave_idempotencia));
+            this.guardarCola(restantes);
+            quedan = restantes.length > 0 && procesadas.size > 0;
+
+            if (ultimoTicket && ultimoTicket + 1 > (window.posData.siguienteTicket || 0)) {
+                this.setSiguienteTicket(ultimoTicket + 1);
+            }
+            if (data.registradas) this.showNotification(`✓ ${data.registradas} venta(s) sin conexión sincronizadas`);
+            if (rechazadas.length) this.mostrarRechazadas(rechazadas);
+        } catch (error) {
+            console.warn('No se pudo sincronizar la cola de ventas:', error);
+        } finally {
+            this.sincronizando = false;
+        }
+        if (quedan) this.sincronizarCola();
+    }
+
+    // Pedidos que el servidor no aceptó (p. ej. sin stock): se guardan aparte para revisarlos
+    mostrarRechazadas(rechazadas) {
+        const anteriores = JSON.parse(localStorage.getItem('posVentasRechazadas') || '[]');
+        localStorage.setItem('posVentasRechazadas', JSON.stringify(anteriores.concat(rechazadas)));
+        const detalle = rechazadas
+            .map(p => `• ${new Date(p.fecha).toLocaleString()} (Bs. ${Number(p.total || 0).toFixed(2)}): ${p.error}`)
+            .join('\n');
+        const mensaje = `${rechazadas.length} venta(s) sin conexión no se pudieron registrar:\n${detalle}`;
+        if (typeof showAlertModal === 'function') showAlertModal(mensaje, 'error');
+        else alert(mensaje);
+    }
+
+    nuevaClave() {
+        if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+        const bytes = crypto.getRandomValues(new Uint8Array(16));
+        bytes[6] = (bytes[6] & 0x0f) | 0x40;
+        bytes[8] = (bytes[8] & 0x3f) | 0x80;
+        const hex = Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+        return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+    }
+
+    // Cada cambio del carrito (o vaciarlo tras una venta) genera una clave nueva: la clave
+    // identifica exactamente este pedido y se conserva si se recarga la página.
     saveCart() {
+        this.cartKey = this.nuevaClave();
         localStorage.setItem('posCart', JSON.stringify(this.cart));
+        localStorage.setItem('posCartKey', this.cartKey);
     }
 
     loadCart() {
@@ -500,6 +792,7 @@ class POS {
         if (saved) {
             this.cart = JSON.parse(saved);
         }
+        this.cartKey = localStorage.getItem('posCartKey') || this.nuevaClave();
     }
 
     updateTicketNumber() {
@@ -8,3 +8,29 @@ register = template.Library()
 def modo_consumo_safe(venta):
     """Retorna modo_consumo de la venta o 'local' si no existe (compatibilidad)."""
     return getattr(venta, 'modo_consumo', 'local')
+
+
+@register.simple_tag
+def imagen_producto(producto, ancho=320, style=''):
+    """
+    <picture> con la miniatura WebP (y JPEG de respaldo) del producto para `ancho` px
+    en pantallas normales y 2x. Sin miniaturas usa la imagen original.
+
+    Uso: {% imagen_producto producto 200 style="max-width: 200px" %}
+    """
+    from django.core.files.storage import default_storage
+    from django.utils.html import format_html
+    from gestion.imagenes import ruta_variante, srcset
+
+    if not producto.imagen:
+        return ''
+    variantes = producto.imagen_variantes
+    jpeg = ruta_variante(variantes, ancho, 'jpeg')
+    if not jpeg:
+        return format_html('<img src="{}" alt="{}" loading="lazy" style="{}">', producto.imagen.url, producto.nombre, style)
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}">'
+        '<img src="{}" srcset="{}" alt="{}" loading="lazy" style="{}"></picture>',
+        srcset(variantes, ancho, 'webp'), default_storage.url(jpeg), srcset(variantes, ancho, 'jpeg'),
+        producto.nombre, style,
+    )
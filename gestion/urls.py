@@ -10,9 +10,12 @@ urlpatterns = [
     path('cuenta/usuarios/', views.admin_usuarios_index, name='admin_usuarios_index'),
     path('cuenta/usuarios/crear/', views.admin_usuarios_crear, name='admin_usuarios_crear'),
     path('cuenta/usuarios/<int:pk>/eliminar/', views.admin_usuarios_eliminar, name='admin_usuarios_eliminar'),
+    path('cuenta/rendimiento/', views.rendimiento, name='rendimiento'),
     path('', views.index, name='index'),
     path('pos/', views.pos_view, name='pos'),
+    path('pos/catalogo.json', views.pos_catalogo_json, name='pos_catalogo_json'),
     path('pos/procesar-pago/', views.pos_procesar_pago, name='pos_procesar_pago'),
+    path('pos/sincronizar/', views.pos_sincronizar_ventas, name='pos_sincronizar_ventas'),
     path('pos/buscar-clientes/', views.pos_buscar_clientes, name='pos_buscar_clientes'),
     path('pos/crear-cliente/', views.pos_crear_cliente, name='pos_crear_cliente'),
     path('productos/', views.producto_index, name='producto_index'),
@@ -31,12 +34,17 @@ urlpatterns = [
     path('clientes/<int:pk>/editar/', views.cliente_editar, name='cliente_editar'),
     path('clientes/<int:pk>/eliminar/', views.cliente_eliminar, name='cliente_eliminar'),
     path('ventas/', views.venta_index, name='venta_index'),
+    path('ventas/pagina.json', views.venta_index_json, name='venta_index_json'),
     path('ventas/<int:pk>/', views.venta_detail, name='venta_detail'),
     path('ventas/<int:venta_pk>/pago/<int:pago_pk>/validar/', views.pago_validar, name='pago_validar'),
+    path('conciliacion/', views.conciliacion_index, name='conciliacion_index'),
+    path('conciliacion/<int:pk>/resolver/', views.conciliacion_resolver, name='conciliacion_resolver'),
     path('cierre-caja/', views.cierre_caja_index, name='cierre_caja_index'),
     path('cierre-caja/nuevo/', views.cierre_caja_nuevo, name='cierre_caja_nuevo'),
+    path('cierre-caja/parcial/', views.cierre_caja_parcial, name='cierre_caja_parcial'),
     path('cierre-caja/<int:pk>/', views.cierre_caja_detail, name='cierre_caja_detail'),
     path('reportes/', views.reportes_index, name='reportes_index'),
+    path('reportes/exportar/', views.exportar_ventas, name='exportar_ventas'),
     path('promociones/', views.promocion_index, name='promocion_index'),
     path('promociones/crear/', views.promocion_crear, name='promocion_crear'),
     path('promociones/<int:pk>/editar/', views.promocion_editar, name='promocion_editar'),
@@ -0,0 +1,364 @@
+"""
+Registro de ventas del POS.
+
+Todo el checkout ocurre en una sola transacción con un número fijo de
+consultas, sin importar cuántas líneas tenga el pedido (en SQLite la
+transacción abre con BEGIN IMMEDIATE y, si está activa, espera su turno en la
+cola de escritura; ver gestion/sqlite):
+
+1. Productos del carrito y su stock, sin bloquearlos (una consulta id__in; ver
+   inventario.disponible).
+2. Promociones vigentes (dos consultas, ver precios.mapa_descuentos).
+3. INSERT de la venta, todavía sin número, con los totales ya calculados en
+   memoria.
+4. bulk_create de los DetalleVenta.
+5. Movimientos de stock (bulk_create), un UPDATE con CASE que descuenta el
+   stock de todos los productos con F() y la comprobación de que ninguno quedó
+   en negativo (ver inventario.py).
+6. INSERT del pago (validado de inmediato si el método no requiere validación).
+   Los saldos de la venta (monto_pagado, monto_validado) ya van en el INSERT
+   de la venta, así que el pago se inserta con bulk_create, sin Pago.save().
+7. Evento venta_registrada en la misma transacción: los resúmenes se
+   actualizan después del commit, fuera de la petición (ver eventos.py).
+8. Número de factura/ticket desde su Secuencia (ver numeracion.py) y un UPDATE
+   de la venta. Va al final porque la fila de la serie queda bloqueada hasta
+   el commit y todas las cajas pasan por ella: así cada caja la retiene solo
+   durante estas dos sentencias, no durante todo el checkout.
+
+Idempotencia: el POS envía una clave (UUID) por carrito que se guarda en
+Venta.clave_idempotencia (índice único). Si la clave ya tiene una venta, se
+retorna esa venta sin repetir el trabajo: un doble clic o un reintento tras un
+timeout no descuenta el stock dos veces. Si dos peticiones con la misma clave
+llegan a la vez, el INSERT de la segunda espera a la primera y falla por el
+índice único; registrar_venta retorna entonces la venta de la primera.
+
+Sin conexión, el POS guarda los pedidos en el navegador y los envía en lote
+(registrar_lote): una transacción para todo el lote y un savepoint por pedido,
+así un pedido rechazado (p. ej. sin stock) no deshace los demás.
+"""
+import uuid
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import eventos, inventario, numeracion
+from .sqlite import escritura
+from .models import Cliente, DetalleVenta, MetodoPago, Pago, Producto, Venta
+from .precios import mapa_descuentos
+
+
+class VentaError(Exception):
+    """Error de negocio al registrar una venta (se informa al cajero tal cual)."""
+
+    def __init__(self, mensaje, status=400):
+        super().__init__(mensaje)
+        self.mensaje = mensaje
+        self.status = status
+
+
+def normalizar_items(items):
+    """
+    Valida los ítems del carrito y los agrupa por producto.
+
+    Retorna {producto_id: {'cantidad': int, 'precio': Decimal | None}}.
+    """
+    carrito = {}
+    for item in items:
+        try:
+            producto_id = int(item['id'])
+        except (KeyError, TypeError, ValueError):
+            raise VentaError('Producto inválido en el pedido')
+        try:
+            cantidad = int(item['quantity'])
+            if cantidad <= 0:
+                raise ValueError('Cantidad debe ser mayor a 0')
+        except (KeyError, TypeError, ValueError):
+            raise VentaError('Cantidad inválida')
+        try:
+            precio = Decimal(str(item['price'])) if item.get('price') is not None else None
+        except (InvalidOperation, TypeError):
+            precio = None
+        linea = carrito.setdefault(producto_id, {'cantidad': 0, 'precio': precio})
+        linea['cantidad'] += cantidad
+    return carrito
+
+
+def _id(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def preparar_pedido(datos, clientes=None, metodos_pago=None):
+    """
+    Valida un pedido del POS (el JSON de la caja) y retorna los argumentos de
+    registrar_venta. `clientes` y `metodos_pago` son dicts {id: objeto} ya
+    consultados (lotes); si no se indican, se consultan.
+
+    Lanza VentaError si faltan datos o el cliente no sirve para factura.
+    """
+    cliente_id = _id(datos.get('cliente_id'))
+    metodo_pago_id = _id(datos.get('metodo_pago_id'))
+    items = datos.get('items') or []
+    if not cliente_id or not metodo_pago_id or not items or not isinstance(items, list):
+        raise VentaError('Datos incompletos')
+
+    if clientes is None:
+        clientes = Cliente.objects.in_bulk([cliente_id])
+    if metodos_pago is None:
+        metodos_pago = MetodoPago.objects.in_bulk([metodo_pago_id])
+    cliente = clientes.get(cliente_id)
+    if cliente is None:
+        raise VentaError('Cliente no encontrado', status=404)
+    metodo_pago = metodos_pago.get(metodo_pago_id)
+    if metodo_pago is None:
+        raise VentaError('Método de pago no encontrado', status=404)
+
+    modo_consumo = datos.get('modo_consumo', 'local')
+    if modo_consumo not in ('local', 'llevar'):
+        modo_consumo = 'local'
+    tipo_documento = datos.get('tipo_documento', 'ticket')
+    if tipo_documento not in ('ticket', 'factura'):
+        tipo_documento = 'ticket'
+
+    # Para factura: cliente debe tener NIT/CI válido (no Mostrador)
+    if tipo_documento == 'factura':
+        nit_valido = cliente.ci_nit and str(cliente.ci_nit).strip() and str(cliente.ci_nit).upper() != 'MOSTRADOR'
+        if not nit_valido:
+            raise VentaError('Para factura debe seleccionar un cliente con NIT/CI. No puede usar Mostrador.')
+
+    clave = datos.get('clave_idempotencia')
+    try:
+        clave = uuid.UUID(str(clave)) if clave else None
+    except ValueError:
+        raise VentaError('Clave de idempotencia inválida')
+
+    return {
+        'cliente': cliente,
+        'metodo_pago': metodo_pago,
+        'items': items,
+        'modo_consumo': modo_consumo,
+        'tipo_documento': tipo_documento,
+        'clave_idempotencia': clave,
+    }
+
+
+def venta_por_clave(clave_idempotencia):
+    """Venta ya registrada con `clave_idempotencia` (marcada como repetida), o None."""
+    if not clave_idempotencia:
+        return None
+    venta = Venta.objects.filter(clave_idempotencia=clave_idempotencia).first()
+    if venta is not None:
+        venta.repetida = True
+    return venta
+
+
+def registrar_venta(usuario, cliente, metodo_pago, items,
+                    modo_consumo='local', tipo_documento='ticket', clave_idempotencia=None, notas=None):
+    """
+    Registra venta, detalles, descuento de stock y pago en una transacción.
+
+    Con `clave_idempotencia`, si ya existe una venta con esa clave se retorna
+    esa venta (con `repetida = True`) sin registrar nada.
+
+    Lanza VentaError si algún producto no existe, está inactivo o no tiene stock.
+    """
+    existente = venta_por_clave(clave_idempotencia)
+    if existente is not None:
+        return existente
+
+    carrito = normalizar_items(items)
+    if not carrito:
+        raise VentaError('Datos incompletos')
+
+    try:
+        return _registrar(usuario, cliente, metodo_pago, carrito,
+                          modo_consumo, tipo_documento, clave_idempotencia, notas)
+    except IntegrityError:
+        # Otra petición con la misma clave se confirmó entre la consulta y el INSERT
+        existente = venta_por_clave(clave_idempotencia)
+        if existente is None:
+            raise
+        return existente
+
+
+def _registrar(usuario, cliente, metodo_pago, carrito, modo_consumo, tipo_documento, clave_idempotencia, notas):
+    with escritura():
+        productos = Producto.objects.filter(pk__in=carrito.keys(), activo=True).in_bulk()
+        stock = inventario.disponible(productos.values())
+
+        descuentos = mapa_descuentos()
+        detalles = []
+        subtotal = Decimal('0')
+        descuento_total = Decimal('0')
+        for producto_id, linea in carrito.items():
+            producto = productos.get(producto_id)
+            if producto is None:
+                raise VentaError(f'Producto con ID {producto_id} no encontrado o inactivo')
+            cantidad = linea['cantidad']
+            if stock[producto_id] < cantidad:
+                raise VentaError(f'Stock insuficiente para {producto.nombre}')
+
+            # Precio del frontend (incluye promociones) acotado al precio con promoción vigente
+            precio_max = descuentos.precio(producto)
+            precio_unitario = linea['precio']
+            if precio_unitario is None or precio_unitario <= 0 or precio_unitario > precio_max:
+                precio_unitario = precio_max
+
+            detalle = DetalleVenta(
+                producto=producto,
+                cantidad=cantidad,
+                precio_unitario=precio_unitario,
+                descuento_porcentaje=Decimal('0'),  # El descuento ya está en el precio
+            )
+            detalle.calcular_importes()
+            subtotal += detalle.subtotal
+            descuento_total += detalle.descuento_aplicado
+            detalles.append(detalle)
+
+        total = subtotal - descuento_total
+        if total <= 0:
+            raise VentaError('El total de la venta debe ser mayor a 0.')
+
+        ahora = timezone.now()
+        auto_validado = not metodo_pago.requiere_validacion
+        venta = Venta.objects.create(
+            cliente=cliente,
+            usuario=usuario,
+            modo_consumo=modo_consumo,
+            tipo_documento=tipo_documento,
+            subtotal=subtotal,
+            descuento_total=descuento_total,
+            total=total,
+            monto_pagado=total,
+            monto_validado=total if auto_validado else Decimal('0'),
+            estado='completado' if auto_validado else 'pendiente',
+            clave_idempotencia=clave_idempotencia or None,
+            notas=notas,
+        )
+
+        for detalle in detalles:
+            detalle.venta = venta
+        DetalleVenta.objects.bulk_create(detalles)
+
+        try:
+            inventario.mover(
+                {pk: -linea['cantidad'] for pk, linea in carrito.items()},
+                inventario.VENTA, venta=venta, usuario=usuario, productos=productos,
+            )
+        except inventario.StockInsuficiente as e:
+            # Otra caja vendió las últimas unidades mientras se cobraba este pedido
+            raise VentaError(f'Stock insuficiente para {productos[e.producto_id].nombre}')
+
+        pago = Pago(
+            venta=venta,
+            metodo_pago=metodo_pago,
+            monto=total,
+            validado=auto_validado,
+            fecha_validacion=ahora if auto_validado else None,
+            validado_por=usuario if auto_validado else None,
+        )
+        Pago.objects.bulk_create([pago])
+
+        eventos.venta_registrada(
+            venta,
+            sum(linea['cantidad'] for linea in carrito.values()),
+            metodo_pago_id=pago.metodo_pago_id,
+            pagos=[(pago.metodo_pago_id, pago.monto)] if pago.validado else [],
+        )
+
+        # Número de factura/ticket al final: bloquea la serie hasta el commit (paso 8)
+        if tipo_documento == 'factura':
+            campo, serie = 'numero_factura', numeracion.SECUENCIA_FACTURA
+        else:
+            campo, serie = 'numero_ticket', numeracion.SECUENCIA_TICKET
+        setattr(venta, campo, numeracion.siguiente(serie))
+        Venta.objects.filter(pk=venta.pk).update(**{campo: getattr(venta, campo)})
+
+    return venta
+
+
+def registrar_lote(usuario, pedidos):
+    """
+    Registra los pedidos que el POS guardó sin conexión, en una transacción.
+
+    Cada pedido (mismo formato que preparar_pedido, con clave_idempotencia
+    obligatoria y `fecha` opcional de la caja) se registra en su propio
+    savepoint. Retorna [(venta, None) | (None, VentaError)] en el orden de
+    `pedidos`; un pedido ya sincronizado retorna su venta con `repetida`.
+    """
+    validos = [p for p in pedidos if isinstance(p, dict)]
+    clientes = Cliente.objects.in_bulk({_id(p.get('cliente_id')) for p in validos} - {None})
+    metodos_pago = MetodoPago.objects.in_bulk({_id(p.get('metodo_pago_id')) for p in validos} - {None})
+    resultados = []
+    with escritura():
+        for datos in pedidos:
+            try:
+                if not isinstance(datos, dict):
+                    raise VentaError('Pedido inválido')
+                argumentos = preparar_pedido(datos, clientes, metodos_pago)
+                if argumentos['clave_idempotencia'] is None:
+                    raise VentaError('Falta la clave de idempotencia del pedido')
+                fecha = str(datos.get('fecha') or '')[:40]
+                venta = registrar_venta(
+                    usuario, **argumentos,
+                    notas=f'Registrada sin conexión en la caja ({fecha})' if fecha else None,
+                )
+            except VentaError as e:
+                resultados.append((None, e))
+            except IntegrityError:
+                resultados.append((None, VentaError('Número de ticket/factura duplicado. Intente de nuevo.', status=409)))
+            else:
+                resultados.append((venta, None))
+    return resultados
+
+
+def cancelar_venta(venta, usuario=None):
+    """
+    Cancela una venta: devuelve el stock de sus productos (movimientos de
+    anulación) y publica el evento venta_cancelada.
+
+    Retorna False si la venta ya estaba cancelada.
+    """
+    with escritura():
+        venta = Venta.objects.select_for_update().get(pk=venta.pk)
+        if venta.estado == 'cancelado':
+            return False
+        estado_anterior = venta.estado
+        cantidades = defaultdict(int)
+        for producto_id, cantidad in venta.detalles.values_list('producto_id', 'cantidad'):
+            cantidades[producto_id] += cantidad
+        inventario.mover(cantidades, inventario.ANULACION, venta=venta, usuario=usuario)
+        venta.estado = 'cancelado'
+        venta.save(update_fields=['estado', 'actualizado'])
+        eventos.cambio_estado(venta, estado_anterior, sum(cantidades.values()))
+    return True
+
+
+def _suma_pagos(**filtro):
+    """Subconsulta: suma de los pagos de la venta que cumplen `filtro` (0 si no hay)."""
+    pagos = Pago.objects.filter(venta=OuterRef('pk'), **filtro).values('venta').annotate(s=Sum('monto')).values('s')
+    return Coalesce(Subquery(pagos[:1], output_field=DecimalField(max_digits=10, decimal_places=2)), Decimal('0'))
+
+
+def recalcular_saldos(ventas=None):
+    """
+    Recalcula monto_pagado y monto_validado de `ventas` (queryset; por defecto
+    todas) desde sus pagos, en un solo UPDATE. Retorna cuántas ventas actualizó.
+    """
+    ventas = Venta.objects.all() if ventas is None else ventas
+    return ventas.update(monto_pagado=_suma_pagos(), monto_validado=_suma_pagos(validado=True))
+
+
+def saldos_descuadrados(ventas=None):
+    """Ventas cuyos saldos no coinciden con sus pagos, con pagado y validado (los correctos) anotados."""
+    ventas = Venta.objects.all() if ventas is None else ventas
+    return ventas.annotate(pagado=_suma_pagos(), validado=_suma_pagos(validado=True)).exclude(
+        monto_pagado=F('pagado'), monto_validado=F('validado')
+    )
+
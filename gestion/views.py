@@ -6,9 +6,13 @@ from django.contrib.auth.decorators import login_required
 from django.db import transaction, IntegrityError
 from django.core.validators import validate_email as django_validate_email
 from django.core.exceptions import ValidationError as DjangoValidationError
+from . import catalogo, inventario, numeracion, resumenes
 from .decorators import staff_required
+from .fechas import filtro_dias, inicio_dia
+from .paginacion import paginar
+from .ventas import VentaError, preparar_pedido, registrar_lote, registrar_venta
 from .models import (
-    Producto, Categoria, Cliente, Venta, DetalleVenta,
+    Producto, Categoria, Cliente, Venta,
     MetodoPago, Promocion, Pago, CierreCaja, CierreCajaDetallePago
 )
 
@@ -22,6 +26,7 @@ MAX_LENGTH_NOMBRE_CATEGORIA = 100
 MAX_LENGTH_NOMBRE_METODOPAGO = 50
 MAX_LENGTH_NOMBRE_PROMOCION = 100
 MAX_SIZE_IMAGEN_BYTES = 5 * 1024 * 1024  # 5 MB
+MAX_SIZE_EXTRACTO_BYTES = 20 * 1024 * 1024  # 20 MB
 ALLOWED_IMAGE_CONTENT_TYPES = {'image/jpeg', 'image/png', 'image/gif', 'image/webp'}
 
 def _ensure_default_user(username, password, email, is_staff, is_superuser=False):
@@ -111,6 +116,30 @@ def admin_index(request):
     return render(request, 'gestion/admin_index.html', {'active': 'admin'})
 
 
+@login_required
+@staff_required
+def rendimiento(request):
+    """Consultas y tiempos por vista de este proceso (ver instrumentacion.py); POST reinicia."""
+    from .instrumentacion import LIMITES_MS, estadisticas
+
+    if request.method == 'POST':
+        estadisticas.reiniciar()
+        messages.success(request, 'Estadísticas reiniciadas.')
+        return redirect('rendimiento')
+    filas = estadisticas.resumen()
+    for fila in filas:
+        mayor = max(fila['histograma']) or 1
+        fila['barras'] = [
+            {'limite': limite, 'cantidad': cantidad, 'alto': round(100 * cantidad / mayor)}
+            for limite, cantidad in zip(LIMITES_MS + (None,), fila['histograma'])
+        ]
+    return render(request, 'gestion/rendimiento.html', {
+        'filas': filas,
+        'activa': getattr(settings, 'INSTRUMENTACION_ACTIVA', True),
+        'active': 'admin',
+    })
+
+
 @login_required
 @staff_required
 def cuenta_cambiar_password(request):
@@ -308,68 +337,55 @@ def admin_usuarios_eliminar(request, pk):
 @login_required
 def index(request):
     from django.utils import timezone
-    from django.db.models import Sum, Count, Q
     from django.db import OperationalError
     from decimal import Decimal
-    from datetime import datetime, timedelta
     
     # Fecha de hoy en zona horaria de Bolivia (America/La_Paz)
     ahora = timezone.localtime(timezone.now())
     hoy = ahora.date()
     
-    # Estadísticas del día - TODAS las ventas del día (completadas y pendientes)
-    # Usamos fecha__date para comparar solo la fecha, ignorando la hora
-    # Esto evita problemas de zona horaria
-    ventas_hoy_todas = Venta.objects.filter(fecha__date=hoy)
-    
-    # Si no hay ventas con fecha__date, intentamos con las últimas 24 horas como respaldo
-    if ventas_hoy_todas.count() == 0:
-        hace_24_horas = ahora - timedelta(hours=24)
-        ventas_hoy_todas = Venta.objects.filter(fecha__gte=hace_24_horas)
-    
-    ventas_hoy_completadas = ventas_hoy_todas.filter(estado='completado')
-    ventas_hoy_pendientes = ventas_hoy_todas.filter(estado='pendiente')
+    # Estadísticas del día desde ResumenDiario (una lectura indexada por fecha)
+    resumen = resumenes.totales_del_dia(hoy)
     
     # Totales
-    total_ventas_hoy = ventas_hoy_todas.count()
-    total_ventas_completadas = ventas_hoy_completadas.count()
-    total_ventas_pendientes = ventas_hoy_pendientes.count()
+    total_ventas_hoy = resumen['num_ventas']
+    total_ventas_completadas = resumen['num_completadas']
+    total_ventas_pendientes = resumen['num_pendientes']
     
-    # Total recaudado (solo completadas)
-    total_recaudado_hoy = ventas_hoy_completadas.aggregate(total=Sum('total'))['total'] or Decimal('0.00')
-    
-    # Total pendiente (ventas pendientes)
-    total_pendiente_hoy = ventas_hoy_pendientes.aggregate(total=Sum('total'))['total'] or Decimal('0.00')
+    # Total recaudado (solo completadas) y total pendiente
+    total_recaudado_hoy = resumen['total_completado']
+    total_pendiente_hoy = resumen['total_pendiente']
     
     # Productos vendidos hoy: suma de cantidades de las ventas completadas del día
-    # (usamos las mismas ventas que ventas_hoy_completadas para consistencia con el resto del dashboard)
-    productos_vendidos_hoy = DetalleVenta.objects.filter(
-        venta__in=ventas_hoy_completadas
-    ).aggregate(total=Sum('cantidad'))['total'] or 0
+    productos_vendidos_hoy = resumen['productos_vendidos']
     
     # Promedio por venta (solo completadas)
     promedio_venta = total_recaudado_hoy / total_ventas_completadas if total_ventas_completadas > 0 else Decimal('0.00')
     
     # Últimas ventas del día (máximo 5) - TODAS incluyendo pendientes
-    ultimas_ventas_hoy = ventas_hoy_todas.order_by('-fecha')[:5]
+    ultimas_ventas_hoy = Venta.objects.filter(**filtro_dias('fecha', hoy)).select_related('cliente').order_by('-fecha')[:5]
     
-    # Para debug: verificar todas las ventas (últimas 10)
-    todas_las_ventas = Venta.objects.all().order_by('-fecha')[:10]
+    # Para debug: solo si no hay ventas hoy se muestran las últimas ventas registradas
+    todas_las_ventas = []
+    total_ventas_general = 0
+    if total_ventas_hoy == 0:
+        todas_las_ventas = Venta.objects.all().order_by('-fecha')[:10]
+        total_ventas_general = Venta.objects.count()
     
     # Estadísticas generales (para referencia)
     total_productos = Producto.objects.filter(activo=True).count()
     total_clientes = Cliente.objects.filter(activo=True).count()
     
     # Productos con stock bajo (< 5) para alerta
-    productos_bajo_stock = list(Producto.objects.filter(activo=True, stock__lt=5).order_by('stock')[:10])
-    
-    # Total de ventas en general (sin filtro de fecha)
-    total_ventas_general = Venta.objects.count()
+    productos_bajo_stock = list(
+        inventario.con_stock(Producto.objects.filter(activo=True))
+        .filter(stock_disponible__lt=5).order_by('stock_disponible')[:10]
+    )
     
     # Forzar evaluación de querysets que se iteran en el template (detectar errores de BD)
     try:
-        _ = list(ultimas_ventas_hoy)
-        _ = list(todas_las_ventas)
+        ultimas_ventas_hoy = list(ultimas_ventas_hoy)
+        todas_las_ventas = list(todas_las_ventas)
     except OperationalError as e:
         err_msg = str(e).lower()
         if any(x in err_msg for x in ('modo_consumo', 'tipo_documento', 'numero_factura', 'no such column', 'does not exist', "doesn't exist")):
@@ -402,71 +418,43 @@ def index(request):
     }
     return render(request, 'gestion/index.html', context)
 
-def _get_cliente_mostrador():
-    """Obtiene o crea el cliente Mostrador para ventas rápidas."""
-    cliente, _ = Cliente.objects.get_or_create(
-        ci_nit='MOSTRADOR',
-        defaults={
-            'nombre_completo': 'Mostrador',
-            'telefono': '',
-            'email': '',
-            'activo': True
-        }
-    )
-    return cliente
-
-
-def _precio_con_promocion(producto):
-    """Obtiene el precio final del producto aplicando promociones vigentes si existen."""
-    from django.utils import timezone
-    from decimal import Decimal, ROUND_HALF_UP
-    ahora = timezone.now()
-    promos_vigentes = Promocion.objects.filter(
-        activo=True,
-        productos=producto,
-        fecha_inicio__lte=ahora,
-        fecha_fin__gte=ahora
-    ).order_by('-descuento_porcentaje')
-    if promos_vigentes.exists():
-        promo = promos_vigentes.first()
-        precio_base = producto.precio_final()
-        desc = promo.descuento_porcentaje / Decimal('100')
-        precio_promo = precio_base * (1 - desc)
-        return precio_promo.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-    return producto.precio_final()
-
 
 @login_required
 def pos_view(request):
-    """Point of Sale interface"""
-    from django.db.models import Max
-    productos = Producto.objects.select_related('categoria').filter(activo=True)
-    categorias = Categoria.objects.filter(activo=True)
-    clientes = Cliente.objects.filter(activo=True)
-    metodos_pago = MetodoPago.objects.filter(activo=True)
-    cliente_mostrador = _get_cliente_mostrador()
-    # Precios con promociones aplicadas
-    productos_con_precio = []
-    for p in productos:
-        precio = _precio_con_promocion(p)
-        tiene_promo = precio < p.precio_final()
-        productos_con_precio.append({'producto': p, 'precio_display': precio, 'tiene_promo': tiene_promo})
-    # Siguiente número de ticket = max(id) + 1 (consecutivo con las ventas)
-    ultimo_id = Venta.objects.aggregate(m=Max('id'))['m'] or 0
-    siguiente_ticket = ultimo_id + 1
+    """Point of Sale interface (el catálogo lo carga pos.js desde pos_catalogo_json)"""
+    # Siguiente número de ticket según la secuencia de tickets (lectura O(1))
+    siguiente_ticket = numeracion.valor_actual(numeracion.SECUENCIA_TICKET) + 1
 
     context = {
-        'productos_con_precio': productos_con_precio,
-        'categorias': categorias,
-        'clientes': clientes,
-        'metodos_pago': metodos_pago,
-        'cliente_mostrador': cliente_mostrador,
         'siguiente_ticket': siguiente_ticket,
+        'sincronizacion_max': settings.POS_SINCRONIZACION_MAX_VENTAS,
         'active': 'pos'
     }
     return render(request, 'gestion/pos.html', context)
 
 
+@login_required
+def pos_catalogo_json(request):
+    """
+    API: catálogo del POS (productos con precio de promoción, categorías, métodos de pago).
+
+    Responde 304 si el ETag del cliente coincide; Cache-Control obliga a revalidar
+    en cada carga para que los cambios de precio se vean de inmediato.
+    """
+    from django.http import HttpResponse, HttpResponseNotModified
+    from django.utils.cache import patch_cache_control
+
+    catalogo_pos = catalogo.obtener()
+    etags = [e.strip() for e in request.headers.get('If-None-Match', '').split(',')]
+    if catalogo_pos['etag'] in etags:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(catalogo_pos['json'], content_type='application/json')
+    response['ETag'] = catalogo_pos['etag']
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
 @login_required
 def cliente_index(request):
     """Lista de clientes del sistema."""
@@ -587,7 +575,7 @@ def cliente_eliminar(request, pk):
 @staff_required
 def producto_index(request):
     from django.db.models import Q
-    productos = Producto.objects.select_related('categoria').filter(activo=True)
+    productos = inventario.con_stock(Producto.objects.select_related('categoria').filter(activo=True))
     q = request.GET.get('q', '').strip()
     if q:
         productos = productos.filter(
@@ -596,6 +584,16 @@ def producto_index(request):
     context = {'productos': productos, 'q': q, 'active': 'productos'}
     return render(request, 'gestion/producto_index.html', context)
 
+def _generar_miniaturas(request, producto):
+    """Genera las miniaturas WebP/JPEG de la imagen del producto; avisa si no se pudo."""
+    from .imagenes import ImagenError, actualizar_producto
+
+    try:
+        actualizar_producto(producto)
+    except ImagenError:
+        messages.warning(request, 'La imagen se guardó, pero no se pudieron generar sus miniaturas.')
+
+
 @login_required
 @staff_required
 def producto_crear(request):
@@ -737,16 +735,20 @@ def producto_crear(request):
                 })
             
             # Crear el producto
-            Producto.objects.create(
-                nombre=nombre,
-                descripcion=descripcion if descripcion else None,
-                costo=costo,
-                precio_venta=precio_venta,
-                descuento=descuento,
-                stock=stock,
-                categoria_id=categoria_id,
-                imagen=imagen
-            )
+            with transaction.atomic():
+                producto = Producto.objects.create(
+                    nombre=nombre,
+                    descripcion=descripcion if descripcion else None,
+                    costo=costo,
+                    precio_venta=precio_venta,
+                    descuento=descuento,
+                    stock=stock,
+                    categoria_id=categoria_id,
+                    imagen=imagen
+                )
+                inventario.stock_inicial([producto], usuario=request.user)
+            if producto.imagen:
+                _generar_miniaturas(request, producto)
             messages.success(request, 'Producto creado exitosamente.')
             return redirect('producto_index')
             
@@ -765,7 +767,7 @@ def producto_crear(request):
 @login_required
 @staff_required
 def producto_editar(request, pk):
-    producto = get_object_or_404(Producto, pk=pk)
+    producto = get_object_or_404(inventario.con_stock(Producto.objects.all()), pk=pk)
     
     if request.method == 'POST':
         nombre = request.POST.get('nombre', '').strip()
@@ -868,17 +870,28 @@ def producto_editar(request, pk):
                 'form_data': request.POST,
             })
         
-        # Actualizar producto
+        # Actualizar producto. El stock no se guarda con save(): pisaría las ventas hechas
+        # mientras se editaba. Solo si el usuario lo cambió se fija como ajuste (ver inventario.py)
+        try:
+            stock_anterior = int(request.POST.get('stock_anterior', ''))
+        except ValueError:
+            stock_anterior = producto.stock_disponible
         producto.nombre = nombre
         producto.descripcion = descripcion if descripcion else None
         producto.costo = costo
         producto.precio_venta = precio_venta
         producto.descuento = descuento
-        producto.stock = stock
         producto.categoria_id = categoria_id
+        campos = ['nombre', 'descripcion', 'costo', 'precio_venta', 'descuento', 'categoria']
         if nueva_imagen:
             producto.imagen = nueva_imagen
-        producto.save()
+            campos.append('imagen')
+        with transaction.atomic():
+            producto.save(update_fields=campos)
+            if stock != stock_anterior:
+                inventario.fijar({producto.pk: stock}, usuario=request.user, nota='Edición del producto')
+        if nueva_imagen:
+            _generar_miniaturas(request, producto)
         
         messages.success(request, 'Producto actualizado exitosamente.')
         return redirect('producto_index')
@@ -894,11 +907,11 @@ def producto_editar(request, pk):
 @login_required
 @staff_required
 def producto_eliminar(request, pk):
-    producto = get_object_or_404(Producto, pk=pk)
+    producto = get_object_or_404(inventario.con_stock(Producto.objects.all()), pk=pk)
     
     if request.method == 'POST':
         producto.activo = False
-        producto.save()
+        producto.save(update_fields=['activo'])
         messages.success(request, f'Producto "{producto.nombre}" eliminado exitosamente.')
         return redirect('producto_index')
     
@@ -1426,143 +1439,44 @@ def promocion_eliminar(request, pk):
     })
 
 
+def _venta_json(venta):
+    """Respuesta del POS para una venta registrada (igual en un reintento)."""
+    return {
+        'success': True,
+        'venta_id': venta.id,
+        'numero_ticket': venta.numero_ticket,
+        'numero_factura': venta.numero_factura,
+        'total': str(venta.total),
+        'message': 'Venta procesada exitosamente'
+    }
+
+
 @login_required
 def pos_procesar_pago(request):
-    """Process payment from POS"""
+    """
+    Process payment from POS.
+
+    Idempotente con clave_idempotencia (o la cabecera Idempotency-Key): un
+    reintento con la misma clave retorna la respuesta de la venta original
+    (cabecera Idempotent-Replayed).
+    """
     from django.http import JsonResponse
     import json
     
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            cliente_id = data.get('cliente_id')
-            metodo_pago_id = data.get('metodo_pago_id')
-            items = data.get('items', [])
-            
-            if not cliente_id or not metodo_pago_id or not items:
-                return JsonResponse({'success': False, 'error': 'Datos incompletos'}, status=400)
-            
-            cliente = get_object_or_404(Cliente, id=cliente_id)
-            metodo_pago = get_object_or_404(MetodoPago, id=metodo_pago_id)
-            modo_consumo = data.get('modo_consumo', 'local')
-            if modo_consumo not in ('local', 'llevar'):
-                modo_consumo = 'local'
-            tipo_documento = data.get('tipo_documento', 'ticket')
-            if tipo_documento not in ('ticket', 'factura'):
-                tipo_documento = 'ticket'
-            
-            # Para factura: cliente debe tener NIT/CI válido (no Mostrador)
-            if tipo_documento == 'factura':
-                nit_valido = cliente.ci_nit and str(cliente.ci_nit).strip() and str(cliente.ci_nit).upper() != 'MOSTRADOR'
-                if not nit_valido:
-                    return JsonResponse({
-                        'success': False,
-                        'error': 'Para factura debe seleccionar un cliente con NIT/CI. No puede usar Mostrador.'
-                    }, status=400)
-
-            from django.utils import timezone
-            from django.db.models import Max
-            from decimal import Decimal, InvalidOperation
-
-            with transaction.atomic():
-                # Create sale with explicit timezone-aware datetime
-                venta = Venta.objects.create(
-                    cliente=cliente,
-                    usuario=request.user,
-                    modo_consumo=modo_consumo,
-                    tipo_documento=tipo_documento
-                )
-                if tipo_documento == 'factura':
-                    ultimo_num = Venta.objects.filter(tipo_documento='factura').aggregate(
-                        m=Max('numero_factura')
-                    )['m'] or 0
-                    venta.numero_factura = ultimo_num + 1
-                    venta.save()
-                # Asegurar que la fecha se guarde correctamente
-                if not venta.fecha:
-                    venta.fecha = timezone.now()
-                    venta.save()
-            
-            # Add sale details
-            for item in items:
-                try:
-                    producto = Producto.objects.get(id=item['id'], activo=True)
-                except Producto.DoesNotExist:
-                    venta.delete()
-                    return JsonResponse({
-                        'success': False, 
-                        'error': f'Producto con ID {item["id"]} no encontrado o inactivo'
-                    }, status=400)
-                
-                try:
-                    cantidad = int(item['quantity'])
-                    if cantidad <= 0:
-                        raise ValueError('Cantidad debe ser mayor a 0')
-                except (ValueError, KeyError):
-                    venta.delete()
-                    return JsonResponse({
-                        'success': False, 
-                        'error': 'Cantidad inválida'
-                    }, status=400)
-                
-                # Check stock
-                if not producto.tiene_stock(cantidad):
-                    venta.delete()
-                    return JsonResponse({
-                        'success': False, 
-                        'error': f'Stock insuficiente para {producto.nombre}'
-                    }, status=400)
-                
-                # Usar precio del frontend (incluye promociones) o precio base
-                from decimal import Decimal, InvalidOperation
-                try:
-                    precio_unitario = Decimal(str(item.get('price', producto.precio_final())))
-                except (InvalidOperation, TypeError):
-                    precio_unitario = producto.precio_final()
-                # Validar: precio debe ser > 0 y <= precio base (promos bajan el precio)
-                precio_max = producto.precio_final()
-                if precio_unitario <= 0 or precio_unitario > precio_max:
-                    precio_unitario = precio_max
-                descuento_porcentaje = Decimal('0')  # El descuento ya está en el precio
-                
-                DetalleVenta.objects.create(
-                    venta=venta,
-                    producto=producto,
-                    cantidad=cantidad,
-                    precio_unitario=precio_unitario,
-                    descuento_porcentaje=descuento_porcentaje
-                )
-                
-                # Update stock
-                producto.stock -= cantidad
-                producto.save()
-            
-            # Calculate totals
-            venta.calcular_totales()
-
-            # Create payment: validar con full_clean() antes de guardar (suma pagos <= total)
-            pago = Pago(venta=venta, metodo_pago=metodo_pago, monto=venta.total)
+            if not data.get('clave_idempotencia'):
+                data['clave_idempotencia'] = request.headers.get('Idempotency-Key')
             try:
-                pago.full_clean()
-            except DjangoValidationError as e:
-                err_msg = str(e)
-                if hasattr(e, 'message_dict') and e.message_dict:
-                    msgs = e.message_dict.get('__all__', list(e.message_dict.values()))
-                    if msgs:
-                        err_msg = msgs[0][0] if isinstance(msgs[0], (list, tuple)) else str(msgs[0])
-                return JsonResponse({'success': False, 'error': err_msg}, status=400)
-            pago.save()
-
-            # Auto-validate if method doesn't require validation
-            if not metodo_pago.requiere_validacion:
-                pago.validar_pago(request.user)
+                venta = registrar_venta(request.user, **preparar_pedido(data))
+            except VentaError as e:
+                return JsonResponse({'success': False, 'error': e.mensaje}, status=e.status)
 
-            return JsonResponse({
-                'success': True,
-                'venta_id': venta.id,
-                'total': str(venta.total),
-                'message': 'Venta procesada exitosamente'
-            })
+            response = JsonResponse(_venta_json(venta))
+            if getattr(venta, 'repetida', False):
+                response['Idempotent-Replayed'] = 'true'
+            return response
 
         except IntegrityError:
             return JsonResponse({
@@ -1575,22 +1489,58 @@ def pos_procesar_pago(request):
     return JsonResponse({'success': False, 'error': 'Método no permitido'}, status=405)
 
 
+@login_required
+def pos_sincronizar_ventas(request):
+    """
+    API: registra en lote las ventas que el POS guardó sin conexión.
+
+    Recibe {"ventas": [pedido, ...]} y responde un resultado por pedido, en el
+    mismo orden (ver ventas.registrar_lote). Los pedidos rechazados (p. ej. por
+    stock insuficiente) no impiden registrar los demás.
+    """
+    from django.http import JsonResponse
+    import json
+
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Método no permitido'}, status=405)
+    try:
+        pedidos = json.loads(request.body).get('ventas')
+    except (ValueError, AttributeError):
+        pedidos = None
+    if not pedidos or not isinstance(pedidos, list):
+        return JsonResponse({'success': False, 'error': 'Datos incompletos'}, status=400)
+    maximo = settings.POS_SINCRONIZACION_MAX_VENTAS
+    if len(pedidos) > maximo:
+        return JsonResponse({'success': False, 'error': f'Máximo {maximo} ventas por lote'}, status=400)
+
+    resultados = []
+    for pedido, (venta, error) in zip(pedidos, registrar_lote(request.user, pedidos)):
+        clave = pedido.get('clave_idempotencia') if isinstance(pedido, dict) else None
+        if error is not None:
+            resultados.append({'clave': clave, 'success': False, 'error': error.mensaje, 'status': error.status})
+        else:
+            resultados.append({'clave': clave, **_venta_json(venta), 'repetida': getattr(venta, 'repetida', False)})
+    registradas = sum(1 for r in resultados if r['success'])
+    return JsonResponse({
+        'success': True,
+        'registradas': registradas,
+        'rechazadas': len(resultados) - registradas,
+        'resultados': resultados,
+    })
+
+
 @login_required
 def pos_buscar_clientes(request):
-    """API: buscar clientes por nombre, teléfono o CI (para POS)."""
+    """API: buscar clientes por nombre, teléfono, CI o email (para POS). Ver busqueda.py."""
     from django.http import JsonResponse
-    from django.db.models import Q
+    from .busqueda import buscar_clientes
 
     q = (request.GET.get('q') or '').strip()
     clientes_qs = Cliente.objects.filter(activo=True).order_by('nombre_completo')
 
     if q:
-        clientes_qs = clientes_qs.filter(
-            Q(nombre_completo__icontains=q)
-            | Q(telefono__icontains=q)
-            | Q(ci_nit__icontains=q)
-            | Q(email__icontains=q)
-        )[:30]
+        # Índices sobre columnas normalizadas; CI/NIT y teléfono exactos primero
+        clientes_qs = buscar_clientes(q, clientes_qs, limite=30)
     else:
         clientes_qs = clientes_qs[:100]
 
@@ -1656,20 +1606,20 @@ def pos_crear_cliente(request):
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
-@login_required
-def venta_index(request):
-    """Lista todas las ventas"""
-    from django.db.models import Sum
-    from django.db import OperationalError
+def _ventas_filtradas(request):
+    """Aplica los filtros de la lista de ventas (estado, fecha, ticket, saldo). Retorna (queryset, filtros)."""
+    from django.db.models import F, Q
     from datetime import datetime
 
     # Filtros opcionales
     estado_filter = request.GET.get('estado', '')
     fecha_filter = request.GET.get('fecha', '')
     ticket_filter = request.GET.get('ticket', '').strip()
+    saldo_filter = request.GET.get('saldo', '') == 'pendiente'
+    fecha = None
 
-    # Query base
-    ventas = Venta.objects.select_related('cliente', 'usuario').prefetch_related('detalles', 'pagos').order_by('-fecha')
+    # Query base (solo lo que la lista muestra: sin detalles ni pagos)
+    ventas = Venta.objects.select_related('cliente', 'usuario')
 
     # Aplicar filtros
     if estado_filter:
@@ -1678,23 +1628,69 @@ def venta_index(request):
     if fecha_filter:
         try:
             fecha = datetime.strptime(fecha_filter, '%Y-%m-%d').date()
-            ventas = ventas.filter(fecha__date=fecha)
+            ventas = ventas.filter(**filtro_dias('fecha', fecha))
         except ValueError:
             pass
 
     if ticket_filter:
         try:
-            ventas = ventas.filter(id=int(ticket_filter))
+            numero = int(ticket_filter)
+            ventas = ventas.filter(
+                Q(tipo_documento='ticket', numero_ticket=numero)
+                | Q(tipo_documento='factura', numero_factura=numero)
+            )
         except ValueError:
             pass
 
-    # Estadísticas
-    total_ventas = ventas.count()
-    total_general = ventas.aggregate(total=Sum('total'))['total'] or 0
+    if saldo_filter:
+        # Pagos validados por debajo del total (comparación de columnas, sin sumar pagos)
+        ventas = ventas.exclude(estado='cancelado').filter(monto_validado__lt=F('total'))
+
+    filtros = {
+        'estado_filter': estado_filter,
+        'fecha_filter': fecha_filter,
+        'ticket_filter': ticket_filter,
+        'saldo_filter': saldo_filter,
+        'fecha': fecha,
+    }
+    return ventas, filtros
+
+
+VENTAS_POR_PAGINA = 50
+
+
+@login_required
+def venta_index(request):
+    """Lista todas las ventas (paginación por cursor sobre fecha, id)"""
+    from django.db.models import Sum, Count
+    from django.db import OperationalError
+    from urllib.parse import urlencode
+
+    ventas, filtros = _ventas_filtradas(request)
+    estado_filter = filtros['estado_filter']
+    fecha_filter = filtros['fecha_filter']
+    ticket_filter = filtros['ticket_filter']
+
+    # Estadísticas: del resumen diario si alcanza; si no, solo cuando se piden (?totales=1)
+    total_ventas = None
+    total_general = None
+    if filtros['fecha'] and not ticket_filter and not filtros['saldo_filter'] and estado_filter in ('completado', 'pendiente'):
+        resumen = resumenes.totales_del_dia(filtros['fecha'])
+        if estado_filter == 'completado':
+            total_ventas, total_general = resumen['num_completadas'], resumen['total_completado']
+        else:
+            total_ventas, total_general = resumen['num_pendientes'], resumen['total_pendiente']
+    elif request.GET.get('totales') == '1':
+        stats = ventas.aggregate(n=Count('id'), total=Sum('total'))
+        total_ventas, total_general = stats['n'], stats['total'] or 0
 
-    # Paginación simple (últimas 50 ventas por defecto)
     try:
-        ventas = list(ventas[:50])
+        ventas, siguiente, anterior = paginar(
+            ventas,
+            despues=request.GET.get('despues'),
+            antes=request.GET.get('antes'),
+            tamano=VENTAS_POR_PAGINA,
+        )
     except OperationalError as e:
         err_msg = str(e).lower()
         if any(x in err_msg for x in ('modo_consumo', 'tipo_documento', 'numero_factura', 'no such column', 'does not exist', "doesn't exist")):
@@ -1705,18 +1701,61 @@ def venta_index(request):
             return redirect('index')
         raise
 
+    filtros_query = urlencode({
+        k: v for k, v in (
+            ('estado', estado_filter), ('fecha', fecha_filter), ('ticket', ticket_filter),
+            ('saldo', 'pendiente' if filtros['saldo_filter'] else ''),
+        ) if v
+    })
     context = {
         'ventas': ventas,
         'total_ventas': total_ventas,
         'total_general': total_general,
+        'cursor_siguiente': siguiente,
+        'cursor_anterior': anterior,
+        'filtros_query': filtros_query,
         'estado_filter': estado_filter,
         'fecha_filter': fecha_filter,
         'ticket_filter': ticket_filter,
+        'saldo_filter': filtros['saldo_filter'],
         'active': 'ventas'
     }
     return render(request, 'gestion/venta_index.html', context)
 
 
+@login_required
+def venta_index_json(request):
+    """API: página de ventas en JSON (mismos filtros y cursores que venta_index, para scroll infinito)."""
+    from django.http import JsonResponse
+
+    ventas, _ = _ventas_filtradas(request)
+    ventas, siguiente, anterior = paginar(
+        ventas,
+        despues=request.GET.get('despues'),
+        antes=request.GET.get('antes'),
+        tamano=VENTAS_POR_PAGINA,
+    )
+    return JsonResponse({
+        'ventas': [
+            {
+                'id': v.id,
+                'tipo_documento': v.tipo_documento,
+                'numero_ticket': v.numero_ticket,
+                'numero_factura': v.numero_factura,
+                'cliente': v.cliente.nombre_completo,
+                'vendedor': v.usuario.username,
+                'fecha': v.fecha.isoformat(),
+                'modo_consumo': v.modo_consumo,
+                'total': str(v.total),
+                'estado': v.estado,
+            }
+            for v in ventas
+        ],
+        'siguiente': siguiente,
+        'anterior': anterior,
+    })
+
+
 @login_required
 def venta_detail(request, pk):
     """Detalle de una venta (solo lectura)."""
@@ -1762,6 +1801,85 @@ def pago_validar(request, venta_pk, pago_pk):
     return redirect('venta_detail', pk=venta_pk)
 
 
+# --- Conciliación bancaria ---
+
+@login_required
+@staff_required
+def conciliacion_index(request):
+    """
+    Importa un extracto del banco (CSV/OFX) y valida en lote los pagos que
+    coinciden; lista las líneas por revisar con sus pagos candidatos.
+    """
+    from .conciliacion import ConciliacionError, candidatos, conciliar
+    from .models import ExtractoBancario, MovimientoBancario
+
+    metodos = MetodoPago.objects.filter(requiere_validacion=True, activo=True)
+    if request.method == 'POST':
+        archivo = request.FILES.get('extracto')
+        metodo_id = request.POST.get('metodo_pago', '')
+        metodo = metodos.filter(pk=metodo_id).first() if metodo_id.isdigit() else None
+        if not archivo:
+            messages.error(request, 'Seleccione el archivo del extracto.')
+        elif archivo.size > MAX_SIZE_EXTRACTO_BYTES:
+            messages.error(request, 'El extracto no debe superar 20 MB.')
+        else:
+            try:
+                _, resumen = conciliar(archivo.read(), archivo.name, usuario=request.user, metodo_pago=metodo)
+            except ConciliacionError as e:
+                messages.error(request, str(e))
+            else:
+                for error in resumen['errores'][:10]:
+                    messages.warning(request, error)
+                if len(resumen['errores']) > 10:
+                    messages.warning(request, f'... y {len(resumen["errores"]) - 10} línea(s) más con errores.')
+                texto = (f'{resumen["conciliadas"]} pago(s) validados, '
+                         f'{resumen["por_revisar"]} línea(s) por revisar.')
+                if resumen['duplicadas']:
+                    texto += f' {resumen["duplicadas"]} línea(s) ya estaban importadas.'
+                messages.success(request, texto)
+        return redirect('conciliacion_index')
+
+    por_revisar = MovimientoBancario.objects.filter(estado='revisar')
+    movimientos = list(por_revisar.select_related('extracto')[:100])
+    posibles = candidatos(movimientos)
+    for movimiento in movimientos:
+        movimiento.candidatos = posibles[movimiento.pk]
+    return render(request, 'gestion/conciliacion_index.html', {
+        'movimientos': movimientos,
+        'total_por_revisar': por_revisar.count(),
+        'extractos': ExtractoBancario.objects.select_related('usuario', 'metodo_pago')[:20],
+        'metodos': metodos,
+        'active': 'conciliacion',
+    })
+
+
+@login_required
+@staff_required
+def conciliacion_resolver(request, pk):
+    """Resuelve a mano una línea por revisar: conciliarla con un pago o ignorarla."""
+    from .conciliacion import ConciliacionError, conciliar_manual, ignorar
+    from .models import MovimientoBancario
+
+    if request.method != 'POST':
+        return redirect('conciliacion_index')
+    movimiento = get_object_or_404(MovimientoBancario, pk=pk)
+    try:
+        if request.POST.get('accion') == 'ignorar':
+            ignorar(movimiento)
+            messages.info(request, f'Línea del banco Bs. {movimiento.monto:.2f} ignorada.')
+        else:
+            pago_id = request.POST.get('pago', '')
+            if not pago_id.isdigit():
+                messages.error(request, 'Seleccione el pago a conciliar.')
+                return redirect('conciliacion_index')
+            pago = get_object_or_404(Pago.objects.select_related('venta', 'metodo_pago'), pk=pago_id)
+            conciliar_manual(movimiento, pago, request.user)
+            messages.success(request, f'Pago de Bs. {pago.monto:.2f} (Venta #{pago.venta_id}) conciliado y confirmado.')
+    except ConciliacionError as e:
+        messages.error(request, str(e))
+    return redirect('conciliacion_index')
+
+
 # --- Cierre de Caja ---
 
 @login_required
@@ -1784,7 +1902,7 @@ def cierre_caja_index(request):
     try:
         # Historial: últimos 30 días (o últimos 100 cierres)
         cierres_qs = CierreCaja.objects.filter(
-            fecha_cierre__date__gte=hace_30_dias
+            fecha_cierre__gte=inicio_dia(hace_30_dias)
         ).select_related('usuario').prefetch_related('detalles_pago__metodo_pago').order_by('-fecha_cierre')
         if not request.user.is_staff:
             cierres_qs = cierres_qs.filter(usuario=request.user)
@@ -1798,7 +1916,7 @@ def cierre_caja_index(request):
             )
             return redirect('index')
         raise
-    ventas_hoy = Venta.objects.filter(fecha__date=hoy, estado='completado')
+    ventas_hoy = Venta.objects.filter(estado='completado', **filtro_dias('fecha', hoy))
     if not request.user.is_staff:
         ventas_hoy = ventas_hoy.filter(usuario=request.user)
     total_hoy = ventas_hoy.aggregate(t=Sum('total'))['t'] or Decimal('0.00')
@@ -1813,13 +1931,12 @@ def cierre_caja_index(request):
     })
 
 
-@login_required
-def cierre_caja_nuevo(request):
-    """Pantalla para cerrar caja: muestra totales del día y permite registrar el cierre."""
+def _turno_actual(request):
+    """
+    Totales del turno de hoy leídos de los resúmenes (sin recorrer las ventas):
+    las ventas completadas del usuario actual, o de todos si es admin.
+    """
     from django.utils import timezone
-    from django.db.models import Sum
-    from django.db import OperationalError
-    from decimal import Decimal
 
     try:
         # Fecha de hoy en zona horaria de Bolivia (America/La_Paz)
@@ -1828,38 +1945,39 @@ def cierre_caja_nuevo(request):
         from datetime import date
         hoy = date.today()
 
-    # Ventas completadas del día del usuario actual (o todas si admin)
-    ventas_hoy = Venta.objects.filter(fecha__date=hoy, estado='completado')
-    if not request.user.is_staff:
-        ventas_hoy = ventas_hoy.filter(usuario=request.user)
+    usuario = None if request.user.is_staff else request.user
+    totales = resumenes.totales_del_dia(hoy, usuario)
+    pagos = resumenes.pagos_del_dia(hoy, usuario)
+    return {
+        'hoy': hoy,
+        'total_ventas': totales['total_completado'],
+        'num_ventas': totales['num_completadas'],
+        'num_pendientes': totales['num_pendientes'],
+        'total_pendiente': totales['total_pendiente'],
+        'pagos': pagos,
+        'totales_por_metodo': {p['metodo_pago__nombre']: p['monto'] for p in pagos},
+    }
+
+
+@login_required
+def cierre_caja_nuevo(request):
+    """Pantalla para cerrar caja: muestra totales del día y permite registrar el cierre."""
+    from django.db import OperationalError
+    from decimal import Decimal
+
+    contexto = _turno_actual(request)
+    contexto['active'] = 'cierre_caja'
+    hoy = contexto['hoy']
+    total_ventas = contexto['total_ventas']
 
-    total_ventas = ventas_hoy.aggregate(t=Sum('total'))['t'] or Decimal('0.00')
-    num_ventas = ventas_hoy.count()
-
-    # Totales por método de pago (evitar venta__in=[] en algunos backends)
-    metodos_pago = MetodoPago.objects.filter(activo=True)
-    totales_por_metodo = {}
-    if num_ventas > 0:
-        for p in Pago.objects.filter(venta__in=ventas_hoy, validado=True).values('metodo_pago__nombre').annotate(
-            total=Sum('monto')
-        ):
-            totales_por_metodo[p['metodo_pago__nombre']] = p['total']
-    
     if request.method == 'POST':
         # Un cierre por usuario por día (evitar duplicados)
-        if CierreCaja.objects.filter(usuario=request.user, fecha_cierre__date=hoy).exists():
+        if CierreCaja.objects.filter(usuario=request.user, **filtro_dias('fecha_cierre', hoy)).exists():
             messages.error(
                 request,
                 'Ya tiene un cierre de caja registrado para hoy. No puede registrar otro.'
             )
-            return render(request, 'gestion/cierre_caja_nuevo.html', {
-                'total_ventas': total_ventas,
-                'num_ventas': num_ventas,
-                'hoy': hoy,
-                'totales_por_metodo': totales_por_metodo,
-                'metodos_pago': metodos_pago,
-                'active': 'cierre_caja'
-            })
+            return render(request, 'gestion/cierre_caja_nuevo.html', contexto)
 
         fondo_inicial_str = (request.POST.get('fondo_inicial') or '').strip()
         fondo_final_str = (request.POST.get('fondo_final') or '').strip()
@@ -1874,42 +1992,24 @@ def cierre_caja_nuevo(request):
 
         if fondo_inicial is not None and fondo_inicial < 0:
             messages.error(request, 'El fondo inicial no puede ser negativo.')
-            return render(request, 'gestion/cierre_caja_nuevo.html', {
-                'total_ventas': total_ventas,
-                'num_ventas': num_ventas,
-                'hoy': hoy,
-                'totales_por_metodo': totales_por_metodo,
-                'metodos_pago': metodos_pago,
-                'active': 'cierre_caja'
-            })
+            return render(request, 'gestion/cierre_caja_nuevo.html', contexto)
         if fondo_final is not None and fondo_final < 0:
             messages.error(request, 'El fondo final no puede ser negativo.')
-            return render(request, 'gestion/cierre_caja_nuevo.html', {
-                'total_ventas': total_ventas,
-                'num_ventas': num_ventas,
-                'hoy': hoy,
-                'totales_por_metodo': totales_por_metodo,
-                'metodos_pago': metodos_pago,
-                'active': 'cierre_caja'
-            })
+            return render(request, 'gestion/cierre_caja_nuevo.html', contexto)
         
         try:
-            cierre = CierreCaja.objects.create(
-                usuario=request.user,
-                total_ventas=total_ventas,
-                fondo_inicial=fondo_inicial,
-                fondo_final=fondo_final,
-                notas=notas or None
-            )
-            
-            for metodo in metodos_pago:
-                monto = totales_por_metodo.get(metodo.nombre, Decimal('0'))
-                if monto > 0:
-                    CierreCajaDetallePago.objects.create(
-                        cierre=cierre,
-                        metodo_pago=metodo,
-                        monto=monto
-                    )
+            with transaction.atomic():
+                cierre = CierreCaja.objects.create(
+                    usuario=request.user,
+                    total_ventas=total_ventas,
+                    fondo_inicial=fondo_inicial,
+                    fondo_final=fondo_final,
+                    notas=notas or None
+                )
+                CierreCajaDetallePago.objects.bulk_create([
+                    CierreCajaDetallePago(cierre=cierre, metodo_pago_id=p['metodo_pago_id'], monto=p['monto'])
+                    for p in contexto['pagos'] if p['monto'] > 0
+                ])
             
             messages.success(request, f'Cierre de caja registrado. Total: Bs. {total_ventas:.2f}')
             return redirect('cierre_caja_index')
@@ -1923,14 +2023,17 @@ def cierre_caja_nuevo(request):
                 return redirect('cierre_caja_index')
             raise
     
-    return render(request, 'gestion/cierre_caja_nuevo.html', {
-        'total_ventas': total_ventas,
-        'num_ventas': num_ventas,
-        'hoy': hoy,
-        'totales_por_metodo': totales_por_metodo,
-        'metodos_pago': metodos_pago,
-        'active': 'cierre_caja'
-    })
+    return render(request, 'gestion/cierre_caja_nuevo.html', contexto)
+
+
+@login_required
+def cierre_caja_parcial(request):
+    """Reporte X: totales del turno hasta este momento, sin cerrar la caja."""
+    from django.utils import timezone
+
+    contexto = _turno_actual(request)
+    contexto.update({'generado': timezone.localtime(timezone.now()), 'active': 'cierre_caja'})
+    return render(request, 'gestion/cierre_caja_parcial.html', contexto)
 
 
 @login_required
@@ -1951,61 +2054,81 @@ def cierre_caja_detail(request, pk):
 
 # --- Reportes (solo admin) ---
 
-@login_required
-@staff_required
-def reportes_index(request):
-    """Reportes: ventas por período, productos más vendidos, total por método de pago."""
-    from django.db.models import Sum, Count
+def _periodo_reporte(request):
+    """(fecha_inicio, fecha_fin) del GET; por defecto los últimos 30 días."""
     from django.utils import timezone
     from datetime import datetime, timedelta
-    from decimal import Decimal
-    
+
     hoy = timezone.localtime(timezone.now()).date()
     fecha_inicio = request.GET.get('fecha_inicio', (hoy - timedelta(days=30)).strftime('%Y-%m-%d'))
     fecha_fin = request.GET.get('fecha_fin', hoy.strftime('%Y-%m-%d'))
-    
+
     try:
         fi = datetime.strptime(fecha_inicio, '%Y-%m-%d').date()
         ff = datetime.strptime(fecha_fin, '%Y-%m-%d').date()
     except ValueError:
         fi = hoy - timedelta(days=30)
         ff = hoy
-    
+
     if fi > ff:
         fi, ff = ff, fi
+    return fi, ff
+
+
+@login_required
+@staff_required
+def reportes_index(request):
+    """
+    Reportes: ventas por período, productos más vendidos, total por método de pago
+    y desgloses por categoría, vendedor, hora y modo de consumo. Se leen de las
+    tablas de resumen (ResumenDiario, ResumenProducto), no de DetalleVenta.
+    """
+    from django.db.models import Sum
+    from decimal import Decimal
+    from .models import ResumenDiario
     
-    ventas_periodo = Venta.objects.filter(
-        fecha__date__gte=fi,
-        fecha__date__lte=ff,
-        estado='completado'
-    )
+    fi, ff = _periodo_reporte(request)
     
     # Total ventas período
-    total_periodo = ventas_periodo.aggregate(t=Sum('total'))['t'] or Decimal('0.00')
-    num_ventas_periodo = ventas_periodo.count()
-    
-    # Productos más vendidos
-    productos_mas_vendidos = DetalleVenta.objects.filter(
-        venta__in=ventas_periodo
-    ).values('producto__nombre').annotate(
-        cantidad=Sum('cantidad'),
-        total=Sum('subtotal')
-    ).order_by('-cantidad')[:20]
-    
-    # Total por método de pago
-    pagos_periodo = Pago.objects.filter(
-        venta__in=ventas_periodo,
-        validado=True
-    ).values('metodo_pago__nombre').annotate(
-        total=Sum('monto')
-    ).order_by('-total')
+    totales = ResumenDiario.objects.filter(fecha__gte=fi, fecha__lte=ff).aggregate(
+        t=Sum('total_completado'), n=Sum('num_completadas')
+    )
+    total_periodo = totales['t'] or Decimal('0.00')
+    num_ventas_periodo = totales['n'] or 0
     
-    return render(request, 'gestion/reportes_index.html', {
+    contexto = resumenes.reporte_periodo(fi, ff)
+    contexto.update({
         'fecha_inicio': fi.strftime('%Y-%m-%d'),
         'fecha_fin': ff.strftime('%Y-%m-%d'),
         'total_periodo': total_periodo,
         'num_ventas_periodo': num_ventas_periodo,
-        'productos_mas_vendidos': productos_mas_vendidos,
-        'pagos_periodo': pagos_periodo,
         'active': 'reportes'
-    })
\ No newline at end of file
+    })
+    return render(request, 'gestion/reportes_index.html', contexto)
+
+
+@login_required
+@staff_required
+def exportar_ventas(request):
+    """
+    Descarga CSV de ventas, detalles o pagos del período (fecha_inicio/fecha_fin)
+    para contabilidad. Acepta además los filtros de la lista de ventas (estado, ticket).
+    Se envía por partes: la memoria no depende del tamaño del período.
+    """
+    from django.http import JsonResponse, StreamingHttpResponse
+    from .exportacion import TIPOS, csv_por_partes
+
+    tipo = request.GET.get('tipo', 'ventas')
+    if tipo not in TIPOS:
+        return JsonResponse({'success': False, 'error': 'Tipo de exportación inválido'}, status=400)
+
+    fi, ff = _periodo_reporte(request)
+    ventas, _ = _ventas_filtradas(request)
+    # Fijar la base de lectura ahora: el CSV se genera después de salir de la vista
+    ventas = ventas.filter(**filtro_dias('fecha', fi, ff))
+    ventas = ventas.using(ventas.db)
+
+    response = StreamingHttpResponse(csv_por_partes(tipo, ventas), content_type='text/csv; charset=utf-8')
+    nombre = f'{tipo}_{fi:%Y%m%d}_{ff:%Y%m%d}.csv'
+    response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    return response
@@ -1,75 +1,15 @@
 """
 Script para inicializar datos básicos en la base de datos
 Ejecutar con: Get-Content init_data.py | python manage.py shell
+El catálogo (categorías y productos) se carga con:
+  python manage.py importar_catalogo catalogo_inicial.json
 """
 
-from gestion.models import Categoria, Producto, Cliente, MetodoPago
+from gestion.models import Cliente, MetodoPago
 from django.contrib.auth.models import User
 
 print("Inicializando datos básicos...")
 
-# Crear categorías
-categorias_data = [
-    {'nombre': 'Pollos', 'descripcion': 'Combos de pollo'},
-    {'nombre': 'Bebidas', 'descripcion': 'Bebidas y refrescos'},
-    {'nombre': 'Extras', 'descripcion': 'Complementos y extras'},
-]
-
-for cat_data in categorias_data:
-    cat, created = Categoria.objects.get_or_create(
-        nombre=cat_data['nombre'],
-        defaults={'descripcion': cat_data['descripcion']}
-    )
-    if created:
-        print(f"✓ Categoría creada: {cat.nombre}")
-
-# Obtener categoría de pollos
-cat_pollos = Categoria.objects.get(nombre='Pollos')
-
-# Crear productos iniciales
-productos_data = [
-    {
-        'nombre': 'Chiquitin (1 presa)',
-        'descripcion': 'Combo con 1 presa de pollo',
-        'costo': 12.00,
-        'precio_venta': 18.00,
-        'stock': 50,
-        'categoria': cat_pollos
-    },
-    {
-        'nombre': 'Chipollo (2 presas)',
-        'descripcion': 'Combo con 2 presas de pollo',
-        'costo': 16.00,
-        'precio_venta': 24.00,
-        'stock': 40,
-        'categoria': cat_pollos
-    },
-    {
-        'nombre': 'Escolar (3 presas)',
-        'descripcion': 'Combo con 3 presas de pollo',
-        'costo': 20.00,
-        'precio_venta': 29.00,
-        'stock': 30,
-        'categoria': cat_pollos
-    },
-    {
-        'nombre': 'Panchita (4 presas)',
-        'descripcion': 'Combo con 4 presas de pollo',
-        'costo': 24.00,
-        'precio_venta': 35.00,
-        'stock': 20,
-        'categoria': cat_pollos
-    },
-]
-
-for prod_data in productos_data:
-    prod, created = Producto.objects.get_or_create(
-        nombre=prod_data['nombre'],
-        defaults=prod_data
-    )
-    if created:
-        print(f"✓ Producto creado: {prod.nombre} - Bs. {prod.precio_venta}")
-
 # Crear métodos de pago
 metodos_pago_data = [
     {
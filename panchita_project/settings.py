@@ -52,6 +52,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'gestion.instrumentacion.InstrumentacionMiddleware',
+    'gestion.replicas.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'panchita_project.urls'
@@ -79,13 +81,31 @@ WSGI_APPLICATION = 'panchita_project.wsgi.application'
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 #
 # Para usar SQLite (sin MySQL/Docker): export DJANGO_USE_SQLITE=1
-# Útil para desarrollo local cuando MySQL no está disponible.
+# Útil para desarrollo local cuando MySQL no está disponible, y soportado en producción
+# para un local con varias cajas con el perfil de abajo (backend gestion.sqlite).
+
+# Perfil SQLite (gestion/sqlite): PRAGMAs al abrir cada conexión, BEGIN IMMEDIATE en las
+# transacciones y, con SQLITE_COLA_ESCRITURA=1, una cola que da turnos a las escrituras
+# del proceso (útil con un servidor de varios hilos; entre procesos decide busy_timeout).
+# SQLITE_JOURNAL_MODE=DELETE si la base está en un disco de red (WAL no funciona ahí).
+SQLITE_OPCIONES = {
+    'pragmas': {
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_MB', '256')) * 1024 * 1024,
+        'cache_size': -int(os.environ.get('SQLITE_CACHE_MB', '64')) * 1024,  # Negativo: en KiB
+    },
+    'transaction_mode': 'IMMEDIATE',
+    'cola_escritura': os.environ.get('SQLITE_COLA_ESCRITURA', '').lower() in ('1', 'true', 'yes'),
+}
 
 if os.environ.get('DJANGO_USE_SQLITE', '').lower() in ('1', 'true', 'yes'):
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.sqlite3',
+            'ENGINE': 'gestion.sqlite',
             'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': SQLITE_OPCIONES,
         }
     }
 else:
@@ -100,6 +120,37 @@ else:
         }
     }
 
+# Réplica de solo lectura (gestion/replicas.py): las vistas de REPLICA_VISTAS y los comandos
+# de solo lectura leen del alias 'replica'. MySQL: definir DB_REPLICA_HOST (y, si cambian,
+# DB_REPLICA_PORT/DB_REPLICA_USER/DB_REPLICA_PASSWORD). SQLite: DJANGO_SQLITE_REPLICA=1 abre
+# el mismo archivo en una segunda conexión de solo lectura (sirve para probar el ruteo: una
+# escritura mal ruteada falla). En los tests de Django la réplica es la base de 'default'.
+if os.environ.get('DB_REPLICA_HOST') and DATABASES['default']['ENGINE'].endswith('mysql'):
+    DATABASES['replica'] = dict(
+        DATABASES['default'],
+        HOST=os.environ['DB_REPLICA_HOST'],
+        PORT=os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        USER=os.environ.get('DB_REPLICA_USER', DATABASES['default']['USER']),
+        PASSWORD=os.environ.get('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        TEST={'MIRROR': 'default'},
+    )
+elif os.environ.get('DJANGO_SQLITE_REPLICA', '').lower() in ('1', 'true', 'yes') and \
+        'sqlite' in DATABASES['default']['ENGINE']:
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f"file:{DATABASES['default']['NAME']}?mode=ro",
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['gestion.replicas.RouterReplica']
+
+# Vistas (nombre de URL) que leen de la réplica, y cuántos segundos lee de 'default' un
+# usuario después de escribir algo (para que vea lo que acaba de guardar)
+REPLICA_VISTAS = (
+    'index', 'venta_index', 'venta_index_json', 'cierre_caja_index', 'reportes_index', 'exportar_ventas',
+)
+REPLICA_PEGAJOSA_SEGUNDOS = int(os.environ.get('REPLICA_PEGAJOSA_SEGUNDOS', '5'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -148,9 +199,68 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Caché (locmem por proceso). Para compartirlo entre procesos, configurar Redis o Memcached:
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'panchita',
+    }
+}
+
+# Catálogo del POS en caché (gestion/catalogo.py): alias de CACHES y vencimiento máximo en segundos
+CATALOGO_CACHE = 'default'
+CATALOGO_CACHE_TIMEOUT = 3600
+
 # Login URL
 LOGIN_URL = 'login'
 
 # Datos de empresa para facturas (opcional)
 # EMPRESA_NIT = '123456789'  # Descomentar y configurar para mostrar NIT en facturas
 
+
+# Filas leídas por consulta al exportar ventas a CSV (gestion/exportacion.py)
+EXPORTACION_TAMANO_LOTE = int(os.environ.get('EXPORTACION_TAMANO_LOTE', '2000'))
+
+# Máximo de ventas por lote al sincronizar las ventas guardadas sin conexión en el POS
+POS_SINCRONIZACION_MAX_VENTAS = int(os.environ.get('POS_SINCRONIZACION_MAX_VENTAS', '50'))
+
+# Eventos posteriores a la venta (gestion/eventos.py): 'hilo' los procesa un hilo del
+# mismo proceso apenas se confirma la venta, 'externo' solo `manage.py procesar_eventos
+# --continuo` y 'sincrono' al confirmar, en la misma petición.
+# Sin definir: 'hilo' con MySQL, 'sincrono' con SQLite (un solo escritor a la vez)
+EVENTOS_MODO = os.environ.get('EVENTOS_MODO') or None
+EVENTOS_MAX_INTENTOS = int(os.environ.get('EVENTOS_MAX_INTENTOS', '5'))
+
+# Backups (manage.py backup_db / restore_db, ver gestion/respaldos.py): compresión por
+# defecto (gzip, zstd o ninguna) y cuántos backups completos conservar (0: todos)
+RESPALDOS_COMPRESION = os.environ.get('RESPALDOS_COMPRESION', 'gzip')
+RESPALDOS_CONSERVAR = int(os.environ.get('RESPALDOS_CONSERVAR', '7'))
+# Cada incremental vuelve a leer los cambios de estos segundos antes del anterior: las
+# fechas se fijan antes del commit (debe superar la transacción de escritura más larga)
+RESPALDOS_MARGEN_SEGUNDOS = int(os.environ.get('RESPALDOS_MARGEN_SEGUNDOS', '600'))
+
+# Instrumentación de vistas (gestion/instrumentacion.py): consultas y tiempos por vista,
+# cabecera Server-Timing (DEBUG o staff) y página /cuenta/rendimiento/
+INSTRUMENTACION_ACTIVA = os.environ.get('INSTRUMENTACION_ACTIVA', 'True').lower() in ('true', '1', 'yes')
+
+# Presupuesto por nombre de URL: máximo de consultas SQL y de ms por petición.
+# Se marcan en /cuenta/rendimiento/ y `manage.py verificar_presupuestos` falla si se exceden.
+# Las vistas con argumentos necesitan 'url' (p. ej. {'url': '/ventas/1/', 'consultas': 10}).
+PRESUPUESTOS_VISTAS = {
+    'index': {'consultas': 10, 'ms': 300},
+    'pos': {'consultas': 4, 'ms': 150},
+    'pos_catalogo_json': {'consultas': 4, 'ms': 150},
+    'pos_buscar_clientes': {'url': '/pos/buscar-clientes/?q=juan', 'consultas': 8, 'ms': 150},
+    'producto_index': {'consultas': 5, 'ms': 300},
+    'producto_crear': {'consultas': 4, 'ms': 300},
+    'categoria_index': {'consultas': 4, 'ms': 300},
+    'cliente_index': {'consultas': 5, 'ms': 300},
+    'venta_index': {'consultas': 5, 'ms': 300},
+    'venta_index_json': {'consultas': 5, 'ms': 150},
+    'cierre_caja_index': {'consultas': 7, 'ms': 300},
+    'cierre_caja_nuevo': {'consultas': 5, 'ms': 300},
+    'cierre_caja_parcial': {'consultas': 5, 'ms': 300},
+    'reportes_index': {'consultas': 12, 'ms': 500},
+    'conciliacion_index': {'consultas': 8, 'ms': 300},
+}
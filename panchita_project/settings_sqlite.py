@@ -7,7 +7,8 @@ from .settings import *
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'gestion.sqlite',
         'NAME': BASE_DIR / 'db.sqlite3',  # Archivo persistente
+        'OPTIONS': SQLITE_OPCIONES,  # WAL, busy_timeout, BEGIN IMMEDIATE (ver settings.py)
     }
 }
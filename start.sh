@@ -230,8 +230,8 @@ if [ "$PRODUCT_COUNT" -eq "0" ]; then
     read -p "¿Cargar datos iniciales? (s/N): " -n 1 -r
     echo
     if [[ $REPLY =~ ^[Ss]$ ]]; then
-        [ -f "load_products.py" ] && $PYTHON load_products.py
-        [ -f "init_data.py" ] && $PYTHON init_data.py
+        [ -f "catalogo_inicial.json" ] && $PYTHON manage.py importar_catalogo catalogo_inicial.json
+        [ -f "init_data.py" ] && $PYTHON manage.py shell < init_data.py
     fi
 else
     echo -e "\n${GREEN}✓${NC} Base de datos: $PRODUCT_COUNT productos"